@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of each phase of a git-ver run, against synthetic repositories generated offline.
+
+    python benchmarks/bench.py --files 20000 --vendored-files 50000 -o before.json
+    python benchmarks/bench.py ... -o after.json
+    python benchmarks/bench.py --compare before.json after.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'gitscripts'))
+sys.path.insert(0, HERE)
+
+from synth import RepoShape, make_repo  # noqa: E402
+
+
+def time_phase(func: Callable[[], object], runs: int, setup: Callable[[], object] = None) -> Dict[str, float]:
+    """
+    Time the given function over several runs.
+
+    :param func:
+        the phase to time
+    :param int runs:
+        how many times to run it
+    :param setup:
+        [Opt] called (untimed) before every run
+    :return:
+        the minimum, median, and mean of the runs, in seconds, along with the number of runs
+    """
+    samples = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {'runs': runs, 'min': min(samples), 'median': statistics.median(samples), 'mean': statistics.mean(samples)}
+
+
+def run_benchmarks(repo: str, config_path: str, runs: int) -> Dict[str, Dict[str, float]]:
+    from git import Repo
+
+    from tools.filesystem import seek_file, write_new_version
+    from tools.git import count_unstaged_filenames, do_git_commit, get_unstaged_filenames, warn_master_commit
+    from version_increment.python.python import config_filter, write
+    from version_increment.tools.parsing import parse_config
+    from version_increment.tools.types_ import Version
+
+    lineno, _ = parse_config(config_path, config_filter)
+    version_str = str(Version.from_str('1.2.3'))
+    git_repo = Repo(repo)
+    counter = iter(range(10 ** 9))
+
+    def touch_tracked() -> None:
+        with open(config_path, 'a') as fo:
+            fo.write(f'# {next(counter)}\n')
+
+    def commit() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            do_git_commit('Benchmark commit', repo)
+
+    return {
+        'seek_file': time_phase(lambda: seek_file('setup.py', repo), runs),
+        'parse_config': time_phase(lambda: parse_config(config_path, config_filter), runs),
+        # parsing a single version is too quick to time on its own, so this phase parses a thousand of them
+        'Version.from_str': time_phase(lambda: [Version.from_str('12.34.56') for _ in range(1000)], runs),
+        'write_new_version': time_phase(lambda: write_new_version(version_str, lineno, config_path, write), runs),
+        'get_unstaged_filenames': time_phase(lambda: get_unstaged_filenames(git_repo), runs),
+        'count_unstaged_filenames': time_phase(lambda: count_unstaged_filenames(git_repo), runs),
+        'warn_master_commit': time_phase(lambda: warn_master_commit(git_repo.index), runs),
+        'do_git_commit': time_phase(commit, runs, touch_tracked),
+    }
+
+
+def git_describe() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=HERE, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        return 'unknown'
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path) as fo:
+        before = json.load(fo)
+    with open(after_path) as fo:
+        after = json.load(fo)
+    print(f'{"phase":<24} {"before (ms)":>12} {"after (ms)":>12} {"ratio":>8}')
+    for phase, stats in before['phases'].items():
+        if phase not in after['phases']:
+            continue
+        old, new = stats['median'] * 1000, after['phases'][phase]['median'] * 1000
+        print(f'{phase:<24} {old:12.2f} {new:12.2f} {new / old if old else float("nan"):8.2f}')
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark each phase of git-ver against a synthetic repository.')
+    defaults = RepoShape()
+    for field in RepoShape._fields:
+        default = getattr(defaults, field)
+        parser.add_argument(f'--{field.replace("_", "-")}', type=type(default), default=default, dest=field)
+    parser.add_argument('--runs', type=int, default=5, help='How many times to run each phase.')
+    parser.add_argument('-o', '--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic repository afterwards.')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='Compare two JSON results instead of running anything.')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    shape = RepoShape(**{field: getattr(args, field) for field in RepoShape._fields})
+    workdir = tempfile.mkdtemp(prefix='git-ver-bench-')
+    home = os.path.join(workdir, 'home')
+    os.makedirs(home)
+    with open(os.path.join(home, '.gitconfig'), 'w') as fo:
+        fo.write('[user]\n\tname = Bench\n\temail = bench@example.com\n')
+    os.environ['HOME'] = home
+
+    try:
+        repo = os.path.join(workdir, 'repo')
+        start = time.perf_counter()
+        config_path = make_repo(repo, shape)
+        print(f'generated {repo} in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+        phases = run_benchmarks(repo, config_path, args.runs)
+    finally:
+        if args.keep:
+            print(f'kept {workdir}', file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'meta': {'revision': git_describe(), 'python': platform.python_version(), 'platform': platform.platform(),
+                 'shape': shape._asdict()},
+        'phases': phases,
+    }
+    for phase, stats in phases.items():
+        print(f'{phase:<24} {stats["median"] * 1000:10.2f} ms (min {stats["min"] * 1000:.2f} ms)')
+    if args.output:
+        with open(args.output, 'w') as fo:
+            json.dump(result, fo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+A startup-time regression check for the `git_ver.py` and `git_ver_hook.py` entry points.
+
+Each scenario runs an entry point under `python -X importtime` and fails if any module that the scenario should never
+need gets imported, or if the total time spent importing exceeds the scenario's budget. Exits non-zero on failure,
+so it can be run as-is in CI:
+
+    python benchmarks/startup_budget.py [--scale 1.5]
+
+The same scenarios are run by `tests/test_startup_budget.py`, which always checks what they import, but only holds
+them to their budgets (scaled by it) when `GIT_VER_STARTUP_SCALE` is set, since timings vary with the machine's load.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+GIT_VER = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'gitscripts', 'git_ver.py')
+GIT_VER_HOOK = os.path.join(os.path.dirname(GIT_VER), 'git_ver_hook.py')
+SCALE_ENV = 'GIT_VER_STARTUP_SCALE'
+
+
+class Scenario(NamedTuple):
+    name: str
+    args: List[str]
+    budget_ms: float
+    forbidden: Set[str]
+    script: str = GIT_VER
+    env: Optional[Dict[str, str]] = None
+
+
+SCENARIOS = [
+    Scenario('help', ['--help'], 40.0, {'git', 'in_place', 'dataclasses', 'concurrent.futures',
+                                     'version_increment.tools.types_', 'importlib.metadata'}),
+    Scenario('argument error', ['python'], 40.0, {'git', 'in_place', 'dataclasses', 'importlib.metadata'}),
+    # an unknown project type may still be registered by a plugin, so this one pays for searching the installed
+    # distributions' entry points
+    Scenario('unsupported project', ['cobol', 'patch', '-d', os.curdir], 80.0, {'git', 'in_place'}),
+    # the thin client of a --serve process (failing to connect here) must not import any of git-ver itself
+    Scenario('thin client', ['--connect', '--socket', os.path.join(os.curdir, 'no-such.sock'), 'python', 'patch'],
+             30.0, {'logging', 'argparse', 'git', 'tempfile', 'tools.setup_', 'version_increment.tools.projects'}),
+    # git's commit hooks run on every commit (with the index to commit in GIT_INDEX_FILE): the message hook needs
+    # nothing of the bump, and the pre-commit hook (failing here on its version part, after every import) nothing
+    # beyond it
+    Scenario('hook message', ['prepare-commit-msg', os.devnull], 30.0,
+             {'logging', 'git', 'argparse', 'subprocess', 'version_increment.tools.cache'}, GIT_VER_HOOK,
+             {'GIT_INDEX_FILE': os.path.join(os.curdir, 'no-such-git-dir', 'index')}),
+    Scenario('hook bump', ['pre-commit', 'python', 'none', '-d', os.curdir], 60.0,
+             {'git', 'argparse', 'in_place', 'asyncio', 'tools.setup_', 'tools.pool'}, GIT_VER_HOOK),
+]
+
+
+def import_times(args: List[str], script: str = GIT_VER, env: Dict[str, str] = None) -> List[Tuple[str, int]]:
+    """
+    Run an entry point with the given arguments under `-X importtime`.
+
+    :param args:
+        the arguments to run the entry point with
+    :param str script:
+        [Opt] the entry point, `git_ver.py` by default
+    :param env:
+        [Opt] environment variables to run it with, on top of the current environment
+    :return:
+        every module imported, in the order that their imports finished, with its cumulative import time in
+        microseconds; nested imports keep the leading spaces that `-X importtime` indents them with
+    """
+    full_env = dict(os.environ, **env) if env else None
+    proc = subprocess.run([sys.executable, '-X', 'importtime', script] + args, stdin=subprocess.DEVNULL, env=full_env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        times.append((name[1:], int(cumulative)))
+    return times
+
+
+def top_level_total(times: List[Tuple[str, int]]) -> float:
+    """Sum the cumulative import time of the modules imported directly by the entry point, in milliseconds."""
+    return sum(cumulative for name, cumulative in times if not name.startswith(' ')) / 1000
+
+
+def check(scenario: Scenario, runs: int = 5, scale: float = 1.0) -> Tuple[float, float, List[str]]:
+    """
+    Run a scenario several times.
+
+    :param Scenario scenario:
+        the scenario to run
+    :param int runs:
+        [Opt] how many times to run it
+    :param float scale:
+        [Opt] the factor to multiply its budget by
+    :return:
+        its best total import time and its budget, in milliseconds, and the forbidden modules that it imported
+    """
+    times = [import_times(scenario.args, scenario.script, scenario.env) for _ in range(runs)]
+    imported = {name.strip() for name, _ in times[0]}
+    leaked = sorted(name for name in imported
+                    if any(name == bad or name.startswith(f'{bad}.') for bad in scenario.forbidden))
+    return min(top_level_total(run) for run in times), scenario.budget_ms * scale, leaked
+
+
+def default_scale() -> float:
+    """The factor to multiply every budget by, from `GIT_VER_STARTUP_SCALE` (e.g. on slow CI machines)."""
+    return float(os.environ.get(SCALE_ENV, 1.0))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=float, default=default_scale(),
+                        help='Multiply every budget by this factor, e.g. on slow CI machines.')
+    parser.add_argument('--runs', type=int, default=5, help='Take the best of this many runs of each scenario.')
+    args = parser.parse_args()
+
+    failed = False
+    for scenario in SCENARIOS:
+        best, budget, leaked = check(scenario, args.runs, args.scale)
+        ok = not leaked and best <= budget
+        failed = failed or not ok
+        print(f'{"ok  " if ok else "FAIL"} {scenario.name:<22} {best:7.1f} ms (budget {budget:.1f} ms)'
+              + (f'; imported {", ".join(leaked)}' if leaked else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Generators of synthetic git repositories, for benchmarking git-ver against trees of a chosen shape and size."""
+
+import os
+import random
+import subprocess
+from typing import NamedTuple
+
+SETUP_TEMPLATE = """from setuptools import setup, find_packages
+
+{padding}
+setup(
+    name='synthetic',
+    version='{version}',
+    packages=find_packages(),
+)
+"""
+
+
+class RepoShape(NamedTuple):
+    """
+    The knobs of a synthetic repository. `files` are tracked (so they also set the size of the index), spread over
+    directories up to `depth` deep with `fanout` names per level; `vendored_trees` are git-ignored `node_modules` and
+    `target` trees of `vendored_files` files each; and `config_lines` pads out the config file.
+    """
+
+    files: int = 1000
+    depth: int = 4
+    fanout: int = 8
+    vendored_trees: int = 2
+    vendored_files: int = 1000
+    config_lines: int = 50
+    untracked: int = 100
+    tags: int = 100
+    branches: int = 10
+    config_dir: str = 'pkg'
+    version: str = '1.2.3'
+    seed: int = 0
+
+
+def _git(repo: str, *args: str, stdin: bytes = None) -> bytes:
+    env = dict(os.environ, GIT_AUTHOR_NAME='Bench', GIT_AUTHOR_EMAIL='bench@example.com',
+               GIT_COMMITTER_NAME='Bench', GIT_COMMITTER_EMAIL='bench@example.com')
+    return subprocess.run(['git'] + list(args), cwd=repo, input=stdin, env=env, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+
+
+def _tree_dirs(root: str, depth: int, fanout: int, rng: random.Random):
+    """Yield a directory path at a random depth (up to `depth`) beneath `root`, forever."""
+    while True:
+        parts = [f'd{rng.randrange(fanout)}' for _ in range(rng.randint(0, depth))]
+        yield os.path.join(root, *parts)
+
+
+def _write_files(root: str, count: int, depth: int, fanout: int, rng: random.Random, prefix: str) -> None:
+    dirs = _tree_dirs(root, depth, fanout, rng)
+    for i in range(count):
+        dirpath = next(dirs)
+        os.makedirs(dirpath, exist_ok=True)
+        with open(os.path.join(dirpath, f'{prefix}{i}.txt'), 'w') as fo:
+            fo.write(f'{prefix} {i}\n')
+
+
+def make_repo(path: str, shape: RepoShape = RepoShape()) -> str:
+    """
+    Create a synthetic repository with the given shape, with `master` and `dev` branches and `dev` checked out.
+
+    :param str path:
+        the (not yet existing) directory to create the repository in
+    :param RepoShape shape:
+        [Opt] the knobs of the repository
+    :return:
+        the path to the Python project's config file (`setup.py`) in the repository
+    """
+    rng = random.Random(shape.seed)
+    os.makedirs(path)
+    _git(path, 'init', '-q')
+    _git(path, 'config', 'user.name', 'Bench')
+    _git(path, 'config', 'user.email', 'bench@example.com')
+
+    _write_files(path, shape.files, shape.depth, shape.fanout, rng, 'f')
+    for i in range(shape.vendored_trees):
+        vendored = os.path.join(path, 'node_modules' if i % 2 == 0 else 'target', f'v{i}')
+        _write_files(vendored, shape.vendored_files, shape.depth, shape.fanout, rng, 'v')
+
+    with open(os.path.join(path, '.gitignore'), 'w') as fo:
+        fo.write('node_modules/\ntarget/\nuntracked/ignored/\n')
+
+    config_dir = os.path.join(path, shape.config_dir)
+    os.makedirs(config_dir, exist_ok=True)
+    config_path = os.path.join(config_dir, 'setup.py')
+    padding = '\n'.join(f'CONSTANT_{i} = {i!r}  # padding' for i in range(shape.config_lines))
+    with open(config_path, 'w') as fo:
+        fo.write(SETUP_TEMPLATE.format(padding=padding, version=shape.version))
+
+    _git(path, 'add', '-A')
+    _git(path, 'commit', '-q', '-m', 'synthetic')
+    _git(path, 'branch', '-M', 'master')
+    head = _git(path, 'rev-parse', 'HEAD').decode().strip()
+
+    refs = [f'create refs/tags/v{i // 100}.{i % 100}.0 {head}' for i in range(shape.tags)]
+    refs += [f'create refs/heads/b{i} {head}' for i in range(shape.branches)]
+    if refs:
+        _git(path, 'update-ref', '--stdin', stdin='\n'.join(refs).encode() + b'\n')
+        _git(path, 'pack-refs', '--all')
+    _git(path, 'checkout', '-q', '-b', 'dev')
+
+    _write_files(os.path.join(path, 'untracked'), shape.untracked, 1, shape.fanout, rng, 'u')
+    return config_path
@@ -1,45 +1,414 @@
 #!/usr/bin/env python3
 
-import logging
-import os
-from importlib import import_module
-
-from tools.filesystem import safe_get_dirpath
-from tools.git import do_git_commit
-from tools.logging_ import setup as init_log
-from tools.setup_ import parse_args
-from tools.str_utils import str_is_empty
-from version_increment.tools.lang_utils import do_bump
-from version_increment.tools.types_ import Version
+import sys
+
+if __name__ == '__main__' and '--connect' in sys.argv[1:]:
+    # the thin client of a --serve process needs none of the imports below
+    from tools.daemon import run_client, split_client_args
+    _, socket_path, client_args = split_client_args(sys.argv[1:])
+    sys.exit(run_client(client_args, socket_path))
+
+import logging  # noqa: E402
+import os  # noqa: E402
+
+from tools.logging_ import setup as init_log  # noqa: E402
+from tools.setup_ import parse_args  # noqa: E402
+from version_increment.tools.projects import (  # noqa: E402
+    AUTO, BUILTIN_PROJECTS, LIST, load_project, project_types, resolve_project
+)
 
 LOGGER = logging.getLogger(__name__)
 
-PROJECT_TYPES = ['python', 'rust']
+# what a --serve process imports before taking requests, besides the built-in project types
+WARM_MODULES = (
+    'tools.git', 'tools.pool', 'tools.branch_policy', 'tools.transaction', 'version_increment.tools.lang_utils',
+    'version_increment.tools.sync', 'version_increment.tools.batch', 'version_increment.tools.bare',
+    'version_increment.tools.tags', 'version_increment.tools.conventional', 'version_increment.tools.changed',
+    'version_increment.rust.workspace',
+)
+
+# The heavier modules (GitPython above all) are only imported by the phase of `main` that needs them, so that
+# `--help`, argument errors, and bumps that never commit do not pay for them at startup.
 
 
 def main(argv):
+    from tools.filesystem import DiscoveryOptions, safe_get_dirpath
+    from tools.str_utils import str_is_empty
+    from version_increment.tools.types_ import Version
+
     LOGGER.debug(f'argv={argv}')
+    if argv.project == LIST:
+        print('\n'.join(project_types()))
+        return
+
     to_resolve = argv.dirpath if 'dirpath' in argv and not str_is_empty(argv.dirpath) else os.getcwd()
     dirpath = safe_get_dirpath(to_resolve)
     LOGGER.debug(f'dirpath={dirpath}')
 
-    if argv.project not in PROJECT_TYPES:
-        print(f'project with type={argv.project} is not a supported project type')
-        print('Quitting...')
-        quit()
+    if argv.fleet is not None:
+        main_fleet(argv)
+        return
+
+    if argv.manifest is not None or argv.roots or argv.changed_since is not None:
+        main_batch(argv, dirpath)
+        return
+
+    if argv.workspace:
+        main_workspace(argv, dirpath)
+        return
+
+    try:
+        project_module = load_project(resolve_project(argv.project, dirpath))
+    except ValueError as e:
+        bump_failed(e)
 
-    project_module = import_module(f'.{argv.project}', f'version_increment.{argv.project}')
     write_func = getattr(project_module, 'write')
     config_filter_func = getattr(project_module, 'config_filter')
     config_name = getattr(project_module, 'config_name')
+
+    tag_index, line = None, ()
+    if argv.from_tag or argv.tag or argv.version == AUTO:
+        tag_index, line = open_tag_index(argv, dirpath)
+    if argv.version == AUTO:
+        # a bare repository, or the top of a work tree, needs no pathspec (which would slow `git log` down)
+        top_level = argv.bare or os.path.exists(os.path.join(dirpath, '.git'))
+        argv.version = choose_auto_level(argv, dirpath, tag_index, line, [] if top_level else ['.'],
+                                         argv.ref if argv.bare else 'HEAD')
     version_func = getattr(Version, argv.version)
+    if argv.from_tag or argv.tag:
+        from version_increment.tools.tags import tag_version_func
+        version_func = tag_version_func(tag_index, version_func, argv.from_tag, line)
+
+    if argv.bare:
+        from tools.plumbing import full_ref_name
+        from version_increment.tools.bare import do_bare_bump
+        branch_policy(argv, dirpath, full_ref_name(dirpath, argv.ref))
+        try:
+            new_version, commit = do_bare_bump(version_func, config_filter_func, config_name, dirpath, argv.ref)
+        except (ValueError, RuntimeWarning) as e:
+            bump_failed(e)
+        print(f'\nCommit summary: Version incremented to {new_version}\n')
+        if argv.tag:
+            tag_commit(dirpath, tag_index, new_version, commit)
+        return
+
+    from version_increment.tools.cache import ConfigCache
+    from version_increment.tools.lang_utils import bump_config
+
+    policy = branch_policy(argv, dirpath)
+
+    discovery = DiscoveryOptions(extra_prune=argv.prune, follow_gitignore=argv.follow_gitignore,
+                                 strategy=argv.discovery)
+
+    if argv.clear_cache:
+        cache = ConfigCache.for_dir(dirpath)
+        if cache is not None:
+            cache.invalidate()
+            cache.save()
+
+    from tools.git import do_git_commit
+    from version_increment.tools.sync import load_sync_targets, parse_sync_arg
+    try:
+        sync_targets = load_sync_targets(dirpath, [parse_sync_arg(arg) for arg in argv.sync])
+        with edit_transaction(dirpath) as transaction:
+            config_path, new_version, synced = bump_config(version_func, write_func, config_filter_func, config_name,
+                                                           dirpath, discovery, argv.use_cache, sync_targets,
+                                                           argv.jobs, transaction)
+            staged_files = [config_path] + synced if argv.stage == 'touched' else None
+            do_git_commit(f'Version incremented to {new_version}', dirpath, argv.commit_backend, staged_files,
+                          argv.pathspecs, policy)
+    except (OSError, ValueError, RuntimeWarning) as e:
+        # e.g. no config file, a version that is already tagged, or a missing sync target or one without the version
+        bump_failed(e)
+    if argv.tag:
+        from tools.plumbing import rev_parse
+        tag_commit(dirpath, tag_index, new_version, rev_parse(dirpath, 'HEAD'))
+
+
+def branch_policy(argv, dirpath: str, ref: str = None):
+    from tools.branch_policy import BranchPolicy, ProtectedBranchError
+    from version_increment.tools.cache import find_git_dir
+
+    # checked before anything is bumped, so that a refused commit leaves the work tree as it was
+    policy = BranchPolicy.from_env(argv.protected_branches, argv.protected_policy)
+    git_dir = find_git_dir(dirpath)
+    try:
+        if git_dir is not None:
+            policy.check_ref(git_dir, ref or 'HEAD')
+    except ProtectedBranchError as e:
+        print(e)
+        print('Quitting...')
+        # with a non-zero status, so that automation can tell a refused commit from a bump
+        raise SystemExit(1)
+    return policy
+
+
+def bump_failed(reason):
+    # with a non-zero status, so that automation (e.g. --fleet) can tell a failed bump from a bump; any edits have
+    # been rolled back by the time this is reached
+    print(reason)
+    print('Quitting...')
+    raise SystemExit(1)
+
+
+def edit_transaction(dirpath: str):
+    # the edits of a bump are rolled back if its commit fails, as are any that an earlier run left unfinished
+    from tools.transaction import EditTransaction, recover
+    from version_increment.tools.cache import CACHE_DIRNAME, find_git_dir
+
+    git_dir = find_git_dir(dirpath)
+    if git_dir is None:
+        return EditTransaction()
+    journal_dir = os.path.join(git_dir, CACHE_DIRNAME)
+    recover(journal_dir)
+    return EditTransaction(journal_dir, dirpath)
+
+
+def open_tag_index(argv, dirpath: str):
+    from version_increment.tools.tags import TagIndex, parse_line
+
+    try:
+        line = parse_line(argv.tag_line) if argv.tag_line is not None else ()
+        return TagIndex.for_dir(dirpath, argv.tag_prefix), line
+    except ValueError as e:
+        bump_failed(e)
+
+
+def last_release_tag(tag_index, line):
+    latest = tag_index.latest(line)
+    return None if latest is None else f'refs/tags/{tag_index.tag_name(latest)}'
+
+
+def choose_auto_level(argv, dirpath: str, tag_index, line, paths, until: str = 'HEAD') -> str:
+    from version_increment.tools.conventional import commit_level
+
+    since = last_release_tag(tag_index, line)
+    try:
+        level = commit_level(dirpath, since, paths, until, argv.use_cache)
+    except ValueError as e:
+        bump_failed(e)
+    if level is None:
+        bump_failed(f'No commits since {since or "the first commit"} call for a release')
+    LOGGER.info(f'Commits since {since or "the first commit"} call for a {level} bump')
+    return level
+
+
+def tag_commit(dirpath: str, tag_index, new_version, commit: str):
+    from version_increment.tools.tags import create_tag
+
+    LOGGER.info(f'Tagged {commit[:12]} as {create_tag(dirpath, tag_index, new_version, commit)}')
+
+
+def main_batch(argv, dirpath: str):
+    from tools.filesystem import DiscoveryOptions
+    from version_increment.tools.batch import batch_commit_message, do_batch_bump, expand_roots, load_manifest
+
+    entries = []
+    if argv.manifest is not None:
+        try:
+            entries.extend(load_manifest(argv.manifest, argv.project, argv.version))
+        except (OSError, ValueError) as e:
+            bump_failed(e)
+    if argv.roots:
+        entries.extend(expand_roots(dirpath, argv.roots, argv.project, argv.version))
+    if argv.changed_since is not None:
+        from version_increment.tools.changed import changed_entries
+        candidates = entries if argv.manifest is not None or argv.roots else None
+        entries = changed_entries(dirpath, argv.changed_since, candidates, argv.project, argv.version)
+    if any(entry.level == AUTO for entry in entries):
+        entries = choose_entry_levels(argv, dirpath, entries)
+    if not entries:
+        bump_failed('No projects to bump')
+
+    policy = branch_policy(argv, dirpath)
+    discovery = DiscoveryOptions(extra_prune=argv.prune, follow_gitignore=argv.follow_gitignore,
+                                 strategy=argv.discovery)
+    from tools.git import do_git_commit
+    try:
+        with edit_transaction(dirpath) as transaction:
+            results = do_batch_bump(entries, dirpath, discovery, argv.use_cache, argv.jobs, transaction)
+            for result in results:
+                LOGGER.info(f'{result.config_path}: {result.old_version} -> {result.new_version}')
+
+            staged_files = [result.config_path for result in results] if argv.stage == 'touched' else None
+            do_git_commit(batch_commit_message(results, dirpath), dirpath, argv.commit_backend, staged_files,
+                          argv.pathspecs, policy)
+    except (OSError, ValueError, RuntimeWarning) as e:
+        bump_failed(e)
+
+
+def choose_entry_levels(argv, dirpath: str, entries):
+    from dataclasses import replace
+    from version_increment.tools.conventional import choose_levels
+
+    tag_index, line = open_tag_index(argv, dirpath)
+    since = last_release_tag(tag_index, line)
+    auto_roots = [entry.root for entry in entries if entry.level == AUTO]
+    levels = iter(choose_levels(dirpath, since, auto_roots, argv.use_cache))
+    chosen = []
+    for entry in entries:
+        if entry.level != AUTO:
+            chosen.append(entry)
+            continue
+        level = next(levels)
+        if level is None:
+            LOGGER.info(f'{entry.root}: no commits since {since or "the first commit"} call for a release')
+        else:
+            chosen.append(replace(entry, level=level))
+    return chosen
+
+
+def main_workspace(argv, dirpath: str):
+    from version_increment.rust.workspace import do_workspace_bump, workspace_commit_message
+    from version_increment.tools.types_ import Version
+
+    if resolve_project(argv.project, dirpath) != 'rust':
+        bump_failed('--workspace is only supported for rust projects')
+
+    if argv.version == AUTO:
+        tag_index, line = open_tag_index(argv, dirpath)
+        argv.version = choose_auto_level(argv, dirpath, tag_index, line, [])
+    policy = branch_policy(argv, dirpath)
+    from tools.git import do_git_commit
+    try:
+        with edit_transaction(dirpath) as transaction:
+            bumps, paths = do_workspace_bump(dirpath, getattr(Version, argv.version), argv.crates, argv.jobs,
+                                             transaction)
+            for bump in bumps:
+                LOGGER.info(f'{bump.name}: {bump.old_version} -> {bump.new_version}')
+
+            staged_files = paths if argv.stage == 'touched' else None
+            do_git_commit(workspace_commit_message(bumps), dirpath, argv.commit_backend, staged_files,
+                          argv.pathspecs, policy)
+    except (OSError, ValueError, RuntimeWarning) as e:
+        bump_failed(e)
+
+
+def main_fleet(argv):
+    from version_increment.tools.batch import load_manifest
+    from version_increment.tools.fleet import run_fleet
+
+    try:
+        jobs = load_manifest(argv.fleet, argv.project, argv.version)
+    except (OSError, ValueError) as e:
+        bump_failed(e)
+    extra_args = ['-l', argv.level, '--discovery', argv.discovery, '--commit-backend', argv.commit_backend,
+                  '--stage', argv.stage]
+    extra_args += [arg for pathspec in argv.pathspecs for arg in ('--pathspec', pathspec)]
+    extra_args += [arg for name in argv.prune for arg in ('--prune', name)]
+    extra_args += [arg for pattern in argv.protected_branches for arg in ('--protected-branch', pattern)]
+    if argv.protected_policy is not None:
+        extra_args += ['--protected-policy', argv.protected_policy]
+    if argv.follow_gitignore:
+        extra_args.append('--follow-gitignore')
+    if not argv.use_cache:
+        extra_args.append('--no-cache')
+
+    results = run_fleet(jobs, lambda result: print(result.to_json(), flush=True), argv.jobs, argv.fleet_timeout,
+                        extra_args)
+    failed = [result for result in results if result.status != 'ok']
+    LOGGER.info(f'{len(results) - len(failed)} of {len(results)} repositories bumped')
+    if failed:
+        raise SystemExit(1)
+
+
+def main_serve(argv):
+    from importlib import import_module
+    from tools.daemon import serve
+
+    # everything a request may need is imported up front, so that no request pays for it
+    for module in WARM_MODULES:
+        import_module(module)
+    for project in BUILTIN_PROJECTS:
+        load_project(project)
+    serve(run_request, argv.socket, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_request(args, cwd: str, env):
+    import io
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+    from tools.daemon import FORWARDED_ENV, FORWARDED_ENV_PREFIX
+    from tools.logging_ import FORMAT
+
+    output = io.StringIO()
+    log_handler = logging.StreamHandler(output)
+    log_handler.setFormatter(logging.Formatter(FORMAT))
+    root_logger = logging.getLogger()
+    old_level = root_logger.level
+    old_cwd = os.getcwd()
+    old_stdin = sys.stdin
+    # the request runs with the client's git-related environment variables, not the server's
+    old_env = {name: value for name, value in os.environ.items()
+               if name in FORWARDED_ENV or name.startswith(FORWARDED_ENV_PREFIX)}
+    status = 0
+    try:
+        for name in old_env:
+            del os.environ[name]
+        os.environ.update(env)
+        os.chdir(cwd)
+        # there is no one to prompt
+        sys.stdin = io.StringIO()
+        with redirect_stdout(output), redirect_stderr(output):
+            request_argv = parse_args(args)
+            root_logger.addHandler(log_handler)
+            root_logger.setLevel(getattr(logging, request_argv.level))
+            if request_argv.serve:
+                raise ValueError('cannot --serve from a request')
+            run(request_argv)
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            output.write(e.code + '\n')
+        status = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        traceback.print_exc(file=output)
+        status = 1
+    finally:
+        root_logger.removeHandler(log_handler)
+        root_logger.setLevel(old_level)
+        sys.stdin = old_stdin
+        os.chdir(old_cwd)
+        for name in env:
+            os.environ.pop(name, None)
+        os.environ.update(old_env)
+    return status, output.getvalue()
+
+
+def run(argv):
+    if argv.profile or argv.trace_json or argv.cprofile:
+        run_profiled(argv)
+    else:
+        main(argv)
+
+
+def run_profiled(argv):
+    from tools import profiling
 
-    new_version = do_bump(version_func, write_func, config_filter_func, config_name, dirpath)
-    do_git_commit(f'Version incremented to {new_version}', dirpath)
+    profiler = profiling.enable() if argv.profile or argv.trace_json else None
+    cprofiler = None
+    if argv.cprofile:
+        import cProfile
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+    try:
+        main(argv)
+    finally:
+        if cprofiler is not None:
+            cprofiler.disable()
+            cprofiler.dump_stats(argv.cprofile)
+        if profiler is not None:
+            profiling.disable()
+            if argv.profile:
+                print(profiler.format_summary(), file=sys.stderr)
+            if argv.trace_json:
+                profiler.write_trace(argv.trace_json)
 
 
 if __name__ == '__main__':
     args = parse_args()
     init_log(lvl=getattr(logging, args.level))
     LOGGER.debug(f'Starting {args.project} versioning script')
-    main(args)
+    if args.serve:
+        main_serve(args)
+    else:
+        run(args)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Run git-ver from git's commit hooks, bumping the version as part of each commit instead of in a commit of its own
+(see :py:mod:`version_increment.tools.hook`):
+
+    git_ver_hook.py --install-hook PROJECT VERSION [-d DIR] [--force]
+    git_ver_hook.py pre-commit PROJECT VERSION [-d DIR] [--no-cache]
+    git_ver_hook.py prepare-commit-msg MESSAGE_FILE [SOURCE [SHA]]
+
+Only the first form is meant to be run by hand; it installs hooks that run the other two.
+
+This runs on every commit, so it parses its own arguments and imports only what the bump needs.
+"""
+
+import os
+import sys
+
+USAGE = __doc__.strip().split('\n\n')[1]
+
+
+def split_args(args):
+    options = {'dirpath': None, 'force': False, 'use_cache': True}
+    positionals = []
+    args = iter(args)
+    for arg in args:
+        if arg in ('-d', '--dir'):
+            options['dirpath'] = next(args, None)
+        elif arg.startswith('--dir='):
+            options['dirpath'] = arg[len('--dir='):]
+        elif arg == '--force':
+            options['force'] = True
+        elif arg == '--no-cache':
+            options['use_cache'] = False
+        elif arg.startswith('-') and arg != '--install-hook':
+            raise ValueError(f'unrecognized argument: {arg}')
+        else:
+            positionals.append(arg)
+    return positionals, options
+
+
+def main(args) -> int:
+    try:
+        positionals, options = split_args(args)
+    except ValueError as e:
+        print(f'{e}\nusage:\n{USAGE}', file=sys.stderr)
+        return 2
+    command = positionals[0] if positionals else None
+    if command not in ('--install-hook', 'pre-commit', 'prepare-commit-msg') \
+            or len(positionals) < (2 if command == 'prepare-commit-msg' else 3):
+        print(f'usage:\n{USAGE}', file=sys.stderr)
+        return 2
+
+    from version_increment.tools import hook
+
+    if command == 'prepare-commit-msg':
+        hook.prepare_commit_msg(positionals[1])
+        return 0
+
+    from tools.logging_ import setup as init_log
+
+    init_log()
+    dirpath = os.path.abspath(options['dirpath'] or os.curdir)
+    try:
+        if command == 'pre-commit':
+            new_version = hook.pre_commit(positionals[1].lower(), positionals[2].lower(), dirpath,
+                                          options['use_cache'])
+            if new_version is not None:
+                print(f'git-ver: {hook.MESSAGE_FORMAT.format(new_version)}')
+        else:
+            for path in hook.install_hooks(positionals[1].lower(), positionals[2].lower(), dirpath,
+                                           os.path.abspath(__file__), options['force']):
+                print(f'Installed {path}')
+    except (ValueError, RuntimeWarning, RuntimeError) as e:  # including a GitPlumbingError
+        print(e)
+        print('Quitting...')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,171 @@
+"""
+Decide whether a commit may be made on the current branch, when that branch is a protected one (`master` or `main`, by
+default).
+
+The current branch is read straight from the `HEAD` file, and the protected-branch patterns are compiled into a single
+pattern once, so the check takes constant time however many branches the repository has. Unless a policy is chosen,
+the user is asked to confirm a commit to a protected branch when there is a terminal to ask on, and the commit is
+refused otherwise, so that unattended runs never wait on a prompt.
+"""
+
+import fnmatch
+import functools
+import logging
+import os
+import re
+import sys
+from typing import Iterable, Optional, Pattern, Tuple
+
+from tools import plumbing
+from tools.plumbing import GitPlumbingError
+
+LOGGER = logging.getLogger(__name__)
+
+PROMPT = 'prompt'
+ALLOW = 'allow'
+DENY = 'deny'
+POLICIES = (PROMPT, ALLOW, DENY)
+DEFAULT_PROTECTED = ('master', 'main')
+
+POLICY_ENV = 'GIT_VER_PROTECTED_POLICY'
+PROTECTED_ENV = 'GIT_VER_PROTECTED_BRANCHES'
+
+_HEADS = 'refs/heads/'
+_BRANCH_PREFIX = f'ref: {_HEADS}'
+# what the HEAD file of a repository using the reftable backend holds, in place of the real branch
+_REFTABLE_PLACEHOLDER = '.invalid'
+_YES = ('y', 'yes', 'ye', 'yep', 'yeah')
+
+
+class ProtectedBranchError(RuntimeError):
+    """Raised when a commit to a protected branch is refused."""
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(patterns: Tuple[str, ...]) -> Pattern:
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+def current_branch(git_dir: str) -> Optional[str]:
+    """
+    Read the name of the branch that `HEAD` points to.
+
+    :param str git_dir:
+        the git directory of the repository (or of the worktree)
+    :return:
+        the branch's name (e.g. `"main"`), or `None` if `HEAD` is detached
+    """
+    with open(os.path.join(git_dir, 'HEAD'), 'r') as fo:
+        head = fo.read().strip()
+    if not head.startswith(_BRANCH_PREFIX):
+        return None
+    branch = head[len(_BRANCH_PREFIX):]
+    if branch == _REFTABLE_PLACEHOLDER:
+        try:
+            ref = plumbing.run_git(['symbolic-ref', '-q', 'HEAD'], git_dir).decode().strip()
+        except GitPlumbingError:
+            return None
+        branch = ref[len(_HEADS):] if ref.startswith(_HEADS) else None
+    return branch
+
+
+class BranchPolicy:
+    """
+    Which branches are protected (by name or glob pattern, e.g. `release/*`), and what to do about a commit to one of
+    them: `"prompt"` to ask the user, `"allow"` to commit anyway (with a warning), or `"deny"` to refuse. Without a
+    policy, the user is prompted when there is a terminal to prompt on, and the commit is refused otherwise.
+    """
+
+    def __init__(self, patterns: Iterable[str] = DEFAULT_PROTECTED, policy: str = None):
+        if policy is not None and policy not in POLICIES:
+            raise ValueError(f'not a protected branch policy ({", ".join(POLICIES)}): "{policy}"')
+        self.patterns = tuple(patterns)
+        self.policy = policy
+        self._pattern = _compile(self.patterns) if self.patterns else None
+        self._allowed = set()
+
+    @classmethod
+    def from_env(cls, patterns: Iterable[str] = None, policy: str = None) -> 'BranchPolicy':
+        """
+        Build a policy, falling back to the `GIT_VER_PROTECTED_BRANCHES` (comma-separated patterns) and
+        `GIT_VER_PROTECTED_POLICY` environment variables for what is not given.
+
+        :param patterns:
+            [Opt] the protected branch patterns
+        :param str policy:
+            [Opt] what to do about a commit to a protected branch
+        :return:
+            the policy
+        """
+        if not patterns:
+            from_env = os.environ.get(PROTECTED_ENV)
+            patterns = DEFAULT_PROTECTED if from_env is None \
+                else [pattern.strip() for pattern in from_env.split(',') if pattern.strip()]
+        if policy is None:
+            policy = os.environ.get(POLICY_ENV, '').strip().lower() or None
+        return cls(patterns, policy)
+
+    def is_protected(self, branch: Optional[str]) -> bool:
+        """
+        :param str branch:
+            a branch's name, or `None` for a detached `HEAD`
+        :return:
+            whether the branch is protected
+        """
+        return branch is not None and self._pattern is not None and self._pattern.match(branch) is not None
+
+    def check(self, git_dir: str) -> None:
+        """
+        Apply the policy to a commit on the current branch, raising a :py:class:`ProtectedBranchError` if it is
+        refused. Once a commit to a branch is allowed, later checks of the same branch pass without asking again.
+
+        :param str git_dir:
+            the git directory of the repository (or of the worktree)
+        """
+        self.check_branch(git_dir, current_branch(git_dir))
+
+    def check_ref(self, git_dir: str, ref: str) -> None:
+        """
+        Apply the policy to a commit that advances the given ref, like :py:meth:`check`, e.g. in a bare repository.
+
+        :param str git_dir:
+            the git directory of the repository
+        :param str ref:
+            the full name of the ref (e.g. `refs/heads/main`), or `HEAD` for the current branch
+        """
+        if ref == 'HEAD':
+            self.check(git_dir)
+        elif ref.startswith(_HEADS):
+            self.check_branch(git_dir, ref[len(_HEADS):])
+
+    def check_branch(self, git_dir: str, branch: Optional[str]) -> None:
+        """
+        Apply the policy to a commit on the given branch; see :py:meth:`check`.
+
+        :param str git_dir:
+            the git directory of the repository
+        :param str branch:
+            the branch's name, or `None` for a detached `HEAD`
+        """
+        if not self.is_protected(branch) or (os.path.realpath(git_dir), branch) in self._allowed:
+            return
+
+        policy = self.policy
+        if policy is None:
+            policy = PROMPT if sys.stdin is not None and sys.stdin.isatty() else DENY
+        if policy == ALLOW:
+            LOGGER.warning(f'committing to the protected branch {branch}')
+            self._allowed.add((os.path.realpath(git_dir), branch))
+            return
+        if policy == PROMPT:
+            answer = input(f'Are you sure that you want to commit to the {branch} branch? [y/N]')
+            if answer.strip().lower() in _YES:
+                self._allowed.add((os.path.realpath(git_dir), branch))
+                return
+            print('Quitting...')
+            raise ProtectedBranchError(f'not committing to the protected branch {branch}')
+        if self.policy == DENY:
+            raise ProtectedBranchError(f'refusing to commit to the protected branch {branch}')
+        raise ProtectedBranchError(f'refusing to commit to the protected branch {branch} without a terminal to '
+                                   f'confirm on; set {POLICY_ENV}=allow (or pass --protected-policy allow) to commit '
+                                   f'anyway')
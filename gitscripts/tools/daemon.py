@@ -0,0 +1,217 @@
+"""
+A long-running server that runs `git_ver.py` requests in one warm process, and the thin client that sends them.
+
+Every run of `git_ver.py` otherwise pays for starting an interpreter and importing GitPython before it can do
+anything; the server pays for those once, and keeps what it opens between requests. Requests and responses are single
+JSON lines sent over a Unix socket that only its owner may connect to: the client sends its arguments, working
+directory, and git-related environment variables, and the server replies with everything the run printed or logged
+and its exit status. Requests are run one at a time.
+
+The client is what `git_ver.py --connect` runs, before anything else is imported, so this module must not import
+more than the standard library needs for a socket and JSON at the top level.
+
+The server notices when its own source files change (e.g. after an upgrade) by their modification times, and
+restarts itself, asking the client to send the request again.
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+SOCKET_ENV = 'GIT_VER_SOCKET'
+# environment variables that a request runs with, as the client had them
+FORWARDED_ENV = ('HOME',)
+FORWARDED_ENV_PREFIX = 'GIT_'
+
+CONNECT_TIMEOUT = 5.0
+RETRY_INTERVAL = 0.05
+
+Handler = Callable[[List[str], str, Dict[str, str]], Tuple[int, str]]
+
+
+def default_socket_path() -> str:
+    """
+    Find where the server listens unless told otherwise: `$GIT_VER_SOCKET`, or else a socket private to the user in
+    `$XDG_RUNTIME_DIR` (or the temporary directory).
+
+    :return:
+        the path to the socket
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    # not tempfile.gettempdir(), which costs the client more to import than everything else it needs
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(runtime_dir, f'git-ver-{os.getuid()}.sock')
+
+
+def split_client_args(args: List[str]) -> Tuple[bool, Optional[str], List[str]]:
+    """
+    Pick the client's own options (`--connect` and `--socket PATH`) out of the command line, without argparse.
+
+    :param args:
+        the command line, without the program's name
+    :return:
+        whether `--connect` was given, the socket path if one was, and every other argument (for the server)
+    """
+    connect = False
+    socket_path = None
+    rest = []
+    args = iter(args)
+    for arg in args:
+        if arg == '--connect':
+            connect = True
+        elif arg == '--socket':
+            socket_path = next(args, None)
+        elif arg.startswith('--socket='):
+            socket_path = arg[len('--socket='):]
+        else:
+            rest.append(arg)
+    return connect, socket_path, rest
+
+
+def _send(socket_path: str, request: bytes) -> dict:
+    # a socket in a shared directory (e.g. /tmp) could have been put there by someone else
+    if os.stat(socket_path).st_uid != os.getuid():
+        raise PermissionError(f'{socket_path} belongs to another user')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(request)
+        client.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = client.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b''.join(chunks))
+
+
+def run_client(args: List[str], socket_path: str = None) -> int:
+    """
+    Send a request to the server and print what it ran.
+
+    :param args:
+        the arguments to run `git_ver.py` with, as on the command line
+    :param str socket_path:
+        [Opt] the server's socket, or nothing for :py:func:`default_socket_path`
+    :return:
+        the request's exit status
+    """
+    socket_path = socket_path or default_socket_path()
+    env = {name: value for name, value in os.environ.items()
+           if name in FORWARDED_ENV or name.startswith(FORWARDED_ENV_PREFIX)}
+    request = json.dumps({'args': args, 'cwd': os.getcwd(), 'env': env}).encode() + b'\n'
+
+    deadline = None
+    while True:
+        try:
+            response = _send(socket_path, request)
+            if not response.get('retry'):
+                break
+            # the server is restarting
+            deadline = time.monotonic() + CONNECT_TIMEOUT
+        except PermissionError as e:
+            print(f'not connecting to the git-ver server: {e}', file=sys.stderr)
+            return 2
+        except (ConnectionRefusedError, FileNotFoundError) as e:
+            if deadline is None or time.monotonic() >= deadline:
+                print(f'could not connect to the git-ver server at {socket_path} ({e}); start one with --serve',
+                      file=sys.stderr)
+                return 2
+        time.sleep(RETRY_INTERVAL)
+
+    sys.stdout.write(response.get('output', ''))
+    sys.stdout.flush()
+    return int(response.get('status', 1))
+
+
+def _loaded_sources(root: str) -> List[str]:
+    paths = (getattr(module, '__file__', None) for module in list(sys.modules.values()))
+    return [path for path in paths if path and path.startswith(root) and path.endswith('.py')]
+
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def serve(handler: Handler, socket_path: str = None, source_root: str = None) -> None:
+    """
+    Listen on the socket and run every request with the given handler, until interrupted.
+
+    :param handler:
+        runs one request, given its arguments, working directory, and environment variables, and returns its exit
+        status and everything that it printed
+    :param str socket_path:
+        [Opt] the socket to listen on, or nothing for :py:func:`default_socket_path`
+    :param str source_root:
+        [Opt] the directory of the source files to watch; the server restarts itself when any of the modules loaded
+        from there change
+    """
+    import logging
+    import signal
+    import socketserver
+
+    logger = logging.getLogger(__name__)
+    socket_path = socket_path or default_socket_path()
+    try:
+        _send(socket_path, b'{"ping": true}\n')
+        raise RuntimeError(f'a git-ver server is already listening at {socket_path}')
+    except (ConnectionRefusedError, FileNotFoundError):
+        pass
+    except ValueError:
+        raise RuntimeError(f'{socket_path} is in use by something other than a git-ver server')
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    watched = {}
+    restart = []
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            if request.get('ping'):
+                response = {'status': 0}
+            elif any(_mtime(path) != mtime for path, mtime in watched.items()):
+                logger.info('source files changed; restarting')
+                restart.append(True)
+                response = {'retry': True}
+            else:
+                start = time.perf_counter()
+                status, output = handler(request['args'], request['cwd'], request.get('env', {}))
+                logger.debug(f'ran {request["args"]} in {(time.perf_counter() - start) * 1000:.1f} ms: {status}')
+                response = {'status': status, 'output': output}
+                if source_root is not None:
+                    # modules loaded by this request are watched from now on
+                    for path in _loaded_sources(source_root):
+                        watched.setdefault(path, _mtime(path))
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, RequestHandler)
+    finally:
+        os.umask(old_umask)
+    if source_root is not None:
+        # after binding, so that everything imported at startup is watched
+        watched.update((path, _mtime(path)) for path in _loaded_sources(source_root))
+    logger.info(f'git-ver server listening at {socket_path}')
+    # so that the socket is removed when the server is stopped
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        with server:
+            while not restart:
+                server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    if restart:
+        os.execv(sys.executable, [sys.executable] + sys.argv)
@@ -2,14 +2,33 @@
 
 import os
 import logging
-from typing import Callable
-
-import in_place
+import mmap
+import subprocess
+from dataclasses import dataclass
+from itertools import repeat
+from typing import TYPE_CHECKING, Callable, FrozenSet, Iterable, List, Optional, Set, Tuple
 
+from tools import profiling
+from tools.profiling import profiled
 from tools.str_utils import str_is_empty
 
+if TYPE_CHECKING:
+    import in_place
+
 LOGGER = logging.getLogger(__file__)
 
+DEFAULT_PRUNE = frozenset({
+    '.git', '.hg', '.svn', '.tox', '.nox', '.venv', 'venv', '.eggs', '__pycache__', '.mypy_cache', '.pytest_cache',
+    'node_modules', 'target', 'build', 'dist',
+})
+"""Directory names that :py:func:`seek_file` never descends into unless told otherwise."""
+
+PARALLEL_THRESHOLD = 8
+"""The number of directories a level must have before its scan is fanned out over a thread pool."""
+
+SHALLOW_LEVELS = 2
+"""How many levels are scanned directly before the search is handed to `git ls-files` inside of a work tree."""
+
 
 def resolve_path_symbols(path: str) -> str:
     """
@@ -59,34 +78,322 @@ def maybe_make_abspath(maybe_path: str, file=False) -> str:
     raise ValueError(f'No file could be found with the path "{maybe_path}"')
 
 
-def _seek_to_depth(filename: str, dirpath: str, maxdepth: int) -> str or None:
-    for root, dirs, files in os.walk(dirpath):
-        if filename in files:
-            return os.path.join(root, filename)
-        if root.count(os.sep) >= maxdepth:
-            return None
-    LOGGER.debug(f'filename={filename} not found in dirpath={dirpath} within (total) depth={maxdepth}')
-    return None
+@dataclass
+class DiscoveryOptions:
+    """
+    Knobs controlling how :py:func:`seek_file` searches a directory tree for a file.
+
+    `prune` replaces the default set of directory names that are never descended into (:py:data:`DEFAULT_PRUNE`),
+    while `extra_prune` adds to whichever set is in effect. `strategy` is one of `"auto"` (scan the shallow levels
+    with `os.scandir`, then ask `git ls-files` if that is cheaper than continuing the walk), `"scandir"`, or `"git"`.
+    """
+
+    prune: Optional[Iterable[str]] = None
+    extra_prune: Iterable[str] = ()
+    follow_gitignore: bool = False
+    strategy: str = 'auto'
+    workers: Optional[int] = None
+
+    def pruned_names(self) -> FrozenSet[str]:
+        base = DEFAULT_PRUNE if self.prune is None else frozenset(self.prune)
+        return base.union(self.extra_prune)
+
+
+def _is_git_worktree(dirpath: str) -> bool:
+    """Cheaply determine whether the given directory is inside of a git work tree without spawning git."""
+    current = dirpath
+    while True:
+        if os.path.exists(os.path.join(current, '.git')):
+            return True
+        parent = os.path.dirname(current)
+        if parent == current:
+            return False
+        current = parent
+
+
+def _scan_dir(dirpath: str, filename: str, pruned: FrozenSet[str]) -> Tuple[bool, List[str], int]:
+    """
+    Scan a single directory, returning whether it directly contains the file, which of its subdirectories should
+    be searched next, and how many entries were visited.
+    """
+    found = False
+    subdirs = []
+    visited = 0
+    try:
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                visited += 1
+                name = entry.name
+                if name == filename:
+                    found = found or entry.is_file()
+                elif name not in pruned and entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+    except OSError as e:
+        LOGGER.debug(f'could not scan dirpath={dirpath}: {e}')
+    return found, subdirs, visited
+
+
+def _git_ignored(dirpaths: List[str], cwd: str) -> Set[str]:
+    """Ask git which of the given directories are ignored by the .gitignore rules in effect."""
+    if not dirpaths:
+        return set()
+    profiling.count(profiling.GIT_CALLS)
+    try:
+        proc = subprocess.run(['git', 'check-ignore', '-z', '--stdin'], cwd=cwd, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, input='\0'.join(dirpaths).encode())
+    except OSError:
+        return set()
+    return {os.fsdecode(path) for path in proc.stdout.split(b'\0') if path}
+
+
+def _seek_git(filename: str, dirpath: str, maxdepth: int or None, pruned: FrozenSet[str],
+              follow_gitignore: bool = False) -> str or None:
+    """
+    Find the shallowest tracked or untracked copy of the file using `git ls-files`, leaving out ignored ones only when
+    following .gitignore rules, like the `os.scandir` search does.
+    """
+    # the pruned directories are excluded, so that git never walks e.g. an untracked node_modules
+    args = ['git', 'ls-files', '-z', '--cached', '--others'] + [f'--exclude={name}' for name in sorted(pruned)]
+    if follow_gitignore:
+        args.append('--exclude-standard')
+    profiling.count(profiling.GIT_CALLS)
+    try:
+        proc = subprocess.run(args + ['--', f':(glob)**/{filename}'], cwd=dirpath, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
 
+    best = None
+    best_depth = None
+    for raw in proc.stdout.split(b'\0'):
+        if not raw:
+            continue
+        parts = os.fsdecode(raw).split('/')
+        depth = len(parts) - 1
+        if maxdepth is not None and depth > maxdepth:
+            continue
+        if pruned.intersection(parts[:-1]):
+            continue
+        relpath = '/'.join(parts)
+        if best is None or (depth, relpath) < (best_depth, best):
+            best, best_depth = relpath, depth
+    if best is None:
+        return None
+    return os.path.join(dirpath, *best.split('/'))
 
-def _seek_all(filename: str, dirpath: str) -> str or None:
-    for root, dirs, files in os.walk(dirpath):
-        if filename in files:
-            return os.path.join(root, filename)
-    LOGGER.debug(f'filename={filename} not found in dirpath={dirpath}')
+
+def _seek_breadth_first(filename: str, dirpath: str, maxdepth: int or None, options: DiscoveryOptions) -> str or None:
+    pruned = options.pruned_names()
+    in_worktree = _is_git_worktree(dirpath)
+    if options.strategy == 'git':
+        return _seek_git(filename, dirpath, maxdepth, pruned, options.follow_gitignore) if in_worktree else None
+
+    level = [dirpath]
+    depth = 0
+    executor = None
+    try:
+        while level:
+            if len(level) < PARALLEL_THRESHOLD:
+                results = [_scan_dir(path, filename, pruned) for path in level]
+            else:
+                if executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    executor = ThreadPoolExecutor(max_workers=options.workers)
+                results = list(executor.map(_scan_dir, level, repeat(filename), repeat(pruned)))
+
+            profiling.count(profiling.FILES_VISITED, sum(visited for _, _, visited in results))
+            matches = [path for path, (found, _, _) in zip(level, results) if found]
+            if matches:
+                return os.path.join(min(matches), filename)
+            if maxdepth is not None and depth >= maxdepth:
+                break
+
+            level = [subdir for _, subdirs, _ in results for subdir in subdirs]
+            if in_worktree and options.follow_gitignore:
+                ignored = _git_ignored(level, dirpath)
+                level = [path for path in level if path not in ignored]
+            depth += 1
+            if in_worktree and options.strategy == 'auto' and depth >= SHALLOW_LEVELS and level:
+                return _seek_git(filename, dirpath, maxdepth, pruned, options.follow_gitignore)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    LOGGER.debug(f'filename={filename} not found in dirpath={dirpath} within depth={maxdepth}')
     return None
 
 
-def seek_file(filename: str, start_dir: str, maxdepth: int = None) -> str:
+@profiled('seek_file')
+def seek_file(filename: str, start_dir: str, maxdepth: int = None, options: DiscoveryOptions = None) -> str or None:
+    """
+    Find the shallowest file with the given name at or beneath the given directory.
+
+    The tree is searched breadth-first with `os.scandir`, one level at a time (fanned out over a thread pool for wide
+    levels), never descending into pruned directories such as `.git`, `target`, or `node_modules`. Inside of a git
+    work tree, once the shallow levels have been exhausted, the remaining search is handed to `git ls-files`, which
+    reads the index instead of the disk.
+
+    :param str filename:
+        the name of the file to find
+    :param str start_dir:
+        the directory at which to start searching
+    :param int maxdepth:
+        [Opt] how many levels beneath `start_dir` may be searched, or nothing to search the whole tree
+    :param DiscoveryOptions options:
+        [Opt] the pruning and strategy options to search with, or nothing to use the defaults
+    :return:
+        the absolute path to the shallowest matching file, or `None` if none could be found
+    """
     dirpath = maybe_make_abspath(start_dir)
-    if maxdepth:
-        depth = dirpath.count(os.sep) + maxdepth
-        return _seek_to_depth(filename, dirpath, depth)
-    return _seek_all(filename, dirpath)
+    return _seek_breadth_first(filename, dirpath, maxdepth, options or DiscoveryOptions())
+
+
+def fsync_dir(dirpath: str) -> None:
+    """
+    Flush a directory's entries (e.g. a just-renamed file) to disk, on platforms that allow directories to be opened.
+
+    :param str dirpath:
+        the directory to flush
+    """
+    try:
+        fd = os.open(dirpath, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _patch_atomically(path: str, spans: List[Tuple[int, int, bytes]]) -> None:
+    import shutil
+    import tempfile
+
+    size = os.path.getsize(path)
+    kept = size - sum(end - start for start, end, _ in spans)
+    profiling.count(profiling.BYTES_READ, kept)
+    profiling.count(profiling.BYTES_WRITTEN, kept + sum(len(replacement) for _, _, replacement in spans))
+
+    dirpath = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', dir=dirpath)
+    try:
+        with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            size = os.fstat(src.fileno()).st_size
+            if size:
+                with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    position = 0
+                    for start, end, replacement in spans:
+                        dst.write(buffer[position:start])
+                        dst.write(replacement)
+                        position = end
+                    dst.write(buffer[position:])
+            else:
+                for _, _, replacement in spans:
+                    dst.write(replacement)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_dir(dirpath)
+
 
+def _patch_in_place(path: str, spans: List[Tuple[int, int, bytes]]) -> None:
+    with open(path, 'r+b') as fo:
+        if all(len(replacement) == end - start for start, end, replacement in spans):
+            profiling.count(profiling.BYTES_WRITTEN, sum(len(replacement) for _, _, replacement in spans))
+            with mmap.mmap(fo.fileno(), 0) as buffer:
+                for start, end, replacement in spans:
+                    buffer[start:end] = replacement
+                buffer.flush()
+        else:
+            first = spans[0][0]
+            fo.seek(first)
+            tail = fo.read()
+            profiling.count(profiling.BYTES_READ, len(tail))
+            pieces = []
+            position = first
+            for start, end, replacement in spans:
+                pieces.append(tail[position - first:start - first])
+                pieces.append(replacement)
+                position = end
+            pieces.append(tail[position - first:])
+            patched = b''.join(pieces)
+            profiling.count(profiling.BYTES_WRITTEN, len(patched))
+            fo.seek(first)
+            fo.write(patched)
+            fo.truncate()
+            fo.flush()
+        os.fsync(fo.fileno())
 
+
+def patch_file_spans(path: str, spans: Iterable[Tuple[int, int, bytes]], atomic: bool = None) -> None:
+    """
+    Replace several non-overlapping spans of the given file at once, reading and writing the file only once; see
+    :py:func:`patch_file_span`.
+
+    :param str path:
+        the path to the file to patch
+    :param spans:
+        the `(start, end, replacement)` of each span to replace, in any order
+    :param bool atomic:
+        [Opt] `True` to always rename a new copy into place, `False` to always patch in place, or nothing to decide
+        based on whether the length of any span changes
+    """
+    spans = sorted(spans)
+    if not spans:
+        return
+    for (_, end, _), (start, _, _) in zip(spans, spans[1:]):
+        if start < end:
+            raise ValueError(f'overlapping spans to patch in {path}')
+    if atomic is None:
+        atomic = any(len(replacement) != end - start for start, end, replacement in spans)
+    LOGGER.debug(f'patching path={path} spans={[(start, end) for start, end, _ in spans]} atomic={atomic}')
+    if atomic:
+        _patch_atomically(path, spans)
+    else:
+        _patch_in_place(path, spans)
+
+
+def patch_file_span(path: str, start: int, end: int, replacement: bytes, atomic: bool = None) -> None:
+    """
+    Replace the bytes of the given file in the span `[start, end)`, leaving everything else in the file untouched.
+
+    A same-length replacement is written in place through an `mmap`, touching only the page(s) that the span is on.
+    Otherwise the file is, by default, rewritten into a temporary file in the same directory, fsynced, and renamed
+    over the original so that readers only ever see the old or new contents; with `atomic=False`, only the tail of
+    the file after the span is shifted in place instead.
+
+    :param str path:
+        the path to the file to patch
+    :param int start:
+        the offset of the first byte to replace
+    :param int end:
+        the offset just past the last byte to replace
+    :param bytes replacement:
+        the bytes to put in place of the span
+    :param bool atomic:
+        [Opt] `True` to always rename a new copy into place, `False` to always patch in place, or nothing to decide
+        based on whether the length of the span changes
+    """
+    patch_file_spans(path, [(start, end, replacement)], atomic)
+
+
+@profiled('write_new_version')
 def write_new_version(new_version: str, lineno: int, cfg_path: str,
-                      write_func: Callable[[str, in_place.InPlace], None]) -> None:
+                      write_func: Callable[[str, 'in_place.InPlace'], None]) -> None:
+    import in_place
+
+    size = os.path.getsize(cfg_path)
+    profiling.count(profiling.BYTES_READ, size)
+    profiling.count(profiling.BYTES_WRITTEN, size)
     with in_place.InPlace(cfg_path) as fo:
         count = -1
         for line in fo:
@@ -2,36 +2,39 @@
 
 import os
 import logging
-from typing import List
+from itertools import islice
+from typing import Iterable, Iterator, List
 
-from git import Repo, GitConfigParser, Actor, IndexFile, BaseIndexEntry, Commit
+from git import Repo, Actor, IndexFile, BaseIndexEntry, Commit
+from git.exc import HookExecutionError
+
+from tools import plumbing, profiling
+from tools.branch_policy import BranchPolicy
+from tools.plumbing import GitPlumbingError, HookRejectedError, IndexEntry
+from tools.pool import POOL
+from tools.profiling import profiled
 
 LOGGER = logging.getLogger(__name__)
 
 
-def get_author() -> Actor:
+def get_author(dirpath: str = None) -> Actor:
     """
-    Get the name and email information in the user's .gitconfig.
+    Get the name and email of the commit author, as git would resolve them for the repo at the given path (from
+    `GIT_AUTHOR_NAME`/`GIT_AUTHOR_EMAIL`, or else every layer of its git config), resolved once and then reused
+    from the shared :py:class:`~tools.pool.RepoPool` until that config changes.
 
+    :param str dirpath:
+        [Opt] the path to the repo, or nothing to use the current working directory
     :return: the git author information as an :py:class:`~git.util.Actor`
     """
-    info = {}
-
-    gitconfig = GitConfigParser(os.path.expanduser('~/.gitconfig'))
-    sections = gitconfig.sections()
-    assert 'user' in sections, 'No "user" field in .gitconfig'
-    user_items = gitconfig.items('user')
-
-    for tup in user_items:
-        info[tup[0]] = tup[1]
-    assert 'name' in info and 'email' in info, 'Incomplete information (name and/or email) in .gitconfig'
-
-    return Actor(name=info['name'], email=info['email'])
+    name, email = POOL.author(dirpath or os.getcwd())
+    return Actor(name=name, email=email)
 
 
 def get_repo(repo_filepath: str = None) -> Repo:
     """
-    Retrieves a :py:class:`~git.repo.base.Repo` from the given filepath.
+    Retrieves a :py:class:`~git.repo.base.Repo` from the given filepath, opening it only the first time and reusing
+    it (from the shared :py:class:`~tools.pool.RepoPool`) afterwards.
 
     :param str repo_filepath:
         [Opt] the path at which there may be a git repo, or nothing to use the current working directory's path
@@ -45,7 +48,7 @@ def get_repo(repo_filepath: str = None) -> Repo:
         cwd = os.path.abspath(os.getcwd())
         assert '.git' in os.listdir(cwd)
         repo_abspath = cwd
-    return Repo(repo_abspath)
+    return POOL.repo(repo_abspath)
 
 
 def get_head_commit(filepath: str) -> Commit:
@@ -58,9 +61,7 @@ def get_head_commit(filepath: str) -> Commit:
         the :py:class:`~git.objects.commit.Commit` of the repo at the given path
     """
     LOGGER.debug(f'filepath={filepath}')
-    repo = Repo(filepath)
-
-    return repo.head.commit
+    return get_repo(filepath).head.commit
 
 
 def get_unstaged_filenames(repo: Repo) -> list:
@@ -77,19 +78,52 @@ def get_unstaged_filenames(repo: Repo) -> list:
     return untracked + other_unstaged
 
 
-def warn_master_commit(index: IndexFile) -> None:
+def iter_unstaged_filenames(repo: Repo, prefix: str = None, limit: int = None) -> Iterator[str]:
+    """
+    Stream the names of the files in this repo that are unstaged, untracked, or staged but uncommitted (the same
+    files as :py:func:`get_unstaged_filenames`), one at a time, without building lists of every file and diff.
+
+    :param Repo repo:
+        the repo to check for unstaged/untracked files
+    :param str prefix:
+        [Opt] only report (and only scan) files beneath this path, relative to the top of the work tree
+    :param int limit:
+        [Opt] stop (and stop git) after this many files
+    :return:
+        an iterator of the files' paths, relative to the top of the work tree
+    """
+    pathspecs = [f':(literal){prefix}'] if prefix else None
+    paths = (entry.path for entry in plumbing.iter_status(repo.working_tree_dir, pathspecs))
+    return islice(paths, limit) if limit is not None else paths
+
+
+def count_unstaged_filenames(repo: Repo, prefix: str = None) -> int:
     """
-    Ask the user if they truly wish to commit, in the case that they are on the master branch, halting
-    execution if not.
+    Count the files that :py:func:`iter_unstaged_filenames` would report, without keeping any of them.
+
+    :param Repo repo:
+        the repo to check for unstaged/untracked files
+    :param str prefix:
+        [Opt] only count files beneath this path, relative to the top of the work tree
+    :return:
+        the number of unstaged, untracked, or staged but uncommitted files
+    """
+    return sum(1 for _ in iter_unstaged_filenames(repo, prefix))
+
+
+@profiled('git: protected branch check')
+def warn_master_commit(index: IndexFile, policy: BranchPolicy = None) -> None:
+    """
+    Apply the protected-branch policy before committing on the current branch: by default, ask the user if they truly
+    wish to commit when on the master (or main) branch, halting execution if not, and refuse outright when there is no
+    terminal to ask on.
 
     :param IndexFile index:
         the current index of the current branch of the current repo
+    :param BranchPolicy policy:
+        [Opt] the protected branches and what to do about them, or nothing to read them from the environment
     """
-    if index.repo.head.ref == index.repo.branches.master:
-        warning_answer = input('Are you sure that you want to commit to the master branch? [y/N]')
-        if warning_answer.lower() in ['y', 'yes', 'ye', 'yep', 'yeah']:
-            print('Quitting...')
-            raise RuntimeError
+    (policy or BranchPolicy.from_env()).check(index.repo.git_dir)
 
 
 def git_add(index: IndexFile, files) -> List[BaseIndexEntry]:
@@ -106,6 +140,7 @@ def git_add(index: IndexFile, files) -> List[BaseIndexEntry]:
     return index.add(files)
 
 
+@profiled('git: commit')
 def git_commit(index: IndexFile, message: str) -> Commit:
     """
     Commit all staged files in the current repo.
@@ -117,10 +152,119 @@ def git_commit(index: IndexFile, message: str) -> Commit:
     :return:
         a record of the commit (:py:class:`~git.objects.commit.Commit`), itself
     """
-    return index.commit(message, author=get_author())
+    author = get_author(index.repo.working_tree_dir)
+    # GitPython runs the repository's commit hooks, which must not bump the version again
+    old_skip = os.environ.get(plumbing.SKIP_HOOK_ENV)
+    os.environ[plumbing.SKIP_HOOK_ENV] = '1'
+    try:
+        return index.commit(message, author=author)
+    except HookExecutionError as e:
+        raise HookRejectedError(str(e)) from e
+    finally:
+        if old_skip is None:
+            del os.environ[plumbing.SKIP_HOOK_ENV]
+        else:
+            os.environ[plumbing.SKIP_HOOK_ENV] = old_skip
 
 
-def do_git_commit(message: str, dirpath: str = None) -> None:
+def scoped_pathspecs(repo: Repo, files: Iterable[str] = (), pathspecs: Iterable[str] = ()) -> List[str]:
+    """
+    Build the pathspecs that limit staging to exactly the given files, plus any other pathspecs.
+
+    :param Repo repo:
+        the repo that the files are in
+    :param files:
+        [Opt] paths (absolute, or relative to the current directory) of files to stage, matched literally
+    :param pathspecs:
+        [Opt] more pathspecs, relative to the top of the work tree, passed to git as they are
+    :return:
+        the pathspecs
+    """
+    top = repo.working_tree_dir
+    literal = [f':(literal){os.path.relpath(os.path.abspath(path), top)}' for path in files]
+    return literal + list(pathspecs)
+
+
+@profiled('git: stage')
+def plumbing_stage(repo: Repo, pathspecs: List[str] = None) -> List[IndexEntry]:
+    """
+    Stage every modified or deleted tracked file (like `git add -u`), letting git find and hash only the changed
+    paths instead of loading the index into Python.
+
+    :param Repo repo:
+        the repo whose changes should be staged
+    :param pathspecs:
+        [Opt] only stage (and only look at) the paths matching these pathspecs, or nothing to scan the whole work
+        tree, using git's untracked cache and file system monitor where available
+    :return:
+        the index entries that staging replaced, for :py:func:`~tools.plumbing.restore_index` to put back
+    """
+    entries = plumbing.changed_tracked_entries(repo.working_tree_dir, pathspecs, fast=pathspecs is None)
+    plumbing.update_index(repo.working_tree_dir, [entry.path for entry in entries])
+    return entries
+
+
+@profiled('git: commit')
+def plumbing_commit(repo: Repo, message: str) -> str:
+    """
+    Commit the index of the given repo with `write-tree`, `commit-tree`, and `update-ref`, producing the same commit
+    as :py:func:`git_commit` would without GitPython ever reading or rewriting the index.
+
+    Like :py:func:`git_commit`, it runs the repository's `pre-commit`, `commit-msg`, and `post-commit` hooks (with
+    git-ver's own hooks told not to bump again), and a `pre-commit` or `commit-msg` hook that fails stops the commit.
+
+    :param Repo repo:
+        the repo to commit to
+    :param str message:
+        the commit message
+    :return:
+        the id of the new commit
+    :raises HookRejectedError:
+        if a hook rejects the commit
+    """
+    cwd = repo.working_tree_dir
+    author = get_author(cwd)
+    hooks_dir = plumbing.hooks_dir(cwd)
+    hook_env = {plumbing.SKIP_HOOK_ENV: '1', 'GIT_EDITOR': ':'}
+    plumbing.run_hook(cwd, hooks_dir, 'pre-commit', env=hook_env)
+    message_path = os.path.join(repo.git_dir, 'COMMIT_EDITMSG')
+    if os.access(os.path.join(hooks_dir, 'commit-msg'), os.X_OK):
+        # the hook may rewrite the message in place
+        with open(message_path, 'w') as fo:
+            fo.write(message)
+        try:
+            plumbing.run_hook(cwd, hooks_dir, 'commit-msg', [message_path], hook_env)
+            with open(message_path, 'r') as fo:
+                message = fo.read()
+        finally:
+            os.remove(message_path)
+
+    parent = plumbing.rev_parse(cwd, 'HEAD')
+    tree = plumbing.write_tree(cwd)
+    parents = [parent] if parent is not None else []
+    commit = plumbing.commit_tree(cwd, tree, parents, message, author.name, author.email)
+
+    plumbing.update_ref(cwd, 'HEAD', commit, parent, message.split('\n', 1)[0])
+    try:
+        plumbing.run_hook(cwd, hooks_dir, 'post-commit', env=hook_env)
+    except HookRejectedError as e:
+        # as with `git commit`, the commit stands whatever the post-commit hook does
+        LOGGER.warning(e)
+    return commit
+
+
+@profiled('git: stage')
+def _gitpython_stage(repo: Repo, pathspecs: List[str] = None) -> None:
+    profiling.count(profiling.GIT_CALLS)
+    if pathspecs is None:
+        repo.git.add(update=True)
+    else:
+        repo.git.add('--', *pathspecs, update=True)
+
+
+@profiled('do_git_commit')
+def do_git_commit(message: str, dirpath: str = None, backend: str = 'plumbing', files: Iterable[str] = None,
+                  pathspecs: Iterable[str] = (), policy: BranchPolicy = None) -> None:
     """
     Perform the necessary functions to commit the files in the repo at the given path.
 
@@ -128,11 +272,44 @@ def do_git_commit(message: str, dirpath: str = None) -> None:
         the commit message
     :param str dirpath:
         [Opt] the path to the repo to commit files to
+    :param str backend:
+        [Opt] `"plumbing"` (default) to commit with git's plumbing commands, falling back to GitPython if they fail,
+        or `"gitpython"` to commit through GitPython's :py:class:`~git.index.base.IndexFile`
+    :param files:
+        [Opt] stage only these files (e.g. the config files that were bumped) and anything matching `pathspecs`,
+        or nothing to stage every change to a tracked file
+    :param pathspecs:
+        [Opt] more pathspecs to stage, relative to the top of the work tree, when `files` is given
+    :param BranchPolicy policy:
+        [Opt] the protected branches and what to do about a commit to one, or nothing to read them from the
+        environment
     """
-    LOGGER.debug(f'dirpath={dirpath}')
+    LOGGER.debug(f'dirpath={dirpath} backend={backend}')
     repo = get_repo(dirpath)
     index = repo.index
-    repo.git.add(update=True)
-    warn_master_commit(index)
-    commit = git_commit(index, message)
+    # before anything is staged, so a refused commit (or a missing author) leaves the index as it was
+    warn_master_commit(index, policy)
+    get_author(repo.working_tree_dir)
+    scope = scoped_pathspecs(repo, files, pathspecs) if files is not None else None
+
+    # what staging replaces in the index, which is put back if a hook rejects the commit
+    replaced = {}
+    try:
+        if backend == 'plumbing':
+            try:
+                replaced.update((entry.path, entry) for entry in plumbing_stage(repo, scope))
+                plumbing_commit(repo, message)
+                summary = message.split('\n', 1)[0]
+                print(f'\nCommit summary: {summary}\n')
+                return
+            except GitPlumbingError as e:
+                LOGGER.warning(f'plumbing commit failed; falling back to GitPython: {e}')
+
+        for entry in plumbing.changed_tracked_entries(repo.working_tree_dir, scope):
+            replaced.setdefault(entry.path, entry)
+        _gitpython_stage(repo, scope)
+        commit = git_commit(index, message)
+    except HookRejectedError:
+        plumbing.restore_index(repo.working_tree_dir, replaced.values())
+        raise
     print(f'\nCommit summary: {commit.summary}\n')
@@ -0,0 +1,590 @@
+"""
+Thin wrappers around git's plumbing commands, run directly as subprocesses so that operations which only touch a few
+paths or objects never load the whole index (or GitPython) into Python.
+"""
+
+import functools
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from tools import profiling
+
+LOGGER = logging.getLogger(__name__)
+
+# set while git-ver makes a commit of its own, so that its commit hooks (see git_ver_hook.py) do not bump again
+SKIP_HOOK_ENV = 'GIT_VER_SKIP_HOOK'
+
+
+class GitPlumbingError(RuntimeError):
+    """Raised when a git plumbing command exits unsuccessfully."""
+
+
+class HookRejectedError(ValueError):
+    """Raised when one of the repository's hooks exits unsuccessfully, rejecting a commit."""
+
+
+def run_git(args: List[str], cwd: str, input: bytes = None, env: Dict[str, str] = None) -> bytes:
+    """
+    Run a git command and return its standard output.
+
+    :param args:
+        the arguments to pass to `git`
+    :param str cwd:
+        the directory to run git in
+    :param bytes input:
+        [Opt] the bytes to send to the command's standard input
+    :param env:
+        [Opt] environment variables to set for the command, on top of the current environment
+    :return:
+        everything the command wrote to its standard output
+    """
+    full_env = None
+    if env:
+        full_env = dict(os.environ)
+        full_env.update(env)
+    LOGGER.debug(f'git {" ".join(args)}')
+    profiling.count(profiling.GIT_CALLS)
+    try:
+        proc = subprocess.run(['git'] + list(args), cwd=cwd, input=input, env=full_env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitPlumbingError(f'could not run git: {e}') from e
+    if proc.returncode != 0:
+        raise GitPlumbingError(f'git {args[0]} failed ({proc.returncode}): {proc.stderr.decode(errors="replace")}')
+    return proc.stdout
+
+
+def rev_parse(cwd: str, rev: str) -> Optional[str]:
+    """
+    Resolve a revision to an object id.
+
+    :param str cwd:
+        the directory of the repository
+    :param str rev:
+        the revision to resolve (e.g. `HEAD`)
+    :return:
+        the object id, or `None` if the revision does not resolve (e.g. `HEAD` of a repository with no commits)
+    """
+    try:
+        return run_git(['rev-parse', '--verify', '-q', rev], cwd).decode().strip() or None
+    except GitPlumbingError:
+        return None
+
+
+def is_ancestor(cwd: str, ancestor: str, descendant: str) -> bool:
+    """
+    Check whether one commit is reachable from another (which counts a commit as its own ancestor).
+
+    :param str cwd:
+        the directory of the repository
+    :param str ancestor:
+        the possible ancestor
+    :param str descendant:
+        the possible descendant
+    :return:
+        whether the ancestor is reachable from the descendant; `False` if either does not resolve
+    """
+    try:
+        run_git(['merge-base', '--is-ancestor', ancestor, descendant], cwd)
+        return True
+    except GitPlumbingError:
+        return False
+
+
+def full_ref_name(cwd: str, ref: str) -> str:
+    """
+    Expand a (possibly abbreviated) ref name, e.g. `main` to `refs/heads/main`, leaving `HEAD` and unknown names as
+    they are.
+
+    :param str cwd:
+        the directory of the repository
+    :param str ref:
+        the ref name to expand
+    :return:
+        the full name of the ref
+    """
+    if ref == 'HEAD' or ref.startswith('refs/'):
+        return ref
+    try:
+        return run_git(['rev-parse', '--symbolic-full-name', ref], cwd).decode().strip() or ref
+    except GitPlumbingError:
+        return ref
+
+
+@functools.lru_cache(maxsize=None)
+def git_version() -> Tuple[int, ...]:
+    """
+    Get the version of the installed git.
+
+    :return:
+        the version's numeric parts, e.g. `(2, 39, 5)`, or an empty tuple if it cannot be determined
+    """
+    try:
+        output = run_git(['version'], os.curdir).decode()
+    except GitPlumbingError:
+        return ()
+    match = re.search(r'(\d+(?:\.\d+)+)', output)
+    return tuple(int(part) for part in match.group(1).split('.')) if match else ()
+
+
+def _config_is_set(cwd: str, key: str) -> bool:
+    try:
+        run_git(['config', '--get', key], cwd)
+        return True
+    except GitPlumbingError:
+        return False
+
+
+def fast_scan_args(cwd: str) -> List[str]:
+    """
+    Get the `-c` options that let git skip work when scanning the whole work tree: the untracked cache, and (on
+    platforms where git ships its own file system monitor) `core.fsmonitor`. Settings that the repository already
+    configures are left alone.
+
+    :param str cwd:
+        the directory of the repository
+    :return:
+        the options to put before the git command
+    """
+    args = []
+    if not _config_is_set(cwd, 'core.untrackedCache'):
+        args.extend(['-c', 'core.untrackedCache=true'])
+    if sys.platform in ('darwin', 'win32') and git_version() >= (2, 36) and not _config_is_set(cwd, 'core.fsmonitor'):
+        args.extend(['-c', 'core.fsmonitor=true'])
+    return args
+
+
+class IndexEntry(NamedTuple):
+    """The mode, object id, and path (relative to the top of the work tree) of one entry of the index."""
+
+    mode: str
+    oid: str
+    path: str
+
+
+def changed_tracked_entries(cwd: str, pathspecs: Iterable[str] = None, fast: bool = False) -> List[IndexEntry]:
+    """
+    List the index entries of the tracked paths whose working tree copy differs from the index (including deleted
+    ones), as they are before those paths are staged.
+
+    :param str cwd:
+        the top-level directory of the work tree
+    :param pathspecs:
+        [Opt] limit the scan to paths matching these pathspecs, so that nothing else in the work tree is looked at
+    :param bool fast:
+        [Opt] whether to scan with :py:func:`fast_scan_args`, for when the whole work tree is being scanned
+    :return:
+        the changed paths' index entries
+    """
+    args = fast_scan_args(cwd) if fast else []
+    args += ['diff-files', '--raw', '-z']
+    if pathspecs is not None:
+        args += ['--'] + list(pathspecs)
+    fields = run_git(args, cwd).split(b'\0')
+    entries = []
+    # each record is ":<index mode> <work tree mode> <index id> <work tree id> <status>", then the path
+    for record, path in zip(fields[0::2], fields[1::2]):
+        mode, _, oid, _, _ = record[1:].decode().split(' ')
+        entries.append(IndexEntry(mode, oid, os.fsdecode(path)))
+    return entries
+
+
+def changed_tracked_paths(cwd: str, pathspecs: Iterable[str] = None, fast: bool = False) -> List[str]:
+    """
+    List the tracked paths whose working tree copy differs from the index (including deleted ones).
+
+    :param str cwd:
+        the top-level directory of the work tree
+    :param pathspecs:
+        [Opt] limit the scan to paths matching these pathspecs, so that nothing else in the work tree is looked at
+    :param bool fast:
+        [Opt] whether to scan with :py:func:`fast_scan_args`, for when the whole work tree is being scanned
+    :return:
+        the changed paths, relative to the top of the work tree
+    """
+    return [entry.path for entry in changed_tracked_entries(cwd, pathspecs, fast)]
+
+
+class StatusEntry(NamedTuple):
+    """
+    One record of `git status --porcelain=v2`: its kind (`"1"` changed, `"2"` renamed or copied, `"u"` unmerged, or
+    `"?"` untracked), its two-letter index/work tree status (e.g. `".M"`, or `"??"` when untracked), its path, and
+    for renames and copies, the path it came from.
+    """
+
+    kind: str
+    xy: str
+    path: str
+    orig_path: Optional[str] = None
+
+
+# the number of space-separated fields before the path in each kind of porcelain v2 record
+_STATUS_FIELDS = {b'1': 8, b'2': 9, b'u': 10, b'?': 1, b'!': 1}
+
+
+def iter_status(cwd: str, pathspecs: Iterable[str] = None, untracked: bool = True, fast: bool = True,
+                chunk_size: int = 1 << 16) -> Iterator[StatusEntry]:
+    """
+    Stream the status of the work tree from `git status --porcelain=v2 -z`, one record at a time, without ever
+    holding more than a chunk of git's output in memory.
+
+    Closing the iterator early (e.g. by breaking out of a loop over it, or with `itertools.islice`) stops git.
+
+    :param str cwd:
+        the top-level directory of the work tree
+    :param pathspecs:
+        [Opt] only report (and only look at) paths matching these pathspecs, e.g. a directory prefix
+    :param bool untracked:
+        [Opt] whether to report untracked files, each of them individually; `True` by default
+    :param bool fast:
+        [Opt] whether to scan with :py:func:`fast_scan_args`; `True` by default
+    :param int chunk_size:
+        [Opt] how many bytes of git's output to read at a time
+    :return:
+        an iterator of each :py:class:`StatusEntry`
+    """
+    args = ['git'] + (fast_scan_args(cwd) if fast else [])
+    args += ['status', '--porcelain=v2', '-z', '--untracked-files=' + ('all' if untracked else 'no')]
+    if pathspecs is not None:
+        args += ['--'] + list(pathspecs)
+    rename = None
+    for record in iter_records(args, cwd, chunk_size):
+        if rename is not None:
+            yield rename._replace(orig_path=os.fsdecode(record))
+            rename = None
+            continue
+        kind = record[:1]
+        fields = _STATUS_FIELDS.get(kind)
+        if fields is None:
+            continue
+        parts = record.split(b' ', fields)
+        xy = parts[1].decode() if fields > 1 else kind.decode() * 2
+        entry = StatusEntry(kind.decode(), xy, os.fsdecode(parts[fields]))
+        if kind == b'2':
+            rename = entry
+        elif kind != b'!':
+            yield entry
+
+
+def iter_changed_paths(cwd: str, since: str, until: str = 'HEAD', chunk_size: int = 1 << 16) -> Iterator[str]:
+    """
+    Stream the paths changed between two commits from a single `git diff-tree -r --name-only -z`, relative to (and
+    limited to) the given directory. A renamed file is reported at both its old and new paths.
+
+    :param str cwd:
+        the directory whose changed paths to report
+    :param str since:
+        the older commit, e.g. the tag of the last release
+    :param str until:
+        [Opt] the newer commit; `HEAD` by default
+    :param int chunk_size:
+        [Opt] how many bytes of git's output to read at a time
+    :return:
+        an iterator of the changed paths, relative to the given directory
+    """
+    args = ['git', 'diff-tree', '-r', '--name-only', '-z', '--no-renames', '--relative', since, until, '--']
+    return map(os.fsdecode, iter_records(args, cwd, chunk_size))
+
+
+def iter_records(args: List[str], cwd: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    """
+    Run a git command whose output is NUL-delimited (e.g. with `-z`) and stream its records one at a time, never
+    holding more than a chunk of the output in memory. Closing the iterator early stops git.
+
+    :param args:
+        the whole command, starting with `git`
+    :param str cwd:
+        the directory to run git in
+    :param int chunk_size:
+        [Opt] how many bytes of git's output to read at a time
+    :return:
+        an iterator of each non-empty record
+    """
+    profiling.count(profiling.GIT_CALLS)
+    proc = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        pending = b''
+        while True:
+            chunk = proc.stdout.read(chunk_size)
+            if not chunk:
+                break
+            records = (pending + chunk).split(b'\0')
+            pending = records.pop()
+            for record in records:
+                if record:
+                    yield record
+        if pending:
+            yield pending
+        if proc.wait() != 0:
+            stderr = proc.stderr.read().decode(errors='replace').strip()
+            raise GitPlumbingError(f'{" ".join(args)} failed ({proc.returncode}): {stderr}')
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def update_index(cwd: str, paths: Iterable[str]) -> None:
+    """
+    Stage the working tree contents of the given tracked paths, removing those that no longer exist.
+
+    :param str cwd:
+        the top-level directory of the work tree
+    :param paths:
+        the paths to stage, relative to the top of the work tree
+    """
+    stdin = b''.join(os.fsencode(path) + b'\0' for path in paths)
+    if stdin:
+        run_git(['update-index', '--remove', '-z', '--stdin'], cwd, input=stdin)
+
+
+def restore_index(cwd: str, entries: Iterable[IndexEntry]) -> None:
+    """
+    Put back index entries listed by :py:func:`changed_tracked_entries`, e.g. to unstage a commit that was refused.
+
+    :param str cwd:
+        the top-level directory of the work tree
+    :param entries:
+        the entries to put back; those of unmerged paths, which cannot be, are left as they are
+    """
+    stdin = b''.join(f'{entry.mode} {entry.oid}\t'.encode() + os.fsencode(entry.path) + b'\0'
+                     for entry in entries if entry.mode != '000000')
+    if stdin:
+        run_git(['update-index', '-z', '--index-info'], cwd, input=stdin)
+
+
+def write_tree(cwd: str) -> str:
+    """
+    Write the current index out as a tree object.
+
+    :param str cwd:
+        the directory of the repository
+    :return:
+        the id of the tree
+    """
+    return run_git(['write-tree'], cwd).decode().strip()
+
+
+def hooks_dir(cwd: str) -> str:
+    """
+    Find the directory that the repository's hooks are in, wherever `core.hooksPath` points.
+
+    :param str cwd:
+        the directory of the repository
+    :return:
+        the absolute path to the hooks directory (which need not exist)
+    """
+    path = run_git(['rev-parse', '--git-path', 'hooks'], cwd).decode().strip()
+    return os.path.normpath(os.path.join(os.path.abspath(cwd), path))
+
+
+def run_hook(cwd: str, hooks_path: str, name: str, args: Iterable[str] = (), env: Dict[str, str] = None) -> bool:
+    """
+    Run one of the repository's hooks, if it has one, from the top of the work tree, the way that `git commit` does.
+    Whatever the hook prints is passed on to standard error.
+
+    :param str cwd:
+        the top-level directory of the work tree
+    :param str hooks_path:
+        the repository's hooks directory, from :py:func:`hooks_dir`
+    :param str name:
+        the name of the hook, e.g. `pre-commit`
+    :param args:
+        [Opt] the arguments to pass to the hook
+    :param env:
+        [Opt] environment variables to set for the hook, on top of the current environment
+    :return:
+        whether the hook exists (and so was run)
+    """
+    path = os.path.join(hooks_path, name)
+    if not os.access(path, os.X_OK):
+        return False
+    # `git hook run` knows how to run a hook on every platform (e.g. a shell script on Windows)
+    command = ['git', 'hook', 'run', name, '--'] if git_version() >= (2, 36) else [path]
+    full_env = dict(os.environ)
+    full_env.update(env or {})
+    LOGGER.debug(f'running the {name} hook')
+    profiling.count(profiling.GIT_CALLS)
+    try:
+        proc = subprocess.run(command + list(args), cwd=cwd, env=full_env, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT)
+    except OSError as e:
+        raise HookRejectedError(f'could not run the {name} hook: {e}') from e
+    output = proc.stdout.decode(errors='replace')
+    if proc.returncode != 0:
+        raise HookRejectedError(f'the {name} hook failed ({proc.returncode}){": " + output if output else ""}')
+    if output:
+        sys.stderr.write(output)
+    return True
+
+
+def commit_tree(cwd: str, tree: str, parents: Iterable[str], message: str, author_name: str,
+                author_email: str) -> str:
+    """
+    Create a commit object for the given tree, without touching the index or any refs.
+
+    The message is passed to git verbatim, and the committer is resolved by git from the environment and
+    configuration, the same way that `git commit` does.
+
+    :param str cwd:
+        the directory of the repository
+    :param str tree:
+        the id of the tree to commit
+    :param parents:
+        the ids of the commit's parents
+    :param str message:
+        the commit message
+    :param str author_name:
+        the name of the commit's author
+    :param str author_email:
+        the email of the commit's author
+    :return:
+        the id of the new commit
+    """
+    args = ['commit-tree', tree]
+    for parent in parents:
+        args.extend(['-p', parent])
+    env = {'GIT_AUTHOR_NAME': author_name, 'GIT_AUTHOR_EMAIL': author_email}
+    return run_git(args, cwd, input=message.encode(), env=env).decode().strip()
+
+
+def update_ref(cwd: str, ref: str, new: str, old: Optional[str], reflog_message: str) -> None:
+    """
+    Point a ref at a new object, failing if it no longer points at the expected old object.
+
+    :param str cwd:
+        the directory of the repository
+    :param str ref:
+        the ref to update (e.g. `HEAD` or `refs/heads/main`)
+    :param str new:
+        the id that the ref should point to
+    :param str old:
+        the id that the ref is expected to point to, or `None` if it is expected not to exist yet
+    :param str reflog_message:
+        the message to record in the reflog
+    """
+    run_git(['update-ref', '-m', reflog_message, ref, new, old or ''], cwd)
+
+
+def hash_object(cwd: str, data: bytes, obj_type: str = 'blob') -> str:
+    """
+    Write the given bytes into the object database as an object of the given type.
+
+    :param str cwd:
+        the directory of the repository
+    :param bytes data:
+        the raw contents of the object
+    :param str obj_type:
+        [Opt] the type of the object, `"blob"` by default
+    :return:
+        the id of the object
+    """
+    return run_git(['hash-object', '-t', obj_type, '-w', '--stdin'], cwd, input=data).decode().strip()
+
+
+def iter_tree_entries(data: bytes, oid_size: int = 20) -> Iterator[Tuple[bytes, bytes, int, int]]:
+    """
+    Iterate over the entries of a raw (binary) tree object.
+
+    :param bytes data:
+        the raw contents of the tree, as given by `git cat-file`
+    :param int oid_size:
+        [Opt] the size of a binary object id in the repository: 20 for SHA-1 (default) or 32 for SHA-256, i.e. half
+        the length of a hex id
+    :return:
+        an iterator of each entry's mode and name, along with the offsets of the start and end of its binary object id
+    """
+    offset = 0
+    size = len(data)
+    while offset < size:
+        space = data.index(b' ', offset)
+        nul = data.index(b'\0', space)
+        yield data[offset:space], data[space + 1:nul], nul + 1, nul + 1 + oid_size
+        offset = nul + 1 + oid_size
+
+
+class CatFileBatch:
+    """
+    A long-lived `git cat-file --batch` process, which reads any number of objects without spawning a new process
+    for each of them, and (started when first needed) a `git cat-file --batch-check` process, which resolves names
+    to object ids, types, and sizes without reading the objects. Safe to share between threads.
+    """
+
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        self._lock = threading.Lock()
+        self._proc = self._start('--batch')
+        self._check_proc = None
+
+    def _start(self, mode: str) -> subprocess.Popen:
+        profiling.count(profiling.GIT_CALLS)
+        return subprocess.Popen(['git', 'cat-file', mode], cwd=self.cwd, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    @property
+    def alive(self) -> bool:
+        """Whether the underlying process is still running."""
+        return self._proc.poll() is None
+
+    @staticmethod
+    def _header(proc: subprocess.Popen, name: str) -> Optional[List[bytes]]:
+        proc.stdin.write(name.encode() + b'\n')
+        proc.stdin.flush()
+        header = proc.stdout.readline().split()
+        return header if len(header) == 3 else None
+
+    def read(self, name: str) -> Optional[Tuple[str, str, bytes]]:
+        """
+        Read an object.
+
+        :param str name:
+            anything that names an object, e.g. an id or `HEAD:path/to/file`
+        :return:
+            the object's id, type, and raw contents, or `None` if no such object exists
+        """
+        with self._lock:
+            header = self._header(self._proc, name)
+            if header is None:
+                return None
+            oid, obj_type, size = header
+            data = self._proc.stdout.read(int(size) + 1)[:-1]
+        return oid.decode(), obj_type.decode(), data
+
+    def info(self, name: str) -> Optional[Tuple[str, str, int]]:
+        """
+        Resolve a name to an object without reading the object, e.g. to peel a ref to its commit
+        (`refs/heads/main^{commit}`) without a `git rev-parse` process.
+
+        :param str name:
+            anything that names an object
+        :return:
+            the object's id, type, and size, or `None` if no such object exists
+        """
+        with self._lock:
+            if self._check_proc is None:
+                self._check_proc = self._start('--batch-check')
+            header = self._header(self._check_proc, name)
+        if header is None:
+            return None
+        oid, obj_type, size = header
+        return oid.decode(), obj_type.decode(), int(size)
+
+    def close(self) -> None:
+        """Stop the underlying processes."""
+        for proc in (self._proc, self._check_proc):
+            if proc is not None and proc.poll() is None:
+                proc.stdin.close()
+                proc.wait()
+
+    def __enter__(self) -> 'CatFileBatch':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
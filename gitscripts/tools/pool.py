@@ -0,0 +1,159 @@
+"""
+A pool of what it costs to open on each repository, kept for as long as the process lives: one GitPython `Repo`, one
+pair of `git cat-file` processes (see :py:class:`~tools.plumbing.CatFileBatch`), and the commit author resolved from
+git's configuration, for each repository.
+
+Batch, fleet, and `--serve` runs touch the same repositories again and again, and each of these would otherwise cost
+a new process (or a new parse of the configuration) every time. Entries are checked before they are reused: a `Repo`
+or process is replaced if its git directory was replaced or the process died, and an author is resolved again if any
+of the configuration files it could have come from, or the environment variables that override them, changed.
+
+GitPython is only imported when a `Repo` is first asked for.
+"""
+
+import atexit
+import os
+import threading
+from typing import Dict, Tuple
+
+from tools import plumbing
+from tools.plumbing import CatFileBatch, GitPlumbingError
+
+# the environment variables that decide the author, besides the configuration files
+AUTHOR_ENV = ('GIT_AUTHOR_NAME', 'GIT_AUTHOR_EMAIL', 'EMAIL', 'HOME', 'XDG_CONFIG_HOME', 'GIT_CONFIG_GLOBAL',
+              'GIT_CONFIG_SYSTEM', 'GIT_CONFIG_NOSYSTEM', 'GIT_CONFIG_COUNT', 'GIT_DIR')
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return -1, -1
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _git_dir(path: str) -> str:
+    dot_git = os.path.join(path, '.git')
+    return dot_git if os.path.exists(dot_git) else path
+
+
+def _author_stamp(path: str) -> tuple:
+    home = os.path.expanduser('~')
+    xdg_config = os.environ.get('XDG_CONFIG_HOME') or os.path.join(home, '.config')
+    files = [os.path.join(_git_dir(path), 'config'), os.path.join(home, '.gitconfig'),
+             os.path.join(xdg_config, 'git', 'config'), os.environ.get('GIT_CONFIG_GLOBAL', ''), '/etc/gitconfig']
+    return tuple(os.environ.get(name) for name in AUTHOR_ENV) + tuple(_stat_key(file) for file in files)
+
+
+def resolve_author(path: str) -> Tuple[str, str]:
+    """
+    Resolve the commit author of a repository the way git does: from `GIT_AUTHOR_NAME`/`GIT_AUTHOR_EMAIL`, or else
+    the `user.name`/`user.email` of every layer of its configuration (system, global, repository, worktree, and any
+    included files, the last one winning), or else `EMAIL` for the email; all with one `git config` call.
+
+    :param str path:
+        the repository's directory
+    :return:
+        the author's name and email
+    """
+    try:
+        output = plumbing.run_git(['config', '-z', '--get-regexp', r'^user\.(name|email)$'], path).decode()
+    except GitPlumbingError:
+        # nothing matched
+        output = ''
+    values = {}
+    for record in output.split('\0'):
+        key, _, value = record.partition('\n')
+        if key:
+            values[key] = value
+    name = os.environ.get('GIT_AUTHOR_NAME') or values.get('user.name')
+    email = os.environ.get('GIT_AUTHOR_EMAIL') or values.get('user.email') or os.environ.get('EMAIL')
+    if not name or not email:
+        raise ValueError(f'Incomplete author information (user.name and/or user.email) in the git config of {path}')
+    return name, email
+
+
+class RepoPool:
+    """
+    The `Repo`, `git cat-file` processes, and author of each repository opened so far. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._repos: Dict[str, tuple] = {}
+        self._batches: Dict[str, CatFileBatch] = {}
+        self._authors: Dict[str, tuple] = {}
+
+    def repo(self, path: str):
+        """
+        Get the GitPython `Repo` of a repository, opening it only the first time.
+
+        :param str path:
+            the repository's directory
+        :return:
+            the :py:class:`~git.repo.base.Repo`
+        """
+        key = os.path.realpath(path)
+        with self._lock:
+            cached = self._repos.get(key)
+            stamp = _stat_key(_git_dir(key))[0]
+            if cached is not None and cached[1] == stamp:
+                return cached[0]
+            from git import Repo
+            repo = Repo(key)
+            self._repos[key] = (repo, stamp)
+            return repo
+
+    def cat_file(self, path: str) -> CatFileBatch:
+        """
+        Get the long-lived `git cat-file` processes of a repository, starting them only the first time (or if they
+        stopped). They are stopped when the process exits; do not close them.
+
+        :param str path:
+            the repository's directory
+        :return:
+            the :py:class:`~tools.plumbing.CatFileBatch`
+        """
+        key = os.path.realpath(path)
+        with self._lock:
+            batch = self._batches.get(key)
+            if batch is None or not batch.alive:
+                batch = CatFileBatch(key)
+                self._batches[key] = batch
+            return batch
+
+    def author(self, path: str) -> Tuple[str, str]:
+        """
+        Get the commit author of a repository (see :py:func:`resolve_author`), resolving it only the first time (or
+        when its configuration changed).
+
+        :param str path:
+            the repository's directory
+        :return:
+            the author's name and email
+        """
+        key = os.path.realpath(path)
+        stamp = _author_stamp(key)
+        with self._lock:
+            cached = self._authors.get(key)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        author = resolve_author(key)
+        with self._lock:
+            self._authors[key] = (stamp, author)
+        return author
+
+    def close(self) -> None:
+        """Stop every `git cat-file` process and forget everything."""
+        with self._lock:
+            for batch in self._batches.values():
+                batch.close()
+            for repo, _ in self._repos.values():
+                repo.close()
+            self._batches.clear()
+            self._repos.clear()
+            self._authors.clear()
+
+
+POOL = RepoPool()
+atexit.register(POOL.close)
@@ -0,0 +1,201 @@
+"""
+Opt-in instrumentation of where a run spends its time: wall and CPU time per phase, along with counters such as
+bytes read and written, files visited, and git subprocesses started.
+
+Instrumentation is off unless :py:func:`enable` has been called; until then, :py:func:`profiled` functions and
+:py:func:`count` cost a single check of a module-level variable.
+"""
+
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, List, Optional
+
+BYTES_READ = 'bytes_read'
+BYTES_WRITTEN = 'bytes_written'
+FILES_VISITED = 'files_visited'
+GIT_CALLS = 'git_calls'
+COUNTERS = (BYTES_READ, BYTES_WRITTEN, FILES_VISITED, GIT_CALLS)
+
+_PROFILER: Optional['Profiler'] = None
+
+
+class PhaseRecord:
+    """One timed run of a phase, with the counters that were incremented while it was the innermost phase."""
+
+    __slots__ = ('name', 'thread', 'start', 'wall', 'cpu', 'counters')
+
+    def __init__(self, name: str, thread: int, start: float):
+        self.name = name
+        self.thread = thread
+        self.start = start
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.counters: Dict[str, int] = defaultdict(int)
+
+
+class Profiler:
+    """Collects :py:class:`PhaseRecord` objects from every thread of the run."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.records: List[PhaseRecord] = []
+        self.totals: Dict[str, int] = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> List[PhaseRecord]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def run(self, name: str, func: Callable, *args, **kwargs):
+        """
+        Call the given function as a phase with the given name.
+
+        :param str name:
+            the name of the phase
+        :param func:
+            the function to call
+        :return:
+            whatever the function returns
+        """
+        record = PhaseRecord(name, threading.get_ident(), time.perf_counter())
+        cpu_start = time.process_time()
+        stack = self._stack()
+        stack.append(record)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+            record.wall = time.perf_counter() - record.start
+            record.cpu = time.process_time() - cpu_start
+            with self._lock:
+                self.records.append(record)
+
+    def add(self, counter: str, amount: int) -> None:
+        """
+        Increment a counter, attributing it to the innermost phase of the current thread.
+
+        :param str counter:
+            the name of the counter, e.g. :py:data:`BYTES_READ`
+        :param int amount:
+            how much to increment it by
+        """
+        stack = self._stack()
+        if stack:
+            stack[-1].counters[counter] += amount
+        with self._lock:
+            self.totals[counter] += amount
+
+    def summary(self) -> 'OrderedDict[str, Dict[str, float]]':
+        """
+        Aggregate the records by phase name, in the order that each phase first started.
+
+        :return:
+            for each phase, its number of calls, total wall and CPU seconds, and the totals of its counters
+        """
+        phases = OrderedDict()
+        for record in sorted(self.records, key=lambda r: r.start):
+            phase = phases.setdefault(record.name, dict({'calls': 0, 'wall': 0.0, 'cpu': 0.0},
+                                                        **{counter: 0 for counter in COUNTERS}))
+            phase['calls'] += 1
+            phase['wall'] += record.wall
+            phase['cpu'] += record.cpu
+            for counter, amount in record.counters.items():
+                phase[counter] = phase.get(counter, 0) + amount
+        return phases
+
+    def format_summary(self) -> str:
+        """
+        Format :py:meth:`summary` as a table.
+
+        :return:
+            the table, one line per phase plus a line of totals
+        """
+        header = f'{"phase":<28} {"calls":>5} {"wall ms":>9} {"cpu ms":>9} {"read":>10} {"written":>10} ' \
+                 f'{"files":>7} {"git":>4}'
+        lines = [header, '-' * len(header)]
+        for name, phase in self.summary().items():
+            lines.append(f'{name:<28} {phase["calls"]:>5} {phase["wall"] * 1000:>9.2f} {phase["cpu"] * 1000:>9.2f} '
+                         f'{phase[BYTES_READ]:>10} {phase[BYTES_WRITTEN]:>10} {phase[FILES_VISITED]:>7} '
+                         f'{phase[GIT_CALLS]:>4}')
+        lines.append('-' * len(header))
+        lines.append(f'{"total":<28} {"":>5} {(time.perf_counter() - self.origin) * 1000:>9.2f} {"":>9} '
+                     f'{self.totals[BYTES_READ]:>10} {self.totals[BYTES_WRITTEN]:>10} '
+                     f'{self.totals[FILES_VISITED]:>7} {self.totals[GIT_CALLS]:>4}')
+        return '\n'.join(lines)
+
+    def write_trace(self, path: str) -> None:
+        """
+        Write the records as a Chrome trace (viewable in `chrome://tracing` or Perfetto).
+
+        :param str path:
+            the file to write the trace to
+        """
+        events = [{
+            'name': record.name, 'ph': 'X', 'pid': 1, 'tid': record.thread,
+            'ts': (record.start - self.origin) * 1e6, 'dur': record.wall * 1e6,
+            'args': dict(record.counters, cpu_ms=record.cpu * 1000),
+        } for record in self.records]
+        with open(path, 'w') as fo:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fo)
+
+
+def enable() -> Profiler:
+    """
+    Start collecting instrumentation, discarding anything that was collected before.
+
+    :return:
+        the active profiler
+    """
+    global _PROFILER
+    _PROFILER = Profiler()
+    return _PROFILER
+
+
+def disable() -> Optional[Profiler]:
+    """
+    Stop collecting instrumentation.
+
+    :return:
+        the profiler that was active, if any, with everything that it collected
+    """
+    global _PROFILER
+    profiler, _PROFILER = _PROFILER, None
+    return profiler
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorate a function so that each call is recorded as a phase with the given name while instrumentation is on.
+
+    :param str name:
+        the name of the phase
+    :return:
+        the decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _PROFILER is None:
+                return func(*args, **kwargs)
+            return _PROFILER.run(name, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(counter: str, amount: int = 1) -> None:
+    """
+    Increment a counter while instrumentation is on.
+
+    :param str counter:
+        the name of the counter, e.g. :py:data:`GIT_CALLS`
+    :param int amount:
+        [Opt] how much to increment it by
+    """
+    if _PROFILER is not None:
+        _PROFILER.add(counter, amount)
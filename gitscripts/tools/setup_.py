@@ -1,21 +1,50 @@
 import argparse
 
 
-def parse_args():
+def parse_args(args=None):
     parser = argparse.ArgumentParser(
         description='A tool for incrementing the version number of a project before committing any changes.'
     )
 
     parser.add_argument(
-        'project', type=str.lower, help='The type of project the target is. Currently only ["python" and "rust" '
-                                        'are available]. "list" here will list the project type options.'
+        'project', nargs='?', type=str.lower,
+        help='The type of project the target is: one of the built-in types ["rust", "python", "pyproject", "node", '
+             '"maven"] or one registered by a plugin. "auto" here detects the type from the config file in the '
+             'directory, and "list" here will list the project type options.'
     )
     parser.add_argument(
-        'version', choices=['major', 'minor', 'patch', 'subpatch', 'alpha', 'unalpha'], type=str.lower,
+        'version', nargs='?', choices=['major', 'minor', 'patch', 'subpatch', 'alpha', 'unalpha', 'auto'],
+        type=str.lower,
         help='Which part of the version should be incremented: '
-             '["major", "minor", "patch", "subpatch", "alpha", "unalpha"]. '
+             '["major", "minor", "patch", "subpatch", "alpha", "unalpha", "auto"]. '
              'NOTE: an increment, zeroes out all lower slots, and "unalpha" moves to a release version by removing the '
-             '"alpha" and its version.'
+             '"alpha" and its version. "auto" chooses "major", "minor", or "patch" from the Conventional Commits '
+             'since the last release tag (a breaking change, a "feat", or a "fix"), and bumps nothing if none call '
+             'for a release.'
+    )
+    parser.add_argument(
+        '--manifest', dest='manifest',
+        help='Bump every project listed in this file and commit them all at once. Each line is '
+             '"<root> [<project> [<version>]]", where the root is relative to the manifest and a missing project or '
+             'version defaults to the positional one.'
+    )
+    parser.add_argument(
+        '--roots', action='append', dest='roots', default=[], metavar='GLOB',
+        help='Bump every directory (relative to --dir) matching this glob as a project of the positional type, and '
+             'commit them all at once. May be given more than once.'
+    )
+    parser.add_argument(
+        '--fleet', dest='fleet', metavar='MANIFEST',
+        help='Bump and commit every repository listed in this file, several at a time, printing one JSON line per '
+             'repository as each finishes. Lines are formatted like those of --manifest, with repositories as roots.'
+    )
+    parser.add_argument(
+        '--fleet-timeout', type=float, dest='fleet_timeout', default=120.0, metavar='SECONDS',
+        help='The most seconds that any one repository of --fleet may take; default is 120.'
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, dest='jobs', default=None,
+        help='The most threads (or, with --fleet, repositories) to use when bumping many projects at once.'
     )
     parser.add_argument(
         '-d', '--dir', dest='dirpath',
@@ -28,4 +57,138 @@ def parse_args():
         help='The lowest level of log statements to log; default is INFO. [CRITICAL, ERROR, WARN, INFO, DEBUG, NOTSET]'
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        '--prune', action='append', dest='prune', default=[], metavar='DIRNAME',
+        help='The name of a directory that should not be searched when looking for the config file, in addition to '
+             'the defaults (e.g. ".git", "target", "node_modules"). May be given more than once.'
+    )
+    parser.add_argument(
+        '--follow-gitignore', action='store_true', dest='follow_gitignore',
+        help='Do not search directories that are ignored by git when looking for the config file.'
+    )
+    parser.add_argument(
+        '--discovery', choices=['auto', 'scandir', 'git'], type=str.lower, dest='discovery', default='auto',
+        help='How to search for the config file: "scandir" walks the directory tree, "git" asks `git ls-files`, and '
+             '"auto" (default) walks the shallow levels and then asks git.'
+    )
+    parser.add_argument(
+        '--no-cache', action='store_false', dest='use_cache',
+        help='Neither read nor update the cache of config file locations and versions kept in the git directory.'
+    )
+    parser.add_argument(
+        '--clear-cache', action='store_true', dest='clear_cache',
+        help='Drop every cached config file location and version for the repository before bumping.'
+    )
+    parser.add_argument(
+        '--commit-backend', choices=['plumbing', 'gitpython'], type=str.lower, dest='commit_backend',
+        default='plumbing',
+        help='How to stage and commit: "plumbing" (default) uses git\'s plumbing commands and never loads the index '
+             'into Python, falling back to "gitpython" if they fail.'
+    )
+    parser.add_argument(
+        '--bare', action='store_true', dest='bare',
+        help='Bump the version committed at --ref directly in the object database and advance that ref, without a '
+             'work tree (e.g. in a bare repository or mirror). Nothing else is committed.'
+    )
+    parser.add_argument(
+        '--ref', dest='ref', default='HEAD',
+        help='The ref to bump and advance when using --bare; default is HEAD.'
+    )
+    parser.add_argument(
+        '--stage', choices=['all', 'touched'], type=str.lower, dest='stage', default='all',
+        help='What to stage before committing: "all" (default) stages every change to a tracked file, while '
+             '"touched" stages only the config files that were bumped plus anything matching --pathspec, without '
+             'looking at the rest of the work tree.'
+    )
+    parser.add_argument(
+        '--pathspec', action='append', dest='pathspecs', default=[],
+        help='A pathspec (relative to the top of the repository) of more changes to stage with --stage=touched. '
+             'May be given more than once.'
+    )
+    parser.add_argument(
+        '--protected-branch', action='append', dest='protected_branches', default=[], metavar='PATTERN',
+        help='The name (or glob) of a branch that commits need confirming on, in place of the defaults ("master" '
+             'and "main", or the comma-separated GIT_VER_PROTECTED_BRANCHES). May be given more than once.'
+    )
+    parser.add_argument(
+        '--protected-policy', choices=['prompt', 'allow', 'deny'], type=str.lower, dest='protected_policy',
+        help='What to do about a commit to a protected branch: "prompt" to ask, "allow" to commit anyway, or "deny" '
+             'to refuse. By default (or GIT_VER_PROTECTED_POLICY), ask when run from a terminal and refuse otherwise.'
+    )
+    parser.add_argument(
+        '--sync', action='append', dest='sync', default=[], metavar='PATH[:TEMPLATE]',
+        help='Another file (or glob, relative to --dir) holding a copy of the version to keep in step with the config '
+             'file, optionally followed by a template that the copy is found by, in which "{version}" stands for the '
+             'version (e.g. "docs/conf.py:release = \'{version}\'"). Adds to the targets of the [sync.*] sections of '
+             '.git-ver.cfg. May be given more than once.'
+    )
+    parser.add_argument(
+        '--changed-since', dest='changed_since', metavar='REF',
+        help='Only bump the projects with a file that changed between this commit (e.g. the tag of the last release) '
+             'and HEAD: those of --manifest/--roots if given, or else every project of the positional type ("auto" '
+             'for any type) found in the repository, all in one commit.'
+    )
+    parser.add_argument(
+        '--workspace', action='store_true', dest='workspace',
+        help='Bump the crates of the Cargo workspace whose root is --dir (every member, or those given with --crate), '
+             'update the version requirements that other members have on them, and patch Cargo.lock, all in one '
+             'commit.'
+    )
+    parser.add_argument(
+        '--crate', action='append', dest='crates', default=[], metavar='NAME',
+        help='A crate of the workspace to bump with --workspace. May be given more than once.'
+    )
+    parser.add_argument(
+        '--from-tag', action='store_true', dest='from_tag',
+        help='Bump the highest release tag (e.g. "v1.2.3") to the next version that is not tagged yet, instead of '
+             'the version in the config file, which is overwritten. Falls back to the config file if there are no '
+             'release tags.'
+    )
+    parser.add_argument(
+        '--tag-line', dest='tag_line', metavar='MAJOR[.MINOR]',
+        help='Only look at the tags of this release line (e.g. "2" or "2.3") with --from-tag, to bump a maintenance '
+             'branch.'
+    )
+    parser.add_argument(
+        '--tag', action='store_true', dest='tag',
+        help='Tag the new commit with the new version, failing before anything is changed if that tag already exists.'
+    )
+    parser.add_argument(
+        '--tag-prefix', dest='tag_prefix', default='v',
+        help='What the names of version tags start with; default is "v".'
+    )
+    parser.add_argument(
+        '--serve', action='store_true', dest='serve',
+        help='Run as a long-lived server that runs the requests of --connect clients in one warm process, listening '
+             'on --socket.'
+    )
+    parser.add_argument(
+        '--connect', action='store_true', dest='connect',
+        help='Send the rest of the command line to the server of --serve (at --socket), and print what it ran, '
+             'instead of running it here.'
+    )
+    parser.add_argument(
+        '--socket', dest='socket', metavar='PATH',
+        help='The Unix socket of --serve and --connect; default is $GIT_VER_SOCKET, or else a socket private to the '
+             'user in $XDG_RUNTIME_DIR (or the temporary directory).'
+    )
+    parser.add_argument(
+        '--profile', action='store_true', dest='profile',
+        help='Print a table of where the run spent its time (and how much it read, wrote, visited, and asked git '
+             'to do) when it finishes.'
+    )
+    parser.add_argument(
+        '--trace-json', dest='trace_json', metavar='PATH',
+        help='Write a Chrome trace of the run\'s phases to this file (viewable in chrome://tracing or Perfetto).'
+    )
+    parser.add_argument(
+        '--cprofile', dest='cprofile', metavar='PATH',
+        help='Run under cProfile and dump its statistics to this file (readable with pstats or snakeviz).'
+    )
+
+    parsed = parser.parse_args(args)
+    if parsed.project == 'list' or parsed.serve:
+        return parsed
+    if parsed.manifest is None and parsed.fleet is None and (parsed.project is None or parsed.version is None):
+        parser.error('the project and version arguments are required unless --manifest or --fleet is given')
+    return parsed
@@ -1,5 +1,6 @@
 """Utilities for safely dealing with strings, especially those that may or may not be `None` or empty."""
 
+import functools
 import re
 from typing import List
 
@@ -53,6 +54,11 @@ def str_is_empty(some_str: str) -> bool:
     return some_str is None or some_str.strip() == ''
 
 
+@functools.lru_cache(maxsize=None)
+def _nonalphanumeric_pattern(excl_str: str):
+    return re.compile(fr'[^\w1-9{excl_str}]+')
+
+
 def remove_nonalphanumeric(some_str: str, exclusions: List[str] = None) -> str:
     excl_str = ''.join(exclusions) if exclusions and len(exclusions) > 0 else ''
-    return re.sub(fr'[^\w1-9{excl_str}]+', '', some_str)
+    return _nonalphanumeric_pattern(excl_str).sub('', some_str)
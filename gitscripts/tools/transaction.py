@@ -0,0 +1,422 @@
+"""
+Edits to several files that land together, or not at all.
+
+The new contents of every file are collected first, in memory. Applying the edits writes each into a temporary file
+beside the file it replaces, flushes all of them to disk at once (concurrently, so that the file system can commit
+them together), and renames them into place, in the order that they were first edited (so that a caller can choose
+which files change first, e.g. dependencies before their dependents), flushing each directory that changed only once
+at the end, instead of once per file.
+
+Given a journal directory (e.g. `.git/git-ver`), applying the edits also keeps the files' old contents (as hard links,
+so nothing is copied) and records them in a small journal first, so that a failed commit can put everything back with
+:py:meth:`EditTransaction.rollback`. If the process dies before the edits are finished or rolled back, the journal is
+left behind, and :py:func:`recover` rolls them back the next time (unless the commit was made after all).
+
+The common bump, which changes only the bytes of one version token to another of the same length, skips all of that:
+the token is patched in place (see :py:func:`~tools.filesystem.patch_file_spans`), and its old bytes are kept in
+memory, which is all that a rollback needs. Only a crash between applying such an edit and committing it goes
+unrecovered, leaving the file bumped but not committed.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tools import plumbing, profiling
+from tools.filesystem import fsync_dir, patch_file_spans
+from tools.plumbing import GitPlumbingError
+from tools.profiling import profiled
+
+LOGGER = logging.getLogger(__name__)
+
+JOURNAL_PREFIX = 'transaction-'
+JOURNAL_FORMAT = 1
+
+# data only (not e.g. access times), where the platform allows it
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+def _head(cwd: Optional[str]) -> Optional[str]:
+    if cwd is None:
+        return None
+    try:
+        return plumbing.rev_parse(cwd, 'HEAD')
+    except GitPlumbingError:
+        return None
+
+
+def _remove(path: Optional[str]) -> None:
+    if path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        # a transaction is never still open in this process when its journals are recovered
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EditTransaction:
+    """
+    New contents for any number of files, applied all together; see the module's description. Used as a context
+    manager, the edits are rolled back if the block raises (or exits) and finished otherwise. Safe to stage edits to
+    from several threads.
+    """
+
+    def __init__(self, journal_dir: str = None, cwd: str = None):
+        """
+        :param str journal_dir:
+            [Opt] the directory to keep the journal in, or nothing to neither journal nor keep the old contents (so
+            that the edits cannot be rolled back once applied)
+        :param str cwd:
+            [Opt] the work tree being edited; if given, a rollback (or recovery) leaves the edits alone once its
+            `HEAD` has moved, i.e. once they have been committed
+        """
+        self.journal_dir = journal_dir
+        self.cwd = cwd
+        self._lock = threading.Lock()
+        # the contents on disk of every file read, so that an edit which changes nothing is not written
+        self._contents: Dict[str, bytes] = {}
+        self._staged: Dict[str, bytes] = {}
+        # the spans to patch in each file whose only edit is a patch, relative to its contents on disk
+        self._patches: Dict[str, List[Tuple[int, int, bytes]]] = {}
+        # every file with an edit, in the order that it was first edited, which is the order that they are replaced in
+        self._order: Dict[str, None] = {}
+        # the old bytes of each span patched in place, by file
+        self._undo: Dict[str, List[Tuple[int, int, bytes]]] = {}
+        self._entries: List[Dict[str, Optional[str]]] = []
+        self._journal_path = None
+        self._head = None
+        self.applied = False
+
+    @property
+    def paths(self) -> List[str]:
+        """The absolute paths of every file with an edit, in the order that they were first edited."""
+        return list(self._order)
+
+    def read(self, path: str) -> bytes:
+        """
+        Read a file's contents as they will be once the edits are applied: its staged contents, if it has been edited
+        already, or else its contents on disk.
+
+        :param str path:
+            the path to the file
+        :return:
+            the file's contents
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._staged:
+                return self._staged[path]
+            spans = self._patches.pop(path, None)
+        with open(path, 'rb') as fo:
+            data = fo.read()
+        profiling.count(profiling.BYTES_READ, len(data))
+        with self._lock:
+            self._contents.setdefault(path, data)
+            if spans is not None:
+                data = self._staged[path] = _splice(data, spans)
+        return data
+
+    def write(self, path: str, data: bytes) -> None:
+        """
+        Stage the new contents of a file, replacing any staged before.
+
+        :param str path:
+            the path to the file
+        :param bytes data:
+            its new contents
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if self.applied:
+                raise RuntimeError(f'cannot edit {path}: the transaction was already applied')
+            self._patches.pop(path, None)
+            self._staged[path] = data
+            self._order.setdefault(path)
+
+    def patch(self, path: str, spans: Iterable[Tuple[int, int, bytes]]) -> None:
+        """
+        Stage the replacement of several non-overlapping spans of a file (like
+        :py:func:`~tools.filesystem.patch_file_spans`), on top of any edits staged before.
+
+        :param str path:
+            the path to the file
+        :param spans:
+            the `(start, end, replacement)` of each span to replace, in any order
+        """
+        spans = sorted(spans)
+        if not spans:
+            return
+        for (_, end, _), (start, _, _) in zip(spans, spans[1:]):
+            if start < end:
+                raise ValueError(f'overlapping spans to patch in {path}')
+        LOGGER.debug(f'staging path={path} spans={[(start, end) for start, end, _ in spans]}')
+        path = os.path.abspath(path)
+        with self._lock:
+            if self.applied:
+                raise RuntimeError(f'cannot edit {path}: the transaction was already applied')
+            if path not in self._staged and path not in self._patches:
+                # kept as spans, so that the file need not be read unless it is edited again
+                self._patches[path] = spans
+                self._order.setdefault(path)
+                return
+        self.write(path, _splice(self.read(path), spans))
+
+    def _write_temp(self, path: str, data: bytes) -> Tuple[str, int]:
+        import shutil
+        import tempfile
+
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', dir=os.path.dirname(path))
+        try:
+            _write_all(fd, data)
+            shutil.copymode(path, tmp_path)
+        except BaseException:
+            os.close(fd)
+            _remove(tmp_path)
+            raise
+        profiling.count(profiling.BYTES_WRITTEN, len(data))
+        return tmp_path, fd
+
+    def _write_journal(self) -> None:
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._journal_path = os.path.join(self.journal_dir, f'{JOURNAL_PREFIX}{os.getpid()}.json')
+        tmp_path = f'{self._journal_path}.tmp'
+        journal = {'format': JOURNAL_FORMAT, 'pid': os.getpid(), 'cwd': self.cwd, 'head': self._head,
+                   'entries': self._entries}
+        with open(tmp_path, 'w') as fo:
+            json.dump(journal, fo)
+            fo.flush()
+            os.fsync(fo.fileno())
+        os.replace(tmp_path, self._journal_path)
+        fsync_dir(self.journal_dir)
+
+    @profiled('transaction: apply')
+    def apply(self) -> None:
+        """
+        Write every staged edit into place, all together; see the module's description. If anything goes wrong,
+        every file is left as it was.
+        """
+        with self._lock:
+            if self.applied:
+                return
+            self.applied = True
+            in_place = not self._staged and len(self._patches) == 1 \
+                and all(len(replacement) == end - start for spans in self._patches.values()
+                        for start, end, replacement in spans)
+        if in_place:
+            self._apply_in_place()
+            return
+        # read concurrently, like they are flushed
+        patched = list(self._patches)
+        if len(patched) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(patched), 8)) as executor:
+                list(executor.map(self.read, patched))
+        elif patched:
+            self.read(patched[0])
+        with self._lock:
+            staged = [(path, self._staged[path]) for path in self._order
+                      if path in self._staged and self._contents.get(path) != self._staged[path]]
+        if not staged:
+            return
+
+        temps = []
+        try:
+            for path, data in staged:
+                temps.append(self._write_temp(path, data))
+            # flushed concurrently, so that the file system can commit them together
+            fds = [fd for _, fd in temps]
+            if len(fds) > 1:
+                with ThreadPoolExecutor(max_workers=min(len(fds), 8)) as executor:
+                    list(executor.map(_fdatasync, fds))
+            else:
+                _fdatasync(fds[0])
+        except BaseException:
+            for tmp_path, fd in temps:
+                os.close(fd)
+                _remove(tmp_path)
+            raise
+        for _, fd in temps:
+            os.close(fd)
+
+        self._entries = [{'path': path, 'tmp': tmp_path, 'backup': None}
+                         for (path, _), (tmp_path, _) in zip(staged, temps)]
+        try:
+            if self.journal_dir is not None:
+                self._head = _head(self.cwd)
+                for entry in self._entries:
+                    entry['backup'] = _backup(entry['path'])
+                self._write_journal()
+            for entry in self._entries:
+                os.replace(entry['tmp'], entry['path'])
+                entry['tmp'] = None
+        except BaseException:
+            self._restore()
+            raise
+        for dirpath in {os.path.dirname(path) for path, _ in staged}:
+            fsync_dir(dirpath)
+        LOGGER.debug(f'applied edits to {len(staged)} files')
+
+    def _apply_in_place(self) -> None:
+        (path, spans), = self._patches.items()
+        old_spans = []
+        with open(path, 'rb') as fo:
+            for start, end, _ in spans:
+                fo.seek(start)
+                old_spans.append((start, end, fo.read(end - start)))
+        if old_spans == spans:
+            return
+        profiling.count(profiling.BYTES_READ, sum(end - start for start, end, _ in spans))
+        self._head = _head(self.cwd)
+        patch_file_spans(path, spans, atomic=False)
+        self._undo[path] = old_spans
+        LOGGER.debug(f'applied edits to {path} in place')
+
+    def _restore(self) -> None:
+        for path, old_spans in self._undo.items():
+            patch_file_spans(path, old_spans, atomic=False)
+        self._undo = {}
+        dirpaths = set()
+        for entry in self._entries:
+            _remove(entry['tmp'])
+            if entry['tmp'] is None and entry['backup'] is not None:
+                os.replace(entry['backup'], entry['path'])
+                dirpaths.add(os.path.dirname(entry['path']))
+            else:
+                _remove(entry['backup'])
+        for dirpath in dirpaths:
+            fsync_dir(dirpath)
+        self._entries = []
+        _remove(self._journal_path)
+
+    @profiled('transaction: rollback')
+    def rollback(self) -> None:
+        """
+        Put every file back the way it was before the edits were applied (if they were), unless they have been
+        committed since; then forget the edits.
+        """
+        if self.applied and (self._entries or self._undo):
+            if self._head is not None and _head(self.cwd) != self._head:
+                LOGGER.debug('not rolling back edits that were committed')
+                self.finish()
+                return
+            if self._entries and self.journal_dir is None:
+                LOGGER.warning('not rolling back edits that were applied without a journal')
+                self.finish()
+                return
+            LOGGER.info(f'rolling back the edits to {len(self._entries) + len(self._undo)} files')
+            self._restore()
+        self._staged.clear()
+        self._patches.clear()
+        self._order.clear()
+
+    def finish(self) -> None:
+        """Keep the applied edits for good, dropping the old contents and the journal."""
+        for entry in self._entries:
+            _remove(entry['tmp'])
+            _remove(entry['backup'])
+        self._entries = []
+        self._undo = {}
+        _remove(self._journal_path)
+        self._journal_path = None
+
+    def __enter__(self) -> 'EditTransaction':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.apply()
+            self.finish()
+        else:
+            self.rollback()
+
+
+def _splice(data: bytes, spans: List[Tuple[int, int, bytes]]) -> bytes:
+    pieces = []
+    position = 0
+    for start, end, replacement in spans:
+        pieces.append(data[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(data[position:])
+    return b''.join(pieces)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _backup(path: str) -> str:
+    backup_path = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.git-ver-backup-{os.getpid()}')
+    _remove(backup_path)
+    try:
+        # the old contents stay where they are, and are only named again
+        os.link(path, backup_path)
+    except OSError:
+        import shutil
+        shutil.copy2(path, backup_path)
+        with open(backup_path, 'rb') as fo:
+            os.fsync(fo.fileno())
+    return backup_path
+
+
+def recover(journal_dir: str) -> int:
+    """
+    Roll back the edits of every transaction left behind in the journal directory by a process that died before
+    finishing it, or drop them if they were committed after all.
+
+    :param str journal_dir:
+        the directory that the journals are kept in
+    :return:
+        the number of transactions recovered
+    """
+    try:
+        names = [name for name in os.listdir(journal_dir) if name.startswith(JOURNAL_PREFIX)]
+    except FileNotFoundError:
+        return 0
+    recovered = 0
+    for name in names:
+        journal_path = os.path.join(journal_dir, name)
+        pid = name[len(JOURNAL_PREFIX):].split('.', 1)[0]
+        if name.endswith('.tmp'):
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                _remove(journal_path)
+            continue
+        try:
+            with open(journal_path, 'r') as fo:
+                journal = json.load(fo)
+        except (OSError, ValueError):
+            continue
+        if journal.get('format') != JOURNAL_FORMAT or _pid_alive(journal.get('pid', -1)):
+            continue
+
+        transaction = EditTransaction(journal_dir, journal.get('cwd'))
+        transaction.applied = True
+        transaction._journal_path = journal_path
+        transaction._head = journal.get('head')
+        transaction._entries = [entry for entry in journal.get('entries', [])
+                                if entry.get('backup') is None or os.path.exists(entry['backup'])]
+        for entry in transaction._entries:
+            if entry.get('tmp') is not None and not os.path.exists(entry['tmp']):
+                # renamed into place before the process died
+                entry['tmp'] = None
+        LOGGER.warning(f'recovering the unfinished edits of {journal.get("cwd") or journal_dir}')
+        transaction.rollback()
+        _remove(journal_path)
+        recovered += 1
+    return recovered
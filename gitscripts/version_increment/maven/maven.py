@@ -0,0 +1,72 @@
+import re
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+
+from version_increment.tools.types_ import Version
+
+if TYPE_CHECKING:
+    import in_place
+
+config_name = 'pom.xml'
+
+VERSION_TAG = b'<version>'
+PROJECT_PATH = (b'project',)
+# opening, closing, and self-closing elements, along with the starts and ends of comments
+MARKUP = re.compile(rb'<!--|-->|<(/?)([\w.:-]+)[^>]*?(/?)>')
+VERSION_TEXT = re.compile(rb'\s*([^<\s]+)\s*</version>')
+
+# the elements enclosing the line being scanned, and whether it begins inside of a comment, per thread, since
+# `config_filter` is called one line at a time
+_state = threading.local()
+
+
+def write(new_version: str, file_out: 'in_place.InPlace') -> None:
+    file_out.write(f'    <version>{new_version}</version>\n')
+
+
+def config_filter(line: Union[bytes, str], line_number: int = 0) -> Tuple[int, bool, Optional[Version]]:
+    """
+    Scan one line of a `pom.xml` for the project's version, which must be a direct child of `<project>` (so that the
+    versions of the parent, dependencies, and plugins are never mistaken for it). The version must be semantic,
+    e.g. `1.2.0-SNAPSHOT` rather than `1.2-SNAPSHOT`.
+
+    A negative line number (as passed for the first line of a file) starts a new file.
+
+    :param line:
+        the line to scan
+    :param int line_number:
+        [Opt] the number of the previous line
+    :return:
+        the number of this line, whether it holds the version, and the version (if it does)
+    """
+    next_line = line_number + 1
+    if line_number < 0 or not hasattr(_state, 'path'):
+        _state.path = []
+        _state.in_comment = False
+    if isinstance(line, str):
+        line = line.encode()
+    if b'<' not in line and b'>' not in line:
+        return next_line, False, None
+
+    path = _state.path
+    in_comment = _state.in_comment
+    for markup in MARKUP.finditer(line):
+        token = markup.group(0)
+        if in_comment:
+            in_comment = token != b'-->'
+        elif token == b'<!--':
+            in_comment = True
+        elif markup.group(2) is None:
+            continue
+        elif markup.group(1):
+            if path:
+                path.pop()
+        elif not markup.group(3):
+            if token == VERSION_TAG and tuple(path) == PROJECT_PATH:
+                text = VERSION_TEXT.match(line, markup.end())
+                if text is not None:
+                    _state.in_comment = in_comment
+                    return next_line, True, Version.from_str(text.group(1))
+            path.append(markup.group(2))
+    _state.in_comment = in_comment
+    return next_line, False, None
@@ -0,0 +1,56 @@
+import re
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+
+from version_increment.tools.types_ import Version
+
+if TYPE_CHECKING:
+    import in_place
+
+config_name = 'package.json'
+
+VERSION_KEY = b'"version"'
+# the package's `"version": "..."` member
+VERSION_MEMBER = re.compile(rb'\s*"version"\s*:\s*"([^"\s]+)"')
+# string literals, which are dropped before counting brackets so that brackets inside of them are not counted
+STRING_LITERAL = re.compile(rb'"(?:\\.|[^"\\])*"')
+
+# how deeply nested in objects and arrays the line being scanned begins, per thread, since `config_filter` is called
+# one line at a time
+_state = threading.local()
+
+
+def write(new_version: str, file_out: 'in_place.InPlace') -> None:
+    file_out.write(f'  "version": "{new_version}",\n')
+
+
+def config_filter(line: Union[bytes, str], line_number: int = 0) -> Tuple[int, bool, Optional[Version]]:
+    """
+    Scan one line of a `package.json` for the package's version, which must be a member of the top-level object (so
+    that the versions of dependencies, engines, and the like are never mistaken for it).
+
+    A negative line number (as passed for the first line of a file) starts a new file.
+
+    :param line:
+        the line to scan
+    :param int line_number:
+        [Opt] the number of the previous line
+    :return:
+        the number of this line, whether it holds the version, and the version (if it does)
+    """
+    next_line = line_number + 1
+    if line_number < 0:
+        _state.depth = 0
+    if isinstance(line, str):
+        line = line.encode()
+
+    depth = getattr(_state, 'depth', 0)
+    if depth == 1 and VERSION_KEY in line:
+        match = VERSION_MEMBER.match(line)
+        if match is not None:
+            return next_line, True, Version.from_str(match.group(1))
+
+    if b'{' in line or b'}' in line or b'[' in line or b']' in line:
+        bare = STRING_LITERAL.sub(b'', line)
+        _state.depth = depth + bare.count(b'{') + bare.count(b'[') - bare.count(b'}') - bare.count(b']')
+    return next_line, False, None
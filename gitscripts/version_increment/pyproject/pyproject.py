@@ -0,0 +1,60 @@
+import re
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+
+from version_increment.tools.types_ import Version
+
+if TYPE_CHECKING:
+    import in_place
+
+config_name = 'pyproject.toml'
+
+VERSION_KEY = b'version'
+# the tables that may hold the project's version: PEP 621 metadata, or Poetry's
+VERSION_TABLES = (b'project', b'tool.poetry')
+# a table header (`[name]`) or array-of-tables header (`[[name]]`), optionally followed by a comment
+TABLE_HEADER = re.compile(rb'\s*\[\[?\s*([^\]]+?)\s*\]\]?\s*(?:#.*)?$', re.DOTALL)
+# a `version = "..."` key whose value is a basic or literal string, optionally followed by a comment
+VERSION_LINE = re.compile(rb'\s*version\s*=\s*([\'"])([^\'"\s]+)\1\s*(?:#.*)?$', re.DOTALL)
+
+# the table that the line being scanned belongs to, per thread, since `config_filter` is called one line at a time
+_state = threading.local()
+
+
+def write(new_version: str, file_out: 'in_place.InPlace') -> None:
+    file_out.write(f'version = "{new_version}"\n')
+
+
+def config_filter(line: Union[bytes, str], line_number: int = 0) -> Tuple[int, bool, Optional[Version]]:
+    """
+    Scan one line of a `pyproject.toml` for the project's version, which must be in its `[project]` table (or, for
+    Poetry, its `[tool.poetry]` table). A version listed in `dynamic` cannot be bumped here.
+
+    A negative line number (as passed for the first line of a file) starts a new file.
+
+    :param line:
+        the line to scan
+    :param int line_number:
+        [Opt] the number of the previous line
+    :return:
+        the number of this line, whether it holds the version, and the version (if it does)
+    """
+    next_line = line_number + 1
+    if line_number < 0:
+        _state.table = None
+    if isinstance(line, str):
+        line = line.encode()
+
+    stripped = line.lstrip()
+    if stripped.startswith(b'['):
+        header = TABLE_HEADER.match(stripped)
+        if header is not None:
+            _state.table = header.group(1)
+        return next_line, False, None
+
+    if VERSION_KEY not in line or getattr(_state, 'table', None) not in VERSION_TABLES:
+        return next_line, False, None
+    match = VERSION_LINE.match(line)
+    if match is None:
+        return next_line, False, None
+    return next_line, True, Version.from_str(match.group(2))
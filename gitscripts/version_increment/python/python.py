@@ -1,34 +1,39 @@
-from typing import Tuple
+import re
+from typing import TYPE_CHECKING, Optional, Tuple, Union
 
-import in_place
-
-from tools.str_utils import str_is_empty, remove_nonalphanumeric
 from version_increment.tools.types_ import Version
 
-config_name = 'setup.py'
+if TYPE_CHECKING:
+    import in_place
 
+config_name = 'setup.py'
 
-def _list_filter(elem: str) -> bool:
-    val = remove_nonalphanumeric(elem, ['.'])
-    return not str_is_empty(val)
+VERSION_KEY = b'version'
+# a `version=` keyword argument (or assignment), anywhere on the line, whose value is a quoted string literal
+VERSION_ARG = re.compile(rb'(?<![\w.])version\s*=\s*([\'"])([^\'"\s]+)\1')
 
 
-def write(new_version: str, file_out: in_place.InPlace) -> None:
+def write(new_version: str, file_out: 'in_place.InPlace') -> None:
     file_out.write(f'    version=\'{new_version}\',\n')
 
 
-def config_filter(line: str, line_number: int = 0) -> Tuple[int, bool, Version]:
+def config_filter(line: Union[bytes, str], line_number: int = 0) -> Tuple[int, bool, Optional[Version]]:
+    """
+    Scan one line of a `setup.py` for the `version=` argument given to `setup`.
+
+    :param line:
+        the line to scan
+    :param int line_number:
+        [Opt] the number of the previous line
+    :return:
+        the number of this line, whether it holds the version, and the version (if it does)
+    """
     next_line = line_number + 1
-    found = False
-    version = None
-    if not str_is_empty(line):
-        line_split: list = [
-            remove_nonalphanumeric(x, ['.'])
-            for x in line.split('=')
-            if _list_filter(x)
-        ]
-        if 'version' in line_split:
-            version_str_index = line_split.index('version')
-            version = Version.from_str(line_split[version_str_index + 1])
-            found = True
-    return next_line, found, version
+    if isinstance(line, str):
+        line = line.encode()
+    if VERSION_KEY not in line:
+        return next_line, False, None
+    match = VERSION_ARG.search(line)
+    if match is None:
+        return next_line, False, None
+    return next_line, True, Version.from_str(match.group(2))
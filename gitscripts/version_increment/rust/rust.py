@@ -1,34 +1,61 @@
-from typing import Tuple
+import re
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple, Union
 
-import in_place
-
-from tools.str_utils import remove_nonalphanumeric, str_is_empty
 from version_increment.tools.types_ import Version
 
+if TYPE_CHECKING:
+    import in_place
+
 config_name = 'Cargo.toml'
 
+VERSION_KEY = b'version'
+PACKAGE_TABLE = b'package'
+# a table header (`[name]`) or array-of-tables header (`[[name]]`), optionally followed by a comment
+TABLE_HEADER = re.compile(rb'\s*\[\[?\s*([^\]]+?)\s*\]\]?\s*(?:#.*)?$', re.DOTALL)
+# a `version = "..."` key whose value is a basic or literal string, optionally followed by a comment
+VERSION_LINE = re.compile(rb'\s*version\s*=\s*([\'"])([^\'"\s]+)\1\s*(?:#.*)?$', re.DOTALL)
 
-def _list_filter(elem: str) -> bool:
-    val = remove_nonalphanumeric(elem, ['.'])
-    return not str_is_empty(val.strip())
+# the table that the line being scanned belongs to, per thread, since `config_filter` is called one line at a time
+_state = threading.local()
 
 
-def write(new_version: str, file_out: in_place.InPlace) -> None:
+def write(new_version: str, file_out: 'in_place.InPlace') -> None:
     file_out.write(f'version = {new_version}\n')
 
 
-def config_filter(line: str, line_number: int = 0) -> Tuple[int, bool, Version]:
+def config_filter(line: Union[bytes, str], line_number: int = 0) -> Tuple[int, bool, Optional[Version]]:
+    """
+    Scan one line of a `Cargo.toml` for the crate's version, which must be in its `[package]` table.
+
+    A negative line number (as passed for the first line of a file) starts a new file.
+
+    :param line:
+        the line to scan
+    :param int line_number:
+        [Opt] the number of the previous line
+    :return:
+        the number of this line, whether it holds the version, and the version (if it does)
+    """
     next_line = line_number + 1
-    found = False
-    version = None
-    if not str_is_empty(line):
-        line_split: list = [
-            remove_nonalphanumeric(x.strip(), ['.[]"'])
-            for x in line.split('=')
-            if _list_filter(x)
-        ]
-        if 'version' in line_split:
-            version_str_index = line_split.index('version')
-            version = Version.from_str(line_split[version_str_index + 1])
-            found = True
-    return next_line, found, version
+    if line_number < 0:
+        _state.table = None
+    if isinstance(line, str):
+        line = line.encode()
+
+    stripped = line.lstrip()
+    if stripped.startswith(b'['):
+        header = TABLE_HEADER.match(stripped)
+        if header is not None:
+            table = getattr(_state, 'table', None)
+            if table == PACKAGE_TABLE:
+                raise RuntimeWarning('version number not found in the [package] table')
+            _state.table = header.group(1)
+        return next_line, False, None
+
+    if VERSION_KEY not in line or getattr(_state, 'table', None) != PACKAGE_TABLE:
+        return next_line, False, None
+    match = VERSION_LINE.match(line)
+    if match is None:
+        return next_line, False, None
+    return next_line, True, Version.from_str(match.group(2))
@@ -0,0 +1,474 @@
+"""
+Bump the crates of a Cargo workspace together: their own versions, the version requirements that other members of the
+workspace have on them, and their entries in `Cargo.lock`.
+
+The root manifest's `[workspace] members` are read once, and every member's manifest is then read (once, and in
+parallel) to learn its name, its version, and its dependencies on other members. Every edit to a file is made in a
+single patch of that file, and every manifest and the lockfile are written in one
+:py:class:`~tools.transaction.EditTransaction`, which replaces them one level of the dependency graph at a time
+(dependencies before their dependents, and the root manifest and lockfile last), so that no dependent is ever seen on
+disk ahead of its dependencies.
+"""
+
+import glob
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from tools import profiling
+from tools.profiling import profiled
+from tools.transaction import EditTransaction
+from version_increment.tools.types_ import Version
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'Cargo.toml'
+LOCKFILE_NAME = 'Cargo.lock'
+DEPENDENCY_TABLES = (b'dependencies', b'dev-dependencies', b'build-dependencies')
+WORKSPACE_DEPENDENCIES = b'workspace.dependencies'
+# dev-dependencies may form cycles, so only these order the graph
+ORDERING_TABLES = (b'dependencies', b'build-dependencies')
+
+TABLE_HEADER = re.compile(rb'\s*\[\[?\s*([^\]]+?)\s*\]\]?\s*(?:#.*)?$', re.DOTALL)
+KEY_VALUE = re.compile(rb'\s*([A-Za-z0-9_\-]+(?:\s*\.\s*[A-Za-z0-9_\-]+)*)\s*=\s*(.*)$', re.DOTALL)
+STRING_VALUE = re.compile(rb'\s*"([^"]*)"')
+INLINE_FIELD = re.compile(rb'([A-Za-z0-9_\-]+)\s*=\s*(?:"([^"]*)"|(true|false))')
+ARRAY_STRING = re.compile(rb'"([^"]*)"')
+# a requirement on a single version, e.g. `1.2.3`, `^1.2`, or `=1.2.3-alpha0`, capturing its operator and version
+REQUIREMENT = re.compile(rb'\s*(\^|=|~|>=|>|<=|<)?\s*(\d+(?:\.\d+){0,2}(?:-[0-9A-Za-z.-]+)?(?:\+[0-9A-Za-z.-]+)?)\s*$')
+
+
+@dataclass
+class Requirement:
+    """A member's version requirement on another member: which crate, from which table, and where its version is."""
+
+    crate: str
+    table: bytes
+    start: Optional[int]
+    end: Optional[int]
+
+
+@dataclass
+class Manifest:
+    """What a workspace bump needs to know about one `Cargo.toml`."""
+
+    path: str
+    name: Optional[str] = None
+    version: Optional[Version] = None
+    version_span: Optional[Tuple[int, int]] = None
+    inherits_version: bool = False
+    workspace_version: Optional[Version] = None
+    workspace_version_span: Optional[Tuple[int, int]] = None
+    members: List[str] = field(default_factory=list)
+    excludes: List[str] = field(default_factory=list)
+    requirements: List[Requirement] = field(default_factory=list)
+
+
+@dataclass
+class CrateBump:
+    """The outcome of bumping one crate of the workspace."""
+
+    name: str
+    manifest_path: str
+    old_version: Version
+    new_version: Version
+
+
+def _dependency_table(table: bytes) -> Optional[bytes]:
+    """Which kind of dependency table this is (`dependencies`, `dev-dependencies`, ...), if it is one at all."""
+    if table == WORKSPACE_DEPENDENCIES:
+        return table
+    if table.startswith(b'target.'):
+        table = table.rsplit(b'.', 1)[-1] if table.endswith(DEPENDENCY_TABLES) else table
+    return table if table in DEPENDENCY_TABLES else None
+
+
+def _requirement(crate: bytes, table: bytes, value: bytes, value_offset: int) -> Optional[Requirement]:
+    """Read a dependency's value, which is either a requirement string or an inline table."""
+    string = STRING_VALUE.match(value)
+    if string is not None:
+        return _requirement_span(crate.decode(), table, string.group(1), value_offset + string.start(1))
+    if not value.lstrip().startswith(b'{'):
+        return None
+    fields = {m.group(1): m for m in INLINE_FIELD.finditer(value)}
+    if b'package' in fields:
+        crate = fields[b'package'].group(2)
+    version = fields.get(b'version')
+    if version is None or version.group(2) is None:
+        return Requirement(crate.decode(), table, None, None)
+    return _requirement_span(crate.decode(), table, version.group(2), value_offset + version.start(2))
+
+
+def _requirement_span(crate: str, table: bytes, requirement: bytes, offset: int) -> Requirement:
+    match = REQUIREMENT.match(requirement)
+    if match is None:
+        LOGGER.debug(f'not updating the requirement "{requirement.decode()}" on crate={crate}')
+        return Requirement(crate, table, None, None)
+    return Requirement(crate, table, offset + match.start(2), offset + match.end(2))
+
+
+def read_manifest(path: str) -> Manifest:
+    """
+    Scan a `Cargo.toml` for its crate's name and version, the workspace's members and inherited version (if it is a
+    workspace root), and every dependency that may be on another member of the workspace.
+
+    :param str path:
+        the path to the manifest
+    :return:
+        what was found
+    """
+    with open(path, 'rb') as fo:
+        data = fo.read()
+    profiling.count(profiling.BYTES_READ, len(data))
+
+    manifest = Manifest(path)
+    table = b''
+    dependency_table = None
+    table_crate = None
+    array_key = None
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        line_offset = offset
+        offset += len(line)
+
+        if array_key is not None:
+            strings = [m.group(1).decode() for m in ARRAY_STRING.finditer(line.split(b'#', 1)[0])]
+            (manifest.members if array_key == b'members' else manifest.excludes).extend(strings)
+            if b']' in line:
+                array_key = None
+            continue
+
+        stripped = line.lstrip()
+        if not stripped or stripped.startswith(b'#'):
+            continue
+        if stripped.startswith(b'['):
+            header = TABLE_HEADER.match(stripped)
+            if header is not None:
+                table = header.group(1)
+                dependency_table = _dependency_table(table)
+                table_crate = None
+                # `[dependencies.name]` holds a single dependency's fields
+                if dependency_table is None and b'.' in table:
+                    parent, crate = table.rsplit(b'.', 1)
+                    dependency_table = _dependency_table(parent)
+                    table_crate = crate if dependency_table is not None else None
+            continue
+
+        key_value = KEY_VALUE.match(line)
+        if key_value is None:
+            continue
+        key = re.sub(rb'\s+', b'', key_value.group(1))
+        value, value_offset = key_value.group(2), line_offset + key_value.start(2)
+
+        if table == b'package':
+            if key == b'name':
+                string = STRING_VALUE.match(value)
+                manifest.name = string.group(1).decode() if string else None
+            elif key == b'version':
+                string = STRING_VALUE.match(value)
+                if string is not None:
+                    manifest.version = Version.from_str(string.group(1))
+                    manifest.version_span = (value_offset + string.start(1), value_offset + string.end(1))
+            elif key == b'version.workspace':
+                manifest.inherits_version = value.strip().startswith(b'true')
+        elif table == b'workspace.package' and key == b'version':
+            string = STRING_VALUE.match(value)
+            if string is not None:
+                manifest.workspace_version = Version.from_str(string.group(1))
+                manifest.workspace_version_span = (value_offset + string.start(1), value_offset + string.end(1))
+        elif table == b'workspace' and key in (b'members', b'exclude'):
+            target = manifest.members if key == b'members' else manifest.excludes
+            target.extend(m.group(1).decode() for m in ARRAY_STRING.finditer(value.split(b'#', 1)[0]))
+            if b']' not in value:
+                array_key = key
+        elif table_crate is not None:
+            if key == b'package':
+                string = STRING_VALUE.match(value)
+                if string is not None:
+                    table_crate = string.group(1)
+            elif key == b'version':
+                manifest.requirements.append(_requirement(table_crate, dependency_table, value, value_offset))
+        elif dependency_table is not None:
+            crate = key.split(b'.', 1)[0]
+            if key == crate:
+                requirement = _requirement(crate, dependency_table, value, value_offset)
+            elif key.endswith(b'.version'):
+                requirement = _requirement(crate, dependency_table, value, value_offset)
+            else:
+                requirement = Requirement(crate.decode(), dependency_table, None, None)
+            if requirement is not None:
+                manifest.requirements.append(requirement)
+    return manifest
+
+
+def _member_dirs(root: str, manifest: Manifest) -> List[str]:
+    excluded = {os.path.normpath(os.path.join(root, exclude)) for exclude in manifest.excludes}
+    dirs = []
+    for member in manifest.members:
+        for match in sorted(glob.glob(os.path.join(root, member))) if glob.has_magic(member) \
+                else [os.path.join(root, member)]:
+            match = os.path.normpath(match)
+            if match not in excluded and match not in dirs and os.path.isfile(os.path.join(match, MANIFEST_NAME)):
+                dirs.append(match)
+    return dirs
+
+
+@dataclass
+class Workspace:
+    """A Cargo workspace: its root manifest and the manifest of each member crate, by crate name."""
+
+    root: str
+    root_manifest: Manifest
+    crates: Dict[str, Manifest]
+
+    def dependents(self) -> Dict[str, Set[str]]:
+        """
+        Build the dependency graph of the workspace, ignoring dev-dependencies.
+
+        :return:
+            for each crate, the crates that depend on it
+        """
+        graph = {name: set() for name in self.crates}
+        for name, manifest in self.crates.items():
+            for requirement in manifest.requirements:
+                if requirement.crate in graph and requirement.crate != name and requirement.table in ORDERING_TABLES:
+                    graph[requirement.crate].add(name)
+        return graph
+
+    def levels(self) -> List[List[str]]:
+        """
+        Group the crates into levels with Kahn's algorithm: each crate's dependencies are all in earlier levels.
+
+        :return:
+            the crates of each level
+        """
+        dependents = self.dependents()
+        indegree = {name: 0 for name in self.crates}
+        for users in dependents.values():
+            for user in users:
+                indegree[user] += 1
+        level = sorted(name for name, degree in indegree.items() if degree == 0)
+        levels = []
+        while level:
+            levels.append(level)
+            following = set()
+            for name in level:
+                for user in dependents[name]:
+                    indegree[user] -= 1
+                    if indegree[user] == 0:
+                        following.add(user)
+            level = sorted(following)
+        if sum(len(level) for level in levels) != len(self.crates):
+            cyclic = sorted(name for name, degree in indegree.items() if degree > 0)
+            raise ValueError(f'the dependencies of these crates form a cycle: {", ".join(cyclic)}')
+        return levels
+
+
+@profiled('workspace: read')
+def read_workspace(root: str, workers: int = None) -> Workspace:
+    """
+    Read a Cargo workspace: its root manifest once, then every member's manifest in parallel.
+
+    :param str root:
+        the directory of the workspace's root `Cargo.toml`
+    :param int workers:
+        [Opt] the most threads to use, or nothing to let the thread pool decide
+    :return:
+        the workspace
+    """
+    root = os.path.normpath(os.path.abspath(root))
+    root_path = os.path.join(root, MANIFEST_NAME)
+    if not os.path.isfile(root_path):
+        raise ValueError(f'Could not find a file named "{MANIFEST_NAME}" in "{root}"')
+    root_manifest = read_manifest(root_path)
+    if not root_manifest.members:
+        raise ValueError(f'{root_path} has no [workspace] members')
+
+    paths = [os.path.join(member, MANIFEST_NAME) for member in _member_dirs(root, root_manifest)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        manifests = list(executor.map(lambda path: root_manifest if path == root_path else read_manifest(path), paths))
+    if root_manifest.name is not None and root_manifest not in manifests:
+        manifests.append(root_manifest)
+
+    crates = {}
+    for manifest in manifests:
+        if manifest.name is None:
+            raise ValueError(f'{manifest.path} has no [package] name')
+        if manifest.name in crates:
+            raise ValueError(f'{manifest.path} and {crates[manifest.name].path} are both crate "{manifest.name}"')
+        crates[manifest.name] = manifest
+    LOGGER.debug(f'read {len(crates)} crates of the workspace at {root}')
+    return Workspace(root, root_manifest, crates)
+
+
+def _lockfile_spans(lock_path: str, versions: Dict[str, Tuple[Version, Version]]) -> List[Tuple[int, int, bytes]]:
+    """
+    Find the versions of the bumped crates in `Cargo.lock`: their `[[package]]` entries and references to them, leaving
+    alone any crate of the same name (and even the same version) from a registry or git, which has a `source`.
+    """
+    with open(lock_path, 'rb') as fo:
+        data = fo.read()
+    profiling.count(profiling.BYTES_READ, len(data))
+
+    spans = []
+    # the workspace's own entries, which have no source, and the references that may be to one of them
+    local = set()
+    references = []
+    entry_name = None
+    entry_span = None
+    entry_is_local = True
+    offset = 0
+
+    def close_entry():
+        if entry_name in versions and entry_span is not None and entry_is_local:
+            spans.append((entry_span[0], entry_span[1], str(versions[entry_name][1]).encode()))
+            local.add((entry_name, data[entry_span[0]:entry_span[1]]))
+
+    for line in data.splitlines(keepends=True):
+        line_offset = offset
+        offset += len(line)
+        stripped = line.strip()
+        if stripped == b'[[package]]':
+            close_entry()
+            entry_name, entry_span, entry_is_local = None, None, True
+            continue
+        key_value = KEY_VALUE.match(line)
+        if key_value is not None:
+            key = key_value.group(1)
+            string = STRING_VALUE.match(key_value.group(2))
+            if key == b'name' and string is not None:
+                entry_name = string.group(1).decode()
+            elif key == b'version' and string is not None:
+                start = line_offset + key_value.start(2) + string.start(1)
+                entry_span = (start, line_offset + key_value.start(2) + string.end(1))
+            elif key == b'source':
+                # a crate of the same name from a registry or git, not the workspace's own
+                entry_is_local = False
+            continue
+        # references by `"name version"`, made when more than one version of a crate is locked; one to a crate with a
+        # source names it too, e.g. `"name version (registry+https://...)"`
+        for match in ARRAY_STRING.finditer(line):
+            parts = match.group(1).split(b' ')
+            if len(parts) == 2 and parts[0].decode() in versions:
+                start = line_offset + match.start(1) + len(parts[0]) + 1
+                references.append((parts[0].decode(), parts[1], start))
+    close_entry()
+
+    for name, version, start in references:
+        old, new = versions[name]
+        if version == str(old).encode() and (name, version) in local:
+            spans.append((start, start + len(version), str(new).encode()))
+    return spans
+
+
+@profiled('do_workspace_bump')
+def do_workspace_bump(root: str, version_func: Callable[[Version], Version], crates: Iterable[str] = (),
+                      workers: int = None, transaction: EditTransaction = None) -> Tuple[List[CrateBump], List[str]]:
+    """
+    Bump the selected crates of a Cargo workspace (every crate, if none are selected), update the requirements that
+    other members have on them, and patch their entries in `Cargo.lock`. Everything is read and checked before any
+    file is written, and then every file is written together.
+
+    :param str root:
+        the directory of the workspace's root `Cargo.toml`
+    :param version_func:
+        which part of each version to bump, e.g. :py:meth:`~version_increment.tools.types_.Version.patch`
+    :param crates:
+        [Opt] the names of the crates to bump
+    :param int workers:
+        [Opt] the most threads to use, or nothing to let the thread pool decide
+    :param EditTransaction transaction:
+        [Opt] the transaction to write the files with, which is applied (but left for the caller to finish or roll
+        back), or nothing to write them with a transaction of its own
+    :return:
+        the crates that were bumped, and the paths of every file that was patched
+    """
+    workspace = read_workspace(root, workers)
+    selected = list(crates) or sorted(workspace.crates)
+    unknown = [name for name in selected if name not in workspace.crates]
+    if unknown:
+        raise ValueError(f'not crates of the workspace at {root}: {", ".join(unknown)}')
+
+    edits: Dict[str, List[Tuple[int, int, bytes]]] = {}
+    bumps = []
+    new_workspace_version = None
+    for name in selected:
+        manifest = workspace.crates[name]
+        if manifest.inherits_version:
+            old_version = workspace.root_manifest.workspace_version
+            if old_version is None:
+                raise ValueError(f'{manifest.path} inherits a version, but the workspace does not set one')
+            if new_workspace_version is None:
+                new_workspace_version = version_func(old_version)
+                start, end = workspace.root_manifest.workspace_version_span
+                edits.setdefault(workspace.root_manifest.path, []).append(
+                    (start, end, str(new_workspace_version).encode()))
+            new_version = new_workspace_version
+        else:
+            if manifest.version is None:
+                raise ValueError(f'version number not found in {manifest.path}')
+            old_version = manifest.version
+            new_version = version_func(old_version)
+            edits.setdefault(manifest.path, []).append((*manifest.version_span, str(new_version).encode()))
+        bumps.append(CrateBump(name, manifest.path, old_version, new_version))
+
+    # a crate that inherits the workspace's version is bumped along with it, even if it was not selected
+    if new_workspace_version is not None:
+        for name, manifest in workspace.crates.items():
+            if manifest.inherits_version and name not in selected:
+                bumps.append(CrateBump(name, manifest.path, workspace.root_manifest.workspace_version,
+                                       new_workspace_version))
+    versions = {bump.name: (bump.old_version, bump.new_version) for bump in bumps}
+
+    manifests = list(workspace.crates.values())
+    if workspace.root_manifest not in manifests:
+        manifests.append(workspace.root_manifest)
+    for manifest in manifests:
+        for requirement in manifest.requirements:
+            if requirement.crate in versions and requirement.start is not None:
+                edits.setdefault(manifest.path, []).append(
+                    (requirement.start, requirement.end, str(versions[requirement.crate][1]).encode()))
+
+    lock_path = os.path.join(root, LOCKFILE_NAME)
+    if os.path.isfile(lock_path):
+        lock_spans = _lockfile_spans(lock_path, versions)
+        if lock_spans:
+            edits[lock_path] = lock_spans
+
+    # staged dependencies before their dependents, and the root manifest and lockfile last, which is the order that
+    # the transaction replaces them in
+    crate_paths = {manifest.path for manifest in workspace.crates.values()}
+    ordered = [workspace.crates[name].path for level in workspace.levels() for name in level
+               if workspace.crates[name].path in edits]
+    ordered += [path for path in edits if path not in crate_paths]
+    staged = transaction or EditTransaction()
+    for path in ordered:
+        staged.patch(path, edits[path])
+    staged.apply()
+    if transaction is None:
+        staged.finish()
+
+    for bump in bumps:
+        LOGGER.debug(f'{bump.name}: {bump.old_version} -> {bump.new_version}')
+    return bumps, list(edits)
+
+
+def workspace_commit_message(bumps: List[CrateBump]) -> str:
+    """
+    Summarize a workspace bump as a commit message: the usual one-line message for a single crate, or a summary line
+    followed by one line per crate.
+
+    :param bumps:
+        the crates that were bumped
+    :return:
+        the commit message
+    """
+    if len(bumps) == 1:
+        return f'Version incremented to {bumps[0].new_version}'
+    lines = [f'Versions incremented for {len(bumps)} crates', '']
+    for bump in sorted(bumps, key=lambda b: b.name):
+        lines.append(f'* {bump.name}: {bump.new_version}')
+    return '\n'.join(lines)
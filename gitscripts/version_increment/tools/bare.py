@@ -0,0 +1,127 @@
+"""
+Bump a project's version directly in a repository's object database, so that bare repositories and mirrors can be
+bumped without a checkout.
+"""
+
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from tools import plumbing
+from tools.filesystem import DEFAULT_PRUNE
+from tools.plumbing import CatFileBatch
+from tools.pool import POOL
+from tools.profiling import profiled
+from version_increment.tools.parsing import scan_config_buffer
+from version_increment.tools.types_ import Version
+
+LOGGER = logging.getLogger(__name__)
+
+TREE_MODE = b'40000'
+BLOB_MODES = (b'100644', b'100755')
+
+# a chain of (entry name in the parent tree, raw tree contents), from the root tree down to the config's directory
+TreeTrail = List[Tuple[bytes, bytes]]
+
+
+def _find_config(batch: CatFileBatch, root_oid: str, config_name: str) -> Optional[Tuple[TreeTrail, str]]:
+    """Breadth-first search the trees beneath the given root for the shallowest blob with the config's name."""
+    target = config_name.encode()
+    pruned = {name.encode() for name in DEFAULT_PRUNE}
+    oid_size = len(root_oid) // 2
+    _, _, root_data = batch.read(root_oid)
+
+    level: List[TreeTrail] = [[(b'', root_data)]]
+    while level:
+        matches = []
+        next_level = []
+        for trail in level:
+            tree_data = trail[-1][1]
+            for mode, name, start, end in plumbing.iter_tree_entries(tree_data, oid_size):
+                if name == target and mode in BLOB_MODES:
+                    matches.append((trail, tree_data[start:end].hex()))
+                elif mode == TREE_MODE and name not in pruned:
+                    _, _, subtree = batch.read(tree_data[start:end].hex())
+                    next_level.append(trail + [(name, subtree)])
+        if matches:
+            return min(matches, key=lambda match: [name for name, _ in match[0]])
+        level = next_level
+    return None
+
+
+def _replace_entry_oid(tree_data: bytes, name: bytes, oid: str) -> bytes:
+    for _, entry_name, start, end in plumbing.iter_tree_entries(tree_data, len(oid) // 2):
+        if entry_name == name:
+            return tree_data[:start] + bytes.fromhex(oid) + tree_data[end:]
+    raise ValueError(f'No entry named "{name.decode()}" in tree')
+
+
+def _write_trail(cwd: str, trail: TreeTrail, leaf_name: bytes, leaf_oid: str) -> str:
+    """Write new copies of each tree along the trail, from the config's directory up to the root."""
+    child_name, child_oid = leaf_name, leaf_oid
+    for name, tree_data in reversed(trail):
+        child_oid = plumbing.hash_object(cwd, _replace_entry_oid(tree_data, child_name, child_oid), 'tree')
+        child_name = name
+    return child_oid
+
+
+@profiled('do_bare_bump')
+def do_bare_bump(version_func: Callable[[Version], Version],
+                 config_filter_func: Callable[[bytes, Optional[int]], Tuple[int, bool, Version]],
+                 config_name: str, dirpath: str, ref: str = 'HEAD',
+                 message_format: str = 'Version incremented to {}') -> Tuple[Version, str]:
+    """
+    Bump the version in the config file committed at the given ref and advance the ref to a new commit holding only
+    that change, without a work tree or an index.
+
+    The config blob is read straight from the ref's tree, bumped in memory, and written back as a new blob, followed
+    by new copies of only the trees on the path from it to the root, so the cost follows the depth of the config
+    file rather than the size of the repository.
+
+    :param version_func:
+        the `Version` method to bump with (e.g. :py:meth:`Version.minor`)
+    :param config_filter_func:
+        the project's `config_filter`
+    :param str config_name:
+        the name of the project's config file
+    :param str dirpath:
+        the path to the (possibly bare) repository
+    :param str ref:
+        [Opt] the ref to bump and advance, `HEAD` by default
+    :param str message_format:
+        [Opt] the format of the commit message, given the new version
+    :return:
+        the new version and the id of the new commit
+    """
+    # before anything is written, so that a repository without an author is left without dangling objects
+    author_name, author_email = POOL.author(dirpath)
+    full_ref = plumbing.full_ref_name(dirpath, ref)
+    # the repository's long-lived cat-file processes peel the ref and read the trees, instead of new processes
+    batch = POOL.cat_file(dirpath)
+    commit_info = batch.info(f'{full_ref}^{{commit}}')
+    if commit_info is None:
+        raise ValueError(f'Could not resolve "{ref}" to a commit in "{dirpath}"')
+    old_commit = commit_info[0]
+    root_tree = batch.info(f'{old_commit}^{{tree}}')[0]
+    LOGGER.debug(f'ref={full_ref} commit={old_commit} tree={root_tree}')
+
+    found = _find_config(batch, root_tree, config_name)
+    if found is None:
+        raise ValueError(f'Could not find a file named "{config_name}" in "{ref}"')
+    trail, blob_oid = found
+    _, _, blob = batch.read(blob_oid)
+
+    config_path = '/'.join(name.decode() for name, _ in trail[1:] + [(config_name.encode(), b'')])
+    location = scan_config_buffer(blob, config_filter_func, f'{ref}:{config_path}')
+    if not location.has_span:
+        raise RuntimeWarning(f'version number in {ref}:{config_path} could not be located precisely enough to patch')
+
+    new_version = version_func(location.version)
+    new_blob = blob[:location.start] + str(new_version).encode() + blob[location.end:]
+    new_blob_oid = plumbing.hash_object(dirpath, new_blob)
+    new_tree = _write_trail(dirpath, trail, config_name.encode(), new_blob_oid)
+
+    message = message_format.format(new_version)
+    new_commit = plumbing.commit_tree(dirpath, new_tree, [old_commit], message, author_name, author_email)
+    plumbing.update_ref(dirpath, full_ref, new_commit, old_commit, message)
+    LOGGER.debug(f'{config_path}: {location.version} -> {new_version} in commit={new_commit}')
+    return new_version, new_commit
@@ -0,0 +1,181 @@
+"""Bump many projects (e.g. every package in a monorepo) in one run, so that they can share a single commit."""
+
+import glob
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from tools.filesystem import DiscoveryOptions
+from tools.profiling import profiled
+from tools.transaction import EditTransaction
+from version_increment.tools.cache import ConfigCache
+from version_increment.tools.lang_utils import find_config, write_version
+from version_increment.tools.parsing import ConfigLocation
+from version_increment.tools.projects import AUTO, load_project, resolve_project
+from version_increment.tools.types_ import LEVELS, Version
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchEntry:
+    """One project to bump in a batch: the directory it lives in, its project type, and which part to bump."""
+
+    root: str
+    project: str
+    level: str
+
+
+@dataclass
+class BatchResult:
+    """The outcome of bumping one :py:class:`BatchEntry`."""
+
+    entry: BatchEntry
+    config_path: str
+    old_version: str
+    new_version: Version
+
+
+def load_manifest(manifest_path: str, default_project: str = None, default_level: str = None) -> List[BatchEntry]:
+    """
+    Read a batch manifest: one project per line, as `<root> [<project> [<level>]]`, where blank lines and anything
+    after a `#` are ignored and roots are relative to the manifest's directory.
+
+    :param str manifest_path:
+        the path to the manifest
+    :param str default_project:
+        [Opt] the project type of lines that do not give one
+    :param str default_level:
+        [Opt] the part to bump for lines that do not give one
+    :return:
+        the entries of the manifest, in order
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, 'r') as fo:
+        for number, line in enumerate(fo, start=1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            root = os.path.normpath(os.path.join(base, fields[0]))
+            project = fields[1].lower() if len(fields) > 1 else default_project
+            level = fields[2].lower() if len(fields) > 2 else default_level
+            if project is None or level is None:
+                raise ValueError(f'{manifest_path}:{number}: no project type and/or version part for "{fields[0]}"')
+            if level not in LEVELS and level != AUTO:
+                raise ValueError(f'{manifest_path}:{number}: not a version part to bump ({", ".join(LEVELS)}, or '
+                                 f'{AUTO}): "{level}"')
+            entries.append(BatchEntry(root, project, level))
+    return entries
+
+
+def expand_roots(dirpath: str, patterns: Iterable[str], project: str, level: str) -> List[BatchEntry]:
+    """
+    Make a batch entry of each directory matching the given glob patterns.
+
+    :param str dirpath:
+        the directory that the patterns are relative to
+    :param patterns:
+        glob patterns (`**` is allowed) matching project root directories
+    :param str project:
+        the project type of every matched directory
+    :param str level:
+        the part to bump in every matched directory
+    :return:
+        an entry for each matched directory, sorted by path
+    """
+    roots = set()
+    for pattern in patterns:
+        for match in glob.glob(os.path.join(dirpath, pattern), recursive=True):
+            if os.path.isdir(match):
+                roots.add(os.path.normpath(match))
+    return [BatchEntry(root, project, level) for root in sorted(roots)]
+
+
+@profiled('do_batch_bump')
+def do_batch_bump(entries: List[BatchEntry], dirpath: str, discovery: DiscoveryOptions = None,
+                  use_cache: bool = True, workers: Optional[int] = None,
+                  transaction: EditTransaction = None) -> List[BatchResult]:
+    """
+    Bump every entry's config file, finding and parsing all of them concurrently before editing any, so that a
+    problem with one project leaves every config file untouched, and then writing all of them together.
+
+    :param entries:
+        the projects to bump
+    :param str dirpath:
+        the repository that the projects are in, whose cache is shared by all of them
+    :param DiscoveryOptions discovery:
+        [Opt] how to search for each config file
+    :param bool use_cache:
+        [Opt] whether to use the repository's cache of config file locations
+    :param int workers:
+        [Opt] the most threads to use, or nothing to let the thread pool decide
+    :param EditTransaction transaction:
+        [Opt] the transaction to write the config files with, which is applied (but left for the caller to finish or
+        roll back), or nothing to write them with a transaction of its own
+    :return:
+        the result of each entry, in the same order as the entries
+    """
+    cache = ConfigCache.for_dir(dirpath) if use_cache else None
+    modules = [load_project(resolve_project(entry.project, entry.root)) for entry in entries]
+    for entry in entries:
+        if entry.level not in LEVELS:
+            raise ValueError(f'not a version part to bump ({", ".join(LEVELS)}) for "{entry.root}": "{entry.level}"')
+
+    def locate(index: int) -> Tuple[str, ConfigLocation]:
+        module = modules[index]
+        return find_config(module.config_filter, module.config_name, entries[index].root, discovery, cache)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        located = list(executor.map(locate, range(len(entries))))
+
+        seen = {}
+        for entry, (config_path, _) in zip(entries, located):
+            if config_path in seen:
+                raise ValueError(f'"{entry.root}" and "{seen[config_path]}" share the config file "{config_path}"')
+            seen[config_path] = entry.root
+
+        edits = transaction or EditTransaction()
+
+        def stage(index: int) -> Tuple[BatchResult, ConfigLocation]:
+            entry = entries[index]
+            config_path, location = located[index]
+            old_version = str(location.version)
+            new_version = getattr(Version, entry.level)(location.version)
+            new_location = write_version(new_version, config_path, location, modules[index].write, edits)
+            LOGGER.debug(f'{config_path}: {old_version} -> {new_version}')
+            return BatchResult(entry, config_path, old_version, new_version), new_location
+
+        staged = list(executor.map(stage, range(len(entries))))
+
+    edits.apply()
+    if transaction is None:
+        edits.finish()
+    if cache is not None:
+        # once the files are in place, so that their stat data is what is cached
+        for index, (result, new_location) in enumerate(staged):
+            cache.store(result.entry.root, modules[index].config_name, result.config_path, new_location)
+        cache.save()
+    return [result for result, _ in staged]
+
+
+def batch_commit_message(results: List[BatchResult], dirpath: str) -> str:
+    """
+    Summarize a batch bump as a commit message: the usual one-line message for a single project, or a summary line
+    followed by one line per project.
+
+    :param results:
+        the results of the batch bump
+    :param str dirpath:
+        the repository's directory, which project roots are shown relative to
+    :return:
+        the commit message
+    """
+    if len(results) == 1:
+        return f'Version incremented to {results[0].new_version}'
+    lines = [f'Versions incremented for {len(results)} projects', '']
+    for result in results:
+        lines.append(f'* {os.path.relpath(result.entry.root, dirpath)}: {result.new_version}')
+    return '\n'.join(lines)
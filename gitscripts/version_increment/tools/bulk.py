@@ -0,0 +1,242 @@
+"""
+Parsing, sorting, and range-filtering of many version strings at once (e.g. every tag of a repository), without
+creating a :py:class:`~version_increment.tools.types_.Version` for each of them.
+
+Each version is reduced to a single packed integer key that orders its major, minor, and patch portions and whether it
+is a release; only versions that tie on that key and have pre-releases need anything more to be ordered. When NumPy is
+installed, sorting and filtering large tables is vectorized; otherwise the same work is done with the standard library.
+"""
+
+import logging
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from version_increment.tools.types_ import VERSION_REGEX, Version, prerelease_key
+
+LOGGER = logging.getLogger(__name__)
+
+MAJOR_BITS = 26
+MINOR_BITS = 18
+PATCH_BITS = 18
+NUMPY_THRESHOLD = 4096
+
+_MINOR_SHIFT = PATCH_BITS + 1
+_MAJOR_SHIFT = MINOR_BITS + _MINOR_SHIFT
+
+
+def pack(major: int, minor: int, patch: int, is_release: bool) -> Optional[int]:
+    """
+    Pack the core of a version into one integer that sorts the same way as the core does, with releases after
+    pre-releases of the same core.
+
+    :param int major:
+        the major portion of the version
+    :param int minor:
+        the minor portion of the version
+    :param int patch:
+        the patch portion of the version
+    :param bool is_release:
+        whether the version has no pre-release
+    :return:
+        the packed key (which fits in a signed 64-bit integer), or `None` if a portion is too large to pack
+    """
+    if major >> MAJOR_BITS or minor >> MINOR_BITS or patch >> PATCH_BITS:
+        return None
+    return (major << _MAJOR_SHIFT) | (minor << _MINOR_SHIFT) | (patch << 1) | int(is_release)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _bound_key(bound: Union[Version, str, None]) -> Tuple[Optional[Version], Optional[int]]:
+    if bound is None:
+        return None, None
+    if not isinstance(bound, Version):
+        bound = Version.from_str(bound)
+    key = pack(*bound.core, bound.prerelease is None)
+    if key is None:
+        raise ValueError(f'version {bound} is too large to compare against packed keys')
+    return bound, key
+
+
+class VersionTable:
+    """
+    A column-oriented table of parsed versions: their original strings, their packed keys, and (only for the ones
+    that have them) their pre-releases.
+
+    Build one with :py:func:`parse_many`.
+    """
+
+    def __init__(self, strings: List[str], keys: array, prereleases: Dict[int, str], prefix: str = ''):
+        self.strings = strings
+        self.keys = keys
+        self.prereleases = prereleases
+        self.prefix = prefix
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.strings)
+
+    def __getitem__(self, index: int) -> str:
+        return self.strings[index]
+
+    def version(self, index: int) -> Version:
+        """
+        Fully parse one row of the table.
+
+        :param int index:
+            the row
+        :return:
+            the :py:class:`~version_increment.tools.types_.Version` that the row holds
+        """
+        return Version.from_str(self.strings[index][len(self.prefix):])
+
+    def versions(self) -> Iterator[Version]:
+        """
+        Lazily parse every row of the table.
+
+        :return:
+            an iterator of each :py:class:`~version_increment.tools.types_.Version`, in table order
+        """
+        return map(self.version, range(len(self.strings)))
+
+    def _take(self, order: Sequence[int]) -> 'VersionTable':
+        strings, keys, prereleases = self.strings, self.keys, self.prereleases
+        taken = {}
+        for new_index, old_index in enumerate(order):
+            prerelease = prereleases.get(old_index)
+            if prerelease is not None:
+                taken[new_index] = prerelease
+        return VersionTable([strings[i] for i in order], array('q', (keys[i] for i in order)), taken, self.prefix)
+
+    def _order(self) -> List[int]:
+        keys = self.keys
+        numpy = _numpy() if len(keys) >= NUMPY_THRESHOLD else None
+        if numpy is not None:
+            order = numpy.frombuffer(keys, dtype=numpy.int64).argsort(kind='stable').tolist()
+        else:
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+
+        # pre-releases of the same core tie on their packed keys; order each run of ties by the pre-releases
+        prereleases = self.prereleases
+        start = 0
+        while start < len(order):
+            end = start + 1
+            while end < len(order) and keys[order[end]] == keys[order[start]]:
+                end += 1
+            if end - start > 1 and not keys[order[start]] & 1:
+                order[start:end] = sorted(order[start:end], key=lambda i: prerelease_key(prereleases[i]))
+            start = end
+        return order
+
+    def sorted(self, reverse: bool = False) -> 'VersionTable':
+        """
+        Sort the table by semantic-versioning precedence.
+
+        :param bool reverse:
+            [Opt] whether to sort from newest to oldest
+        :return:
+            a new, sorted table
+        """
+        order = self._order()
+        if reverse:
+            order.reverse()
+        return self._take(order)
+
+    def between(self, lower: Union[Version, str] = None, upper: Union[Version, str] = None) -> 'VersionTable':
+        """
+        Keep only the versions in the range `[lower, upper)`, by semantic-versioning precedence.
+
+        :param lower:
+            [Opt] the lowest version to keep; unbounded if not given
+        :param upper:
+            [Opt] the lowest version beyond the range; unbounded if not given
+        :return:
+            a new table of the versions in the range, in their current order
+        """
+        lower_version, lower_key = _bound_key(lower)
+        upper_version, upper_key = _bound_key(upper)
+        keys = self.keys
+
+        numpy = _numpy() if len(keys) >= NUMPY_THRESHOLD else None
+        if numpy is not None:
+            packed = numpy.frombuffer(keys, dtype=numpy.int64)
+            mask = numpy.ones(len(packed), dtype=bool)
+            if lower_key is not None:
+                mask &= packed >= lower_key
+            if upper_key is not None:
+                mask &= packed <= upper_key
+            candidates = numpy.flatnonzero(mask).tolist()
+        else:
+            candidates = [i for i, key in enumerate(keys)
+                          if (lower_key is None or key >= lower_key) and (upper_key is None or key <= upper_key)]
+
+        kept = []
+        for i in candidates:
+            key = keys[i]
+            # only versions tying with a bound on its packed key need their pre-releases compared
+            if key == lower_key or key == upper_key:
+                precedence = self.version(i).precedence()
+                if lower_version is not None and precedence < lower_version.precedence():
+                    continue
+                if upper_version is not None and precedence >= upper_version.precedence():
+                    continue
+            kept.append(i)
+        return self._take(kept)
+
+    def max(self) -> Optional[str]:
+        """
+        Find the version with the highest precedence.
+
+        :return:
+            its original string, or `None` if the table is empty
+        """
+        if not self.strings:
+            return None
+        return self.strings[self._order()[-1]]
+
+
+def parse_many(strings: Iterable[str], strict: bool = False, prefix: str = '') -> VersionTable:
+    """
+    Parse many version strings into a :py:class:`VersionTable`.
+
+    :param strings:
+        the version strings, e.g. the names of tags
+    :param bool strict:
+        [Opt] whether to raise a `ValueError` on a string that is not a version, rather than skipping it
+    :param str prefix:
+        [Opt] a prefix that every version string must have (e.g. `"release-"`), which is ignored when parsing it
+    :return:
+        a table of the strings that are versions, in their original order
+    """
+    match = VERSION_REGEX.fullmatch
+    prefix_length = len(prefix)
+    kept: List[str] = []
+    keys = array('q')
+    prereleases: Dict[int, str] = {}
+    unpackable = 0
+    for string in strings:
+        parsed = match(string, prefix_length) if string.startswith(prefix) else None
+        if parsed is None:
+            if strict:
+                raise ValueError(f'not a semantic version: {string!r}')
+            continue
+        major_, minor_, patch_, prerelease, _ = parsed.groups()
+        key = pack(int(major_), int(minor_), int(patch_), prerelease is None)
+        if key is None:
+            unpackable += 1
+            continue
+        if prerelease is not None:
+            prereleases[len(kept)] = prerelease
+        kept.append(string)
+        keys.append(key)
+    if unpackable:
+        LOGGER.warning(f'skipped {unpackable} version(s) with portions too large to pack')
+    return VersionTable(kept, keys, prereleases, prefix)
@@ -0,0 +1,245 @@
+"""A persistent, on-disk cache of where each project's config file is and what version it was last known to hold."""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+from version_increment.tools.parsing import ConfigLocation
+from version_increment.tools.types_ import Version
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_DIRNAME = 'git-ver'
+CACHE_FILENAME = 'configs.json'
+CACHE_FORMAT = 2
+MAX_ENTRIES = 128
+# how stale an entry's last use may get before a hit on it is worth rewriting the cache for
+LAST_USED_RESOLUTION = 24 * 60 * 60
+
+
+def find_git_dir(dirpath: str) -> Optional[str]:
+    """
+    Find the git directory of the repository that the given directory belongs to, following `gitdir:` files left
+    behind by worktrees and submodules.
+
+    :param str dirpath:
+        a directory inside of the repository
+    :return:
+        the absolute path to the git directory, or `None` if the given directory is not inside of a repository
+    """
+    current = os.path.abspath(dirpath)
+    while True:
+        candidate = os.path.join(current, '.git')
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            with open(candidate, 'r') as fo:
+                content = fo.read().strip()
+            if content.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(current, content[len('gitdir:'):].strip()))
+        if os.path.isfile(os.path.join(current, 'HEAD')) and os.path.isdir(os.path.join(current, 'objects')):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+@dataclass
+class CacheEntry:
+    """
+    What is known about one project's config file, along with the stat data that must still match for it to be
+    trusted.
+    """
+
+    config_path: str
+    lineno: int
+    offset: int
+    start: Optional[int]
+    end: Optional[int]
+    version: str
+    mtime_ns: int
+    size: int
+    inode: int
+    last_used: float = 0.0
+
+    def is_fresh(self) -> bool:
+        """
+        Determine whether the config file is unchanged since this entry was recorded.
+
+        :return:
+            `True` if the file still exists with the same mtime, size, and inode, `False` otherwise
+        """
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino) == (self.mtime_ns, self.size, self.inode)
+
+
+def _shadowed(dirpath: str, config_name: str, config_path: str) -> bool:
+    """Check for a config file in a directory between the one searched and the cached one's, which is found first."""
+    top = os.path.abspath(dirpath)
+    current = os.path.dirname(config_path)
+    while current != top and current.startswith(top):
+        current = os.path.dirname(current)
+        if os.path.exists(os.path.join(current, config_name)):
+            return True
+    return False
+
+
+class ConfigCache:
+    """
+    A bounded cache of :py:class:`CacheEntry` objects, persisted as JSON inside of the repository's git directory
+    (`.git/git-ver/configs.json`) and keyed by the directory searched and the name of the config file.
+
+    An entry is trusted for as long as its config file is unchanged and no file of the same name has appeared in a
+    directory between the one searched and the config file's own. A config file created since in a shallower
+    directory that is not one of those (e.g. `b/Cargo.toml`, when `a/c/Cargo.toml` is cached) is not noticed until the
+    cached file changes; use `--clear-cache` (or `--no-cache`) after moving a project's config file like that.
+
+    Safe to look up and store entries from several threads (e.g. those of a batch bump) at once.
+    """
+
+    def __init__(self, cache_path: str, max_entries: int = MAX_ENTRIES):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self._entries: Dict[str, CacheEntry] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def for_dir(cls, dirpath: str) -> Optional['ConfigCache']:
+        """
+        Open the cache belonging to the repository that the given directory is in.
+
+        :param str dirpath:
+            a directory inside of the repository
+        :return:
+            the repository's cache, or `None` if the directory is not inside of a repository
+        """
+        git_dir = find_git_dir(dirpath)
+        if git_dir is None:
+            return None
+        return cls(os.path.join(git_dir, CACHE_DIRNAME, CACHE_FILENAME))
+
+    @staticmethod
+    def _key(dirpath: str, config_name: str) -> str:
+        return f'{os.path.abspath(dirpath)}:{config_name}'
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path, 'r') as fo:
+                raw = json.load(fo)
+        except (OSError, ValueError):
+            return
+        if raw.get('format') != CACHE_FORMAT:
+            LOGGER.debug(f'discarding cache with format={raw.get("format")}')
+            return
+        for key, entry in raw.get('entries', {}).items():
+            try:
+                self._entries[key] = CacheEntry(**entry)
+            except TypeError:
+                self._dirty = True
+
+    def lookup(self, dirpath: str, config_name: str) -> Optional[Tuple[str, ConfigLocation]]:
+        """
+        Get the cached location and version of a project's config file, if the file has not changed since.
+
+        :param str dirpath:
+            the directory that was searched for the config file
+        :param str config_name:
+            the name of the config file
+        :return:
+            the config file's path and the :py:class:`~version_increment.tools.parsing.ConfigLocation` of its
+            version, or `None` on a miss
+        """
+        key = self._key(dirpath, config_name)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        # checked outside of the lock, so that the threads of a batch stat their files concurrently
+        if not entry.is_fresh() or _shadowed(dirpath, config_name, entry.config_path):
+            LOGGER.debug(f'stale cache entry for key={key}')
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self._dirty = True
+            return None
+        # kept in memory (and saved along with any other change), rewriting the cache for a hit only now and then
+        now = time.time()
+        with self._lock:
+            if now - entry.last_used > LAST_USED_RESOLUTION:
+                self._dirty = True
+            entry.last_used = now
+        location = ConfigLocation(entry.lineno, entry.offset, entry.start, entry.end, Version.from_str(entry.version))
+        return entry.config_path, location
+
+    def store(self, dirpath: str, config_name: str, config_path: str, location: ConfigLocation) -> None:
+        """
+        Record where a project's config file is and what version it holds, as of the file's current stat data.
+
+        :param str dirpath:
+            the directory that was searched for the config file
+        :param str config_name:
+            the name of the config file
+        :param str config_path:
+            the path to the config file that was found
+        :param ConfigLocation location:
+            where the version now is in the file, and what it now is
+        """
+        stat = os.stat(config_path)
+        entry = CacheEntry(
+            os.path.abspath(config_path), location.lineno, location.offset, location.start, location.end,
+            str(location.version),
+            stat.st_mtime_ns, stat.st_size, stat.st_ino, time.time()
+        )
+        with self._lock:
+            self._entries[self._key(dirpath, config_name)] = entry
+            self._dirty = True
+
+    def invalidate(self, dirpath: str = None, config_name: str = None) -> None:
+        """
+        Drop cached entries: the one for the given directory and config name, every entry for the given directory,
+        or (given neither) all of them.
+
+        :param str dirpath:
+            [Opt] the directory whose entries should be dropped
+        :param str config_name:
+            [Opt] the name of the config file whose entry should be dropped
+        """
+        with self._lock:
+            if dirpath is None:
+                self._entries.clear()
+            elif config_name is not None:
+                self._entries.pop(self._key(dirpath, config_name), None)
+            else:
+                prefix = self._key(dirpath, '')
+                for key in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[key]
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Write the cache back to disk (if it changed), evicting the least recently used entries beyond its bound.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            if len(self._entries) > self.max_entries:
+                by_use = sorted(self._entries.items(), key=lambda item: item[1].last_used, reverse=True)
+                self._entries = dict(by_use[:self.max_entries])
+            raw = {'format': CACHE_FORMAT, 'entries': {k: asdict(v) for k, v in self._entries.items()}}
+            self._dirty = False
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f'{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as fo:
+            json.dump(raw, fo)
+        os.replace(tmp_path, self.cache_path)
@@ -0,0 +1,150 @@
+"""
+Find the projects of a monorepo that changed since a given commit (e.g. the tag of their last release), so that only
+they are bumped.
+
+The changed paths come from a single `git diff-tree` stream, and each one is mapped to the project that owns it (the
+deepest project root above it) through a :py:class:`PathTrie` of the project roots, so that the cost is linear in the
+number of changed paths, with no git calls per project.
+"""
+
+import logging
+import os
+from typing import Dict, Generic, Iterable, List, Optional, Set, TypeVar
+
+from tools import plumbing
+from tools.profiling import profiled
+from version_increment.tools.batch import BatchEntry
+from version_increment.tools.projects import AUTO, BUILTIN_PROJECTS
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_VALUE = object()
+
+
+class PathTrie(Generic[T]):
+    """A trie of directory paths, split into their components, that finds the deepest directory above a path."""
+
+    def __init__(self):
+        self._root: dict = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _parts(path: str) -> List[str]:
+        normalized = os.path.normpath(path).replace(os.sep, '/')
+        return [] if normalized in ('.', '') else normalized.split('/')
+
+    def insert(self, dirpath: str, value: T) -> None:
+        """
+        Add a directory to the trie.
+
+        :param str dirpath:
+            the directory, relative to the directory that looked-up paths are relative to
+        :param value:
+            what the directory stands for, e.g. its project
+        """
+        node = self._root
+        for part in self._parts(dirpath):
+            node = node.setdefault(part, {})
+        if _VALUE not in node:
+            self._size += 1
+        node[_VALUE] = value
+
+    def owner(self, path: str) -> Optional[T]:
+        """
+        Find the deepest directory in the trie that the given path is inside of.
+
+        :param str path:
+            the path, e.g. of a changed file; always separated by `/`, as git reports it
+        :return:
+            the value of that directory, or `None` if the path is not inside any of them
+        """
+        node = self._root
+        found = node.get(_VALUE)
+        for part in path.split('/'):
+            node = node.get(part)
+            if node is None:
+                break
+            found = node.get(_VALUE, found)
+        return found
+
+
+def discover_entries(dirpath: str, project: str, level: str) -> List[BatchEntry]:
+    """
+    Find every project in the repository from its tracked config files, with one `git ls-files` call.
+
+    :param str dirpath:
+        the directory to search (and that the projects' roots are found beneath)
+    :param str project:
+        the type of project to look for, or `"auto"` for any built-in type (choosing, for a directory with more than
+        one kind of config file, the same type that `"auto"` would)
+    :param str level:
+        the part to bump in each project
+    :return:
+        an entry for each project, sorted by root
+    """
+    types = list(BUILTIN_PROJECTS.values()) if project == AUTO else [BUILTIN_PROJECTS[project]]
+    by_config = {project_type.config_name: project_type.name for project_type in types}
+    preference = {project_type.name: rank for rank, project_type in enumerate(types)}
+
+    pathspecs = [f':(glob)**/{config_name}' for config_name in by_config]
+    output = plumbing.run_git(['ls-files', '-z', '--'] + pathspecs, dirpath)
+    roots: Dict[str, str] = {}
+    for path in output.split(b'\0'):
+        if not path:
+            continue
+        root, config_name = os.path.split(os.fsdecode(path))
+        found = by_config.get(config_name)
+        if found is not None and (root not in roots or preference[found] < preference[roots[root]]):
+            roots[root] = found
+    return [BatchEntry(os.path.normpath(os.path.join(dirpath, root)), found, level)
+            for root, found in sorted(roots.items())]
+
+
+@profiled('changed projects')
+def changed_entries(dirpath: str, since: str, entries: Optional[Iterable[BatchEntry]], project: str,
+                    level: str) -> List[BatchEntry]:
+    """
+    Keep only the projects with a file that changed between the given commit and `HEAD`.
+
+    :param str dirpath:
+        the repository's directory
+    :param str since:
+        the commit to compare `HEAD` with, e.g. the tag of the last release
+    :param entries:
+        the candidate projects, or `None` to discover every project in the repository
+    :param str project:
+        the type of project to discover, when no candidates are given
+    :param str level:
+        the part to bump in each discovered project
+    :return:
+        the candidates that changed, in their original order
+    """
+    if plumbing.rev_parse(dirpath, since) is None:
+        raise ValueError(f'"{since}" is not a commit in {dirpath}')
+    if entries is None:
+        if project != AUTO and project not in BUILTIN_PROJECTS:
+            raise ValueError(f'project with type={project} cannot be discovered; list its roots instead')
+        entries = discover_entries(dirpath, project, level)
+    entries = list(entries)
+
+    trie: PathTrie[int] = PathTrie()
+    for index, entry in enumerate(entries):
+        trie.insert(os.path.relpath(entry.root, dirpath), index)
+
+    hit: Set[int] = set()
+    changed = 0
+    for path in plumbing.iter_changed_paths(dirpath, since):
+        changed += 1
+        owner = trie.owner(path)
+        if owner is not None:
+            hit.add(owner)
+            if len(hit) == len(entries):
+                # stops git, too
+                break
+    LOGGER.debug(f'{changed} paths changed since {since}, in {len(hit)} of {len(entries)} projects')
+    return [entry for index, entry in enumerate(entries) if index in hit]
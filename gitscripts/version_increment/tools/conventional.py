@@ -0,0 +1,263 @@
+"""
+Choose the part of the version to bump from the messages of the commits since the last release, following the
+Conventional Commits convention (https://www.conventionalcommits.org): a `fix` calls for a patch, a `feat` for a minor
+release, and a breaking change (a `!` after the type, or a `BREAKING CHANGE:` footer) for a major release.
+
+The messages are streamed from a single `git log -z`, which is stopped as soon as a breaking change is seen, since
+nothing can call for more. Each commit's classification is cached in `.git/git-ver/commits.json`, along with the
+outcome of the last scan of each range, so that a later run over the same range only streams the commits that were
+added since (as long as the last scanned commit is still an ancestor of `HEAD`).
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tools import plumbing
+from tools.profiling import profiled
+from version_increment.tools.cache import CACHE_DIRNAME, find_git_dir
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_FILENAME = 'commits.json'
+CACHE_FORMAT = 1
+MAX_COMMITS = 1 << 15
+MAX_SCANS = 64
+
+NONE, PATCH, MINOR, MAJOR = range(4)
+LEVEL_NAMES = {PATCH: 'patch', MINOR: 'minor', MAJOR: 'major'}
+TYPE_LEVELS = {b'fix': PATCH, b'feat': MINOR}
+
+_HEADER = re.compile(rb'\s*([A-Za-z]+)(?:\([^()\r\n]*\))?(!)?:[ \t]')
+_BREAKING_FOOTER = re.compile(rb'^BREAKING[ -]CHANGE:[ \t]', re.MULTILINE)
+
+
+def classify(message: bytes) -> int:
+    """
+    Classify a commit message by the part of the version that it calls to bump.
+
+    :param bytes message:
+        the raw commit message
+    :return:
+        one of :py:data:`NONE`, :py:data:`PATCH`, :py:data:`MINOR`, or :py:data:`MAJOR`
+    """
+    header = _HEADER.match(message)
+    if header is not None and header.group(2):
+        return MAJOR
+    if _BREAKING_FOOTER.search(message):
+        return MAJOR
+    if header is None:
+        return NONE
+    return TYPE_LEVELS.get(header.group(1).lower(), NONE)
+
+
+class CommitCache:
+    """
+    The classification of every commit seen so far, and the last commit (and outcome) of the scan of each range.
+
+    Open one with :py:meth:`for_dir`.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self._commits: Dict[str, int] = {}
+        self._scans: Dict[str, Tuple[str, int]] = {}
+        self._dirty = False
+
+    @classmethod
+    def for_dir(cls, dirpath: str) -> Optional['CommitCache']:
+        """
+        Open the cache of the repository that the given directory is in.
+
+        :param str dirpath:
+            a directory inside of the repository
+        :return:
+            the cache, or `None` if the directory is not inside of a repository
+        """
+        git_dir = find_git_dir(dirpath)
+        if git_dir is None:
+            return None
+        cache = cls(os.path.join(git_dir, CACHE_DIRNAME, CACHE_FILENAME))
+        cache._load()
+        return cache
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path, 'r') as fo:
+                raw = json.load(fo)
+        except (OSError, ValueError):
+            return
+        if raw.get('format') != CACHE_FORMAT:
+            return
+        self._commits = raw.get('commits', {})
+        self._scans = {key: tuple(scan) for key, scan in raw.get('scans', {}).items()}
+
+    def classification(self, commit: str) -> Optional[int]:
+        """
+        :param str commit:
+            the commit's id
+        :return:
+            the commit's cached classification, if any
+        """
+        return self._commits.get(commit)
+
+    def classified(self, commit: str, level: int) -> None:
+        """
+        :param str commit:
+            the commit's id
+        :param int level:
+            the commit's classification
+        """
+        self._commits[commit] = level
+        self._dirty = True
+
+    def last_scan(self, scan_range: str) -> Optional[Tuple[str, int]]:
+        """
+        :param str scan_range:
+            the range that was scanned, without its tip
+        :return:
+            the tip of the last scan of the range and the highest classification up to it, if the range was scanned
+        """
+        return self._scans.get(scan_range)
+
+    def scanned(self, scan_range: str, head: str, level: int) -> None:
+        """
+        :param str scan_range:
+            the range that was scanned, without its tip
+        :param str head:
+            the tip of the scan
+        :param int level:
+            the highest classification up to the tip
+        """
+        self._scans.pop(scan_range, None)
+        self._scans[scan_range] = (head, level)
+        self._dirty = True
+
+    def save(self) -> None:
+        """
+        Write the cache back to disk (if it changed), dropping the oldest entries beyond its bounds.
+        """
+        if not self._dirty:
+            return
+        # dicts keep their insertion order, so the oldest entries come first
+        commits = list(self._commits.items())[-MAX_COMMITS:]
+        scans = list(self._scans.items())[-MAX_SCANS:]
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as fo:
+            json.dump({'format': CACHE_FORMAT, 'commits': dict(commits), 'scans': dict(scans)}, fo)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+
+@profiled('conventional commits: scan')
+def commit_level(dirpath: str, since: Optional[str], paths: Iterable[str] = (), until: str = 'HEAD',
+                 use_cache: bool = True, cache: CommitCache = None) -> Optional[str]:
+    """
+    Choose the part of the version to bump from the commits since the given one, up to `HEAD` (or another commit).
+
+    :param str dirpath:
+        the repository's directory
+    :param str since:
+        the last release (e.g. its tag), or `None` to look at every commit up to `HEAD`
+    :param paths:
+        [Opt] only look at the commits that changed these paths (relative to the given directory), e.g. one project's
+        root in a monorepo
+    :param str until:
+        [Opt] the last commit to look at, `HEAD` by default
+    :param bool use_cache:
+        [Opt] whether to read and update the cache of classifications
+    :param CommitCache cache:
+        [Opt] an open cache to use (and leave unsaved), e.g. when choosing the parts for many projects at once
+    :return:
+        `"major"`, `"minor"`, or `"patch"`, or `None` if no commit calls for a release
+    """
+    head = plumbing.rev_parse(dirpath, f'{until}^{{commit}}')
+    if head is None:
+        raise ValueError(f'Could not resolve "{until}" to a commit in "{dirpath}"')
+    base = None
+    if since is not None:
+        base = plumbing.rev_parse(dirpath, f'{since}^{{commit}}')
+        if base is None:
+            raise ValueError(f'Could not resolve "{since}" to a commit in "{dirpath}"')
+
+    owns_cache = cache is None and use_cache
+    if owns_cache:
+        cache = CommitCache.for_dir(dirpath)
+    paths = list(paths)
+    # the paths are relative to the directory, which may differ between runs
+    scan_range = ' '.join([f'^{base}' if base else ''] + [os.path.abspath(os.path.join(dirpath, p)) for p in paths])
+
+    args = ['git', 'log', '-z', '--format=%H%n%B', head]
+    if base is not None:
+        args.append(f'^{base}')
+    level = NONE
+    last_scan = cache.last_scan(scan_range) if cache is not None else None
+    if last_scan is not None:
+        last_head, last_level = last_scan
+        if last_head == head:
+            LOGGER.debug(f'commits up to {head} were already scanned')
+            return LEVEL_NAMES.get(last_level)
+        if plumbing.is_ancestor(dirpath, last_head, head):
+            LOGGER.debug(f'only scanning the commits after {last_head}')
+            args.append(f'^{last_head}')
+            level = last_level
+    args.append('--')
+    args.extend(paths)
+
+    scanned = 0
+    if level < MAJOR:
+        records = plumbing.iter_records(args, dirpath)
+        try:
+            for record in records:
+                commit, _, message = record.partition(b'\n')
+                commit = commit.decode()
+                found = cache.classification(commit) if cache is not None else None
+                if found is None:
+                    found = classify(message)
+                    if cache is not None:
+                        cache.classified(commit, found)
+                scanned += 1
+                if found > level:
+                    level = found
+                    if level == MAJOR:
+                        LOGGER.debug(f'{commit} is a breaking change')
+                        break
+        finally:
+            # stops git, if it is still streaming
+            records.close()
+    LOGGER.debug(f'scanned {scanned} commits; highest level is {LEVEL_NAMES.get(level)}')
+
+    if cache is not None:
+        cache.scanned(scan_range, head, level)
+        if owns_cache:
+            cache.save()
+    return LEVEL_NAMES.get(level)
+
+
+def choose_levels(dirpath: str, since: Optional[str], roots: List[str],
+                  use_cache: bool = True) -> List[Optional[str]]:
+    """
+    Choose the part of the version to bump for each of several projects, from the commits that changed each one,
+    sharing the cache of classifications between them.
+
+    :param str dirpath:
+        the repository's directory
+    :param str since:
+        the last release (e.g. its tag), or `None` to look at every commit up to `HEAD`
+    :param roots:
+        the projects' root directories
+    :param bool use_cache:
+        [Opt] whether to read and update the cache of classifications
+    :return:
+        the part to bump for each project, or `None` where no commit calls for a release
+    """
+    cache = CommitCache.for_dir(dirpath) if use_cache else None
+    levels = [commit_level(dirpath, since, [os.path.relpath(root, dirpath)], use_cache=use_cache, cache=cache)
+              for root in roots]
+    if cache is not None:
+        cache.save()
+    return levels
@@ -0,0 +1,119 @@
+"""
+Bump and commit across many separate repositories at once, running `git_ver.py` against each of them as a
+bounded number of concurrent subprocesses and streaming back each repository's result as soon as it finishes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Callable, List, Optional
+
+from version_increment.tools.batch import BatchEntry
+
+LOGGER = logging.getLogger(__name__)
+
+GIT_VER = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'git_ver.py'))
+DEFAULT_TIMEOUT = 120.0
+SUMMARY_PATTERN = re.compile(r'Commit summary: Version incremented to (\S+)')
+
+
+@dataclass
+class FleetResult:
+    """The outcome of bumping one repository of the fleet."""
+
+    repo: str
+    project: str
+    level: str
+    status: str
+    version: Optional[str]
+    seconds: float
+    output: str
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+
+async def _bump_repo(job: BatchEntry, semaphore: asyncio.Semaphore, timeout: float,
+                     extra_args: List[str]) -> FleetResult:
+    async with semaphore:
+        start = time.monotonic()
+        args = [GIT_VER, job.project, job.level, '-d', job.root] + extra_args
+        proc = await asyncio.create_subprocess_exec(sys.executable, *args, stdin=asyncio.subprocess.DEVNULL,
+                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            stdout, _ = await proc.communicate()
+            status = 'timeout'
+        else:
+            status = 'ok' if proc.returncode == 0 else 'failed'
+
+        output = stdout.decode(errors='replace')
+        match = SUMMARY_PATTERN.search(output)
+        version = match.group(1) if match and status == 'ok' else None
+        return FleetResult(job.root, job.project, job.level, status, version, time.monotonic() - start,
+                           output.strip())
+
+
+async def iter_fleet(jobs: List[BatchEntry], concurrency: int = None, timeout: float = DEFAULT_TIMEOUT,
+                     extra_args: List[str] = None) -> AsyncIterator[FleetResult]:
+    """
+    Bump every repository in the fleet, yielding each result as soon as it is available.
+
+    :param jobs:
+        the repositories to bump; each entry's root is a repository rather than a project directory
+    :param int concurrency:
+        [Opt] the most repositories to work on at once, or nothing to use the number of CPUs
+    :param float timeout:
+        [Opt] the most seconds that any one repository may take before its run is killed
+    :param extra_args:
+        [Opt] more arguments to pass to every run of `git_ver.py`
+    :return:
+        an asynchronous iterator of the results, in the order that they finish
+    """
+    semaphore = asyncio.Semaphore(concurrency or os.cpu_count() or 1)
+    tasks = [asyncio.ensure_future(_bump_repo(job, semaphore, timeout, extra_args or [])) for job in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def run_fleet(jobs: List[BatchEntry], on_result: Callable[[FleetResult], None], concurrency: int = None,
+              timeout: float = DEFAULT_TIMEOUT, extra_args: List[str] = None) -> List[FleetResult]:
+    """
+    Bump every repository in the fleet, calling back with each result as soon as it is available.
+
+    :param jobs:
+        the repositories to bump
+    :param on_result:
+        called with each :py:class:`FleetResult`, in the order that they finish
+    :param int concurrency:
+        [Opt] the most repositories to work on at once, or nothing to use the number of CPUs
+    :param float timeout:
+        [Opt] the most seconds that any one repository may take before its run is killed
+    :param extra_args:
+        [Opt] more arguments to pass to every run of `git_ver.py`
+    :return:
+        every result, in the order that they finished
+    """
+    async def consume() -> List[FleetResult]:
+        results = []
+        async for result in iter_fleet(jobs, concurrency, timeout, extra_args):
+            on_result(result)
+            results.append(result)
+        return results
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(consume())
+    finally:
+        loop.close()
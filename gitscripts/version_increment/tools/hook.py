@@ -0,0 +1,229 @@
+"""
+Bump the version as part of the user's own commit, from git's `pre-commit` and `prepare-commit-msg` hooks, instead of
+in a commit of its own.
+
+The `pre-commit` hook bumps the config file and stages only that file (with `git update-index`) into the commit in
+progress, and leaves the new version in the git directory for the `prepare-commit-msg` hook, which adds a "Version
+incremented to ..." line to the commit message. Neither imports GitPython or anything else that the bump does not
+need, so they add only a few tens of milliseconds to a commit.
+
+A config file whose version is already bumped in the index (e.g. because the commit failed after the hook ran) is
+left alone, and one with unstaged changes is refused, since staging it would commit them too. Set
+`GIT_VER_SKIP_HOOK=1` to commit without bumping (e.g. when amending a commit that was already bumped).
+"""
+
+import os
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from version_increment.tools.types_ import Version
+
+HOOKS = ('pre-commit', 'prepare-commit-msg')
+# the first lines of every hook that git-ver installs, so that it only ever replaces its own
+HOOK_MARKER = '# installed by git-ver'
+# kept in the git directory beside git's own MERGE_MSG and SQUASH_MSG
+PENDING_FILENAME = 'GIT_VER_MSG'
+MESSAGE_FORMAT = 'Version incremented to {}'
+
+# Everything else (logging included) is imported by the function that needs it, since `prepare-commit-msg` needs
+# nothing but the message.
+
+
+def _git_dir(dirpath: str) -> Optional[str]:
+    # git runs commit hooks with the index that is being committed, which is always in the git directory
+    index_file = os.environ.get('GIT_INDEX_FILE')
+    if index_file:
+        return os.path.dirname(os.path.abspath(index_file))
+    from version_increment.tools.cache import find_git_dir
+    return find_git_dir(dirpath)
+
+
+def _leave_message(dirpath: str, version: 'Version') -> None:
+    git_dir = _git_dir(dirpath)
+    if git_dir is not None:
+        with open(os.path.join(git_dir, PENDING_FILENAME), 'w') as fo:
+            fo.write(MESSAGE_FORMAT.format(version))
+
+
+def _head_version(config_path: str, config_filter_func) -> Optional['Version']:
+    from tools import plumbing
+    from version_increment.tools.parsing import scan_config_buffer
+
+    cwd, name = os.path.split(config_path)
+    try:
+        blob = plumbing.run_git(['cat-file', 'blob', f'HEAD:./{name}'], cwd)
+    except plumbing.GitPlumbingError:
+        # a new config file (or the first commit)
+        return None
+    try:
+        return scan_config_buffer(blob, config_filter_func, f'HEAD:{name}').version
+    except ValueError:
+        return None
+
+
+def pre_commit(project: str, level: str, dirpath: str, use_cache: bool = True) -> Optional['Version']:
+    """
+    Bump the version in a project's config file and stage that file (and nothing else) into the commit in progress.
+
+    :param str project:
+        the project's type, as on the command line of `git_ver.py` (e.g. `"rust"` or `"auto"`)
+    :param str level:
+        which part of the version to bump (e.g. `"patch"`)
+    :param str dirpath:
+        the directory of the project
+    :param bool use_cache:
+        [Opt] whether to use the repository's cache of config file locations
+    :return:
+        the new version, or `None` if nothing was bumped
+    """
+    import logging
+    from tools.plumbing import SKIP_HOOK_ENV
+
+    logger = logging.getLogger(__name__)
+    if os.environ.get(SKIP_HOOK_ENV):
+        logger.debug(f'{SKIP_HOOK_ENV} is set; not bumping')
+        return None
+
+    from tools import plumbing
+    from version_increment.tools.cache import ConfigCache
+    from version_increment.tools.lang_utils import bump_config, find_config
+    from version_increment.tools.projects import load_project, resolve_project
+    from version_increment.tools.types_ import LEVELS, Version
+
+    module = load_project(resolve_project(project, dirpath))
+    if level not in LEVELS:
+        raise ValueError(f'not a version part to bump ({", ".join(LEVELS)}): "{level}"')
+
+    try:
+        plumbing.run_git(['diff-index', '--cached', '--quiet', 'HEAD', '--'], dirpath)
+        # git has not yet refused an empty commit when it runs the hook
+        logger.debug('nothing is staged; not bumping')
+        return None
+    except plumbing.GitPlumbingError:
+        # something is staged (or there is no HEAD yet)
+        pass
+
+    cache = ConfigCache.for_dir(dirpath) if use_cache else None
+    config_path, location = find_config(module.config_filter, module.config_name, dirpath, cache=cache)
+    cwd, name = os.path.split(config_path)
+    status = next(plumbing.iter_status(cwd, [f':(literal){name}'], untracked=False, fast=False), None)
+    if status is not None:
+        if status.xy[1] != '.':
+            raise ValueError(f'{config_path} has unstaged changes, which bumping it would commit; stage or stash '
+                             f'them first')
+        head_version = _head_version(config_path, module.config_filter)
+        if head_version is None:
+            logger.info(f'{config_path} is new in this commit; not bumping')
+            return None
+        if head_version != location.version:
+            logger.info(f'{config_path} is already bumped to {location.version} in this commit; not bumping')
+            _leave_message(dirpath, location.version)
+            return None
+
+    _, new_version, _ = bump_config(getattr(Version, level), module.write, module.config_filter, module.config_name,
+                                    dirpath, use_cache=use_cache)
+    plumbing.update_index(cwd, [name])
+    _leave_message(dirpath, new_version)
+    return new_version
+
+
+def prepare_commit_msg(message_path: str, dirpath: str = None) -> bool:
+    """
+    Add the line left by :py:func:`pre_commit` (if any) to the commit message, above git's comments.
+
+    :param str message_path:
+        the file holding the commit message, as passed to the hook
+    :param str dirpath:
+        [Opt] a directory in the repository, or nothing for the current working directory
+    :return:
+        whether the message was changed
+    """
+    git_dir = _git_dir(dirpath or os.getcwd())
+    if git_dir is None:
+        return False
+    pending_path = os.path.join(git_dir, PENDING_FILENAME)
+    try:
+        with open(pending_path, 'r') as fo:
+            line = fo.read().strip()
+        os.remove(pending_path)
+    except FileNotFoundError:
+        return False
+
+    with open(message_path, 'r') as fo:
+        message = fo.read()
+    if line in message:
+        return False
+    lines = message.splitlines(keepends=True)
+    comments = next((index for index, text in enumerate(lines) if text.startswith('#')), len(lines))
+    body, rest = ''.join(lines[:comments]).strip('\n'), ''.join(lines[comments:])
+    # with no message yet, the first line is left for the user to write the subject on
+    message = f'{body}\n\n{line}\n' + (f'\n{rest}' if rest else '')
+    with open(message_path, 'w') as fo:
+        fo.write(message)
+    return True
+
+
+def hook_scripts(project: str, level: str, dirpath: str, script_path: str) -> dict:
+    """
+    Write the contents of the hooks that run the given project's bump on every commit.
+
+    :param str project:
+        the project's type
+    :param str level:
+        which part of the version to bump
+    :param str dirpath:
+        the project's directory, relative to the top of the work tree (where git runs hooks)
+    :param str script_path:
+        the absolute path to `git_ver_hook.py`
+    :return:
+        the contents of each hook, by name
+    """
+    import shlex
+    import sys
+
+    command = f'exec {shlex.quote(sys.executable)} {shlex.quote(script_path)}'
+    return {
+        'pre-commit': f'#!/bin/sh\n{HOOK_MARKER}\n{command} pre-commit {shlex.quote(project)} '
+                      f'{shlex.quote(level)} -d {shlex.quote(dirpath)}\n',
+        'prepare-commit-msg': f'#!/bin/sh\n{HOOK_MARKER}\n{command} prepare-commit-msg "$@"\n',
+    }
+
+
+def install_hooks(project: str, level: str, dirpath: str, script_path: str, force: bool = False) -> List[str]:
+    """
+    Install the `pre-commit` and `prepare-commit-msg` hooks in the repository that the given directory is in
+    (wherever `core.hooksPath` points), replacing hooks installed by git-ver before.
+
+    :param str project:
+        the project's type
+    :param str level:
+        which part of the version to bump
+    :param str dirpath:
+        the project's directory
+    :param str script_path:
+        the absolute path to `git_ver_hook.py`
+    :param bool force:
+        [Opt] whether to replace hooks that git-ver did not install
+    :return:
+        the paths of the hooks installed
+    """
+    from tools import plumbing
+
+    top = plumbing.run_git(['rev-parse', '--show-toplevel'], dirpath).decode().strip()
+    hooks_dir = plumbing.run_git(['rev-parse', '--git-path', 'hooks'], dirpath).decode().strip()
+    hooks_dir = os.path.normpath(os.path.join(os.path.abspath(dirpath), hooks_dir))
+    scripts = hook_scripts(project, level, os.path.relpath(os.path.abspath(dirpath), top), script_path)
+
+    paths = [os.path.join(hooks_dir, hook) for hook in HOOKS]
+    for path in paths:
+        if not force and os.path.exists(path):
+            with open(path, 'r', errors='replace') as fo:
+                if HOOK_MARKER not in fo.read():
+                    raise ValueError(f'{path} already exists and was not installed by git-ver; pass --force to '
+                                     f'replace it')
+    os.makedirs(hooks_dir, exist_ok=True)
+    for hook, path in zip(HOOKS, paths):
+        with open(path, 'w') as fo:
+            fo.write(scripts[hook])
+        os.chmod(path, 0o755)
+    return paths
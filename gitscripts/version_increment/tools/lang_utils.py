@@ -1,25 +1,163 @@
+import io
 import logging
-from typing import Callable, Optional, Tuple
+import os
+from dataclasses import replace
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple
 
-from in_place import InPlace
-
-from tools.filesystem import seek_file, write_new_version
-from version_increment.tools.parsing import parse_config
+from tools.filesystem import DiscoveryOptions, patch_file_span, seek_file, write_new_version
+from tools.profiling import profiled
+from tools.transaction import EditTransaction
+from version_increment.tools.cache import ConfigCache
+from version_increment.tools.parsing import ConfigLocation, locate_config_version
 from version_increment.tools.types_ import Version
 
+if TYPE_CHECKING:
+    from in_place import InPlace
+    from version_increment.tools.sync import SyncTarget
+
 LOGGER = logging.getLogger(__name__)
 
 
-def do_bump(version_func: Callable[[Version], Version],
-            write_func: Callable[[str, InPlace], None],
-            config_filter_func: Callable[[str, Optional[int]], Tuple[int, bool, Version]],
-            config_name: str, dirpath: str = None):
+def _span_holds(config_path: str, location: ConfigLocation) -> bool:
+    """Cheaply double-check that a cached span still holds the cached version, by reading only that span."""
+    if not location.has_span:
+        return True
+    with open(config_path, 'rb') as fo:
+        fo.seek(location.start)
+        token = fo.read(location.end - location.start)
+    try:
+        return Version.from_str(token.decode()) == location.version
+    except ValueError:
+        return False
+
+
+@profiled('write_new_version')
+def write_version(new_version: Version, config_path: str, location: ConfigLocation,
+                  write_func: Callable[[str, 'InPlace'], None],
+                  transaction: EditTransaction = None) -> ConfigLocation:
+    """
+    Write the new version into the config file, patching only the bytes of the old version token when its span is
+    known and falling back to rewriting the whole line with the project's `write` function when it is not.
+
+    :param Version new_version:
+        the version to write
+    :param str config_path:
+        the path to the config file
+    :param ConfigLocation location:
+        where the old version is in the file
+    :param write_func:
+        the project's `write` function, used when the span of the old version is not known
+    :param EditTransaction transaction:
+        [Opt] the transaction to stage the edit in, or nothing to write the file right away
+    :return:
+        the location of the new version in the file
+    """
+    new_str = str(new_version)
+    if not location.has_span:
+        if transaction is None:
+            write_new_version(new_str, location.lineno, config_path, write_func)
+        else:
+            out = io.StringIO()
+            for lineno, line in enumerate(io.StringIO(transaction.read(config_path).decode())):
+                if lineno == location.lineno:
+                    write_func(new_str, out)
+                else:
+                    out.write(line)
+            transaction.write(config_path, out.getvalue().encode())
+        return replace(location, version=new_version)
+
+    replacement = new_str.encode()
+    if transaction is None:
+        patch_file_span(config_path, location.start, location.end, replacement)
+    else:
+        transaction.patch(config_path, [(location.start, location.end, replacement)])
+    return replace(location, end=location.start + len(replacement), version=new_version)
+
+
+def find_config(config_filter_func: Callable[[bytes, Optional[int]], Tuple[int, bool, Version]],
+                config_name: str, dirpath: str, discovery: DiscoveryOptions = None,
+                cache: ConfigCache = None) -> Tuple[str, ConfigLocation]:
+    """
+    Find a project's config file and the location of the version in it, trusting the cache if it is still fresh.
+
+    :param config_filter_func:
+        the project's `config_filter`
+    :param str config_name:
+        the name of the project's config file
+    :param str dirpath:
+        the directory to search for the config file
+    :param DiscoveryOptions discovery:
+        [Opt] how to search for the config file
+    :param ConfigCache cache:
+        [Opt] the cache to consult before searching, or nothing to always search
+    :return:
+        the path to the config file and the location of the version in it
+    """
+    cached = cache.lookup(dirpath, config_name) if cache is not None else None
+    if cached is not None and _span_holds(*cached):
+        LOGGER.debug(f'cache hit for config_path={cached[0]}')
+        return cached
+
+    config_path = seek_file(config_name, dirpath, options=discovery)
+    if config_path is None:
+        raise ValueError(f'Could not find a file named "{config_name}" in "{dirpath}"')
+    LOGGER.debug(f'config_path={config_path}')
+    return config_path, locate_config_version(config_path, config_filter_func)
+
+
+@profiled('do_bump')
+def bump_config(version_func: Callable[[Version], Version],
+                write_func: Callable[[str, 'InPlace'], None],
+                config_filter_func: Callable[[bytes, Optional[int]], Tuple[int, bool, Version]],
+                config_name: str, dirpath: str = None, discovery: DiscoveryOptions = None,
+                use_cache: bool = True, sync_targets: Iterable['SyncTarget'] = (),
+                workers: int = None, transaction: EditTransaction = None) -> Tuple[str, Version, List[str]]:
+    """
+    Bump the version in a project's config file, like :py:func:`do_bump`, but also say which file was bumped, and
+    bring any sync targets (see :py:mod:`version_increment.tools.sync`) along with it. The sync targets are all
+    scanned before anything is written, so that one which no longer holds the old version leaves every file as it was,
+    and the config file and sync targets are all written together (see :py:class:`~tools.transaction.EditTransaction`).
+
+    :param sync_targets:
+        [Opt] the other files holding copies of the version
+    :param int workers:
+        [Opt] the most threads to use for the sync targets, or nothing to let the thread pool decide
+    :param EditTransaction transaction:
+        [Opt] the transaction to write the files with, which is applied (but left for the caller to finish or roll
+        back), or nothing to write them with a transaction of its own
+    :return:
+        the path to the config file that was bumped, the new version, and the paths of the sync targets patched
+    """
     LOGGER.debug(f'do_bump: dirpath={dirpath}')
-    config_path = seek_file(config_name, dirpath)
-    LOGGER.debug(f'do_bump: config_path={config_path}')
+    search_dir = dirpath or os.getcwd()
+    cache = ConfigCache.for_dir(search_dir) if use_cache else None
+    config_path, location = find_config(config_filter_func, config_name, search_dir, discovery, cache)
+
+    new_version = version_func(location.version)
+    sync_edits = []
+    if sync_targets:
+        from version_increment.tools.sync import plan_sync
+        sync_edits = plan_sync(sync_targets, location.version, new_version, search_dir, [config_path], workers)
 
-    lineno, old_version = parse_config(config_path, config_filter_func)
-    new_version = version_func(old_version)
-    write_new_version(str(new_version), lineno, config_path, write_func)
+    edits = transaction or EditTransaction()
+    new_location = write_version(new_version, config_path, location, write_func, edits)
+    synced = []
+    if sync_edits:
+        from version_increment.tools.sync import apply_sync
+        synced = apply_sync(sync_edits, workers, edits)
+    edits.apply()
+    if transaction is None:
+        edits.finish()
 
-    return new_version
+    if cache is not None:
+        cache.store(search_dir, config_name, config_path, new_location)
+        cache.save()
+
+    return config_path, new_version, synced
+
+
+def do_bump(version_func: Callable[[Version], Version],
+            write_func: Callable[[str, 'InPlace'], None],
+            config_filter_func: Callable[[bytes, Optional[int]], Tuple[int, bool, Version]],
+            config_name: str, dirpath: str = None, discovery: DiscoveryOptions = None, use_cache: bool = True):
+    return bump_config(version_func, write_func, config_filter_func, config_name, dirpath, discovery, use_cache)[1]
@@ -1,25 +1,111 @@
 import os
 import logging
+import mmap
+import re
+from dataclasses import dataclass
 from typing import Tuple, Callable, Optional
 
+from tools import profiling
+from tools.profiling import profiled
 from version_increment.tools.types_ import Version
 
 LOGGER = logging.getLogger(__file__)
 
+VERSION_KEY = b'version'
+VERSION_TOKEN = re.compile(rb'\d+\.\d+\.\d+(?:-[0-9A-Za-z.-]+)?(?:\+[0-9A-Za-z.-]+)?')
 
-def parse_config(config_path: str,
-                 filter_func: Callable[[str, Optional[int]], Tuple[int, bool, Version]]) -> Tuple[int, Version]:
+
+@dataclass
+class ConfigLocation:
+    """
+    Where a config file's version number lives: the line it is on and, when it could be pinned down, the exact byte
+    span of the version token itself (excluding any quotes around it).
+    """
+
+    lineno: int
+    offset: int
+    start: Optional[int]
+    end: Optional[int]
+    version: Version
+
+    @property
+    def has_span(self) -> bool:
+        return self.start is not None and self.end is not None
+
+
+def _resolve_config_path(config_path: str) -> str:
     if not os.path.isfile(config_path):
         path = os.path.abspath(config_path)
         if not os.path.isfile(path):
             raise ValueError(f'Could not find a file with the path "{config_path}"')
-    else:
-        path = config_path
-
-    with open(path, 'r') as fo:
-        lineno = -1
-        for line in fo:
-            lineno, found, version = filter_func(line, lineno)
-            if found:
-                return lineno, version
-        raise RuntimeWarning(f'version number not found in {config_path}')
+        return path
+    return config_path
+
+
+def _token_span(line: bytes, offset: int) -> Tuple[Optional[int], Optional[int]]:
+    key_index = line.find(VERSION_KEY)
+    match = VERSION_TOKEN.search(line, max(key_index, 0))
+    if match is None:
+        return None, None
+    return offset + match.start(), offset + match.end()
+
+
+def scan_config_buffer(buffer, filter_func: Callable[[bytes, Optional[int]], Tuple[int, bool, Version]],
+                       name: str = 'config') -> ConfigLocation:
+    """
+    Find the version number in the contents of a config file, in a single pass over the given buffer.
+
+    :param buffer:
+        the contents of the config file, as `bytes` or any other bytes-like object supporting `find` (e.g. an `mmap`)
+    :param filter_func:
+        the project's `config_filter`, called on each line (as `bytes`) until it reports that the version has been
+        found
+    :param str name:
+        [Opt] what to call the config in the error raised if no version is found
+    :return:
+        the :py:class:`ConfigLocation` of the version number
+    """
+    lineno = -1
+    offset = 0
+    size = len(buffer)
+    while offset < size:
+        newline = buffer.find(b'\n', offset)
+        line_end = size if newline == -1 else newline + 1
+        raw = buffer[offset:line_end]
+        lineno, found, version = filter_func(raw, lineno)
+        if found:
+            start, end = _token_span(raw, offset)
+            return ConfigLocation(lineno, offset, start, end, version)
+        offset = line_end
+    raise RuntimeWarning(f'version number not found in {name}')
+
+
+@profiled('parse_config')
+def locate_config_version(config_path: str,
+                          filter_func: Callable[[bytes, Optional[int]], Tuple[int, bool, Version]]) -> ConfigLocation:
+    """
+    Find the line of the given config file that holds its version number, along with the byte span of the version
+    token on it, reading the file only once.
+
+    :param str config_path:
+        the path to the config file
+    :param filter_func:
+        the project's `config_filter`, called on each line until it reports that the version has been found
+    :return:
+        the :py:class:`ConfigLocation` of the version number
+    """
+    path = _resolve_config_path(config_path)
+
+    with open(path, 'rb') as fo:
+        size = os.fstat(fo.fileno()).st_size
+        if size == 0:
+            raise RuntimeWarning(f'version number not found in {config_path}')
+        profiling.count(profiling.BYTES_READ, size)
+        with mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return scan_config_buffer(buffer, filter_func, config_path)
+
+
+def parse_config(config_path: str,
+                 filter_func: Callable[[bytes, Optional[int]], Tuple[int, bool, Version]]) -> Tuple[int, Version]:
+    location = locate_config_version(config_path, filter_func)
+    return location.lineno, location.version
@@ -0,0 +1,134 @@
+"""
+The project types that can be bumped, and the modules that implement them.
+
+The built-in types are listed here statically; more can be registered by other distributions under the
+:py:data:`ENTRY_POINT_GROUP` entry point group, naming the module that implements the type (e.g.
+`gradle = my_package.gradle`). Nothing is imported until it is needed: only the requested type's module is ever loaded,
+and installed distributions are only searched for entry points when a type is not built in.
+"""
+
+import logging
+import os
+from importlib import import_module
+from types import ModuleType
+from typing import Dict, List, NamedTuple, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = 'gitscripts.project_types'
+AUTO = 'auto'
+LIST = 'list'
+
+
+class ProjectType(NamedTuple):
+    """A built-in project type: its name, the module implementing it, and the name of its config file."""
+
+    name: str
+    module: str
+    config_name: str
+
+
+# in order of preference when detecting the type of a directory holding more than one kind of config file
+BUILTIN_PROJECTS = {project.name: project for project in (
+    ProjectType('rust', 'version_increment.rust.rust', 'Cargo.toml'),
+    ProjectType('python', 'version_increment.python.python', 'setup.py'),
+    ProjectType('pyproject', 'version_increment.pyproject.pyproject', 'pyproject.toml'),
+    ProjectType('node', 'version_increment.node.node', 'package.json'),
+    ProjectType('maven', 'version_increment.maven.maven', 'pom.xml'),
+)}
+PROJECT_TYPES = list(BUILTIN_PROJECTS)
+
+_plugins = None
+
+
+def _plugin_entry_points() -> Dict[str, object]:
+    global _plugins
+    if _plugins is None:
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:
+            try:
+                from importlib_metadata import entry_points
+            except ImportError:
+                entry_points = None
+
+        _plugins = {}
+        if entry_points is not None:
+            found = entry_points()
+            group = found.select(group=ENTRY_POINT_GROUP) if hasattr(found, 'select') \
+                else found.get(ENTRY_POINT_GROUP, ())
+            for entry_point in group:
+                if entry_point.name in BUILTIN_PROJECTS:
+                    LOGGER.warning(f'ignoring plugin {entry_point.value} shadowing built-in type={entry_point.name}')
+                    continue
+                _plugins[entry_point.name] = entry_point
+    return _plugins
+
+
+def project_types() -> List[str]:
+    """
+    List every project type that can be bumped: the built-in types, followed by any registered by plugins.
+
+    :return:
+        the names of the project types
+    """
+    return PROJECT_TYPES + sorted(_plugin_entry_points())
+
+
+def load_project(project: str) -> ModuleType:
+    """
+    Import the module implementing the given project type, which provides its `config_name`, `config_filter`, and
+    `write`.
+
+    :param str project:
+        the project type, e.g. `"python"`
+    :return:
+        the project type's module
+    """
+    builtin = BUILTIN_PROJECTS.get(project)
+    if builtin is not None:
+        return import_module(builtin.module)
+    entry_point = _plugin_entry_points().get(project)
+    if entry_point is None:
+        raise ValueError(f'project with type={project} is not a supported project type')
+    return entry_point.load()
+
+
+def detect_project(dirpath: str) -> Optional[str]:
+    """
+    Determine the type of the project in the given directory from the config files directly inside of it, listing
+    the directory only once.
+
+    :param str dirpath:
+        the project's root directory
+    :return:
+        the detected project type, or `None` if no known config file is in the directory
+    """
+    names = set(os.listdir(dirpath))
+    for project in BUILTIN_PROJECTS.values():
+        if project.config_name in names:
+            return project.name
+    for name in sorted(_plugin_entry_points()):
+        if getattr(load_project(name), 'config_name', None) in names:
+            return name
+    return None
+
+
+def resolve_project(project: str, dirpath: str) -> str:
+    """
+    Resolve `"auto"` to the detected type of the project in the given directory, passing any other type through.
+
+    :param str project:
+        the requested project type
+    :param str dirpath:
+        the project's root directory
+    :return:
+        the project type to bump
+    """
+    if project != AUTO:
+        return project
+    detected = detect_project(dirpath)
+    if detected is None:
+        raise ValueError(f'could not detect the type of the project in {dirpath}')
+    LOGGER.debug(f'detected project type={detected} in {dirpath}')
+    return detected
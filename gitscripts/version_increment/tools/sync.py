@@ -0,0 +1,235 @@
+"""
+Keep copies of a project's version in other files (e.g. `__init__.py`, `docs/conf.py`, `Cargo.lock`, Helm charts, and
+READMEs) in step with its config file.
+
+Each sync target is a file (or glob) and a search template, such as `__version__ = '{version}'`, in which `{version}`
+stands for the version. Before a bump, every template is filled in with the old version; all of a file's templates
+are then found in a single scan of the file by one combined pattern, and every file is scanned, and later patched
+through the same writer as the config file, in parallel.
+
+Targets come from `--sync` arguments and from the `[sync.<name>]` sections of a `.git-ver.cfg` file in the
+directory being bumped::
+
+    [sync.init]
+    path = src/my_package/__init__.py
+    search = __version__ = '{version}'
+
+    [sync.lock]
+    path = Cargo.lock
+    search = name = "my-crate"
+        version = "{version}"
+"""
+
+import configparser
+import functools
+import glob
+import logging
+import mmap
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from tools import profiling
+from tools.profiling import profiled
+from tools.transaction import EditTransaction
+from version_increment.tools.types_ import Version
+
+LOGGER = logging.getLogger(__name__)
+
+SYNC_CONFIG = '.git-ver.cfg'
+SYNC_SECTION_PREFIX = 'sync.'
+VERSION_FIELD = '{version}'
+DEFAULT_SEARCH = VERSION_FIELD
+
+
+class SyncTarget(NamedTuple):
+    """A file (or glob of files) holding a copy of the version, and the template that the copy is found by."""
+
+    path: str
+    search: str = DEFAULT_SEARCH
+
+
+class SyncEdit(NamedTuple):
+    """The spans of one file that hold the old version, found by a scan, and what to replace them with."""
+
+    path: str
+    spans: List[Tuple[int, int, bytes]]
+
+
+def parse_sync_arg(arg: str) -> SyncTarget:
+    """
+    Parse a `--sync` argument, `PATH[:TEMPLATE]`.
+
+    :param str arg:
+        the argument
+    :return:
+        the sync target; its template is the bare version if the argument does not give one
+    """
+    # a colon as the second character is a Windows drive, not the start of a template
+    separator = arg.find(':', 2)
+    if separator == -1:
+        return SyncTarget(arg)
+    return SyncTarget(arg[:separator], arg[separator + 1:])
+
+
+def load_sync_targets(dirpath: str, extra: Iterable[SyncTarget] = ()) -> List[SyncTarget]:
+    """
+    Read the sync targets of the `.git-ver.cfg` file in the given directory (if there is one), followed by any given
+    explicitly.
+
+    :param str dirpath:
+        the directory being bumped
+    :param extra:
+        [Opt] more targets, e.g. from `--sync` arguments
+    :return:
+        every sync target
+    """
+    targets = []
+    config_path = os.path.join(dirpath, SYNC_CONFIG)
+    if os.path.isfile(config_path):
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(config_path)
+        for section in parser.sections():
+            if not section.startswith(SYNC_SECTION_PREFIX):
+                continue
+            if 'path' not in parser[section]:
+                raise ValueError(f'{config_path}: [{section}] has no path')
+            targets.append(SyncTarget(parser[section]['path'], parser[section].get('search', DEFAULT_SEARCH)))
+    targets.extend(extra)
+    for target in targets:
+        if VERSION_FIELD not in target.search:
+            raise ValueError(f'the search template for {target.path} has no {VERSION_FIELD}: "{target.search}"')
+    return targets
+
+
+def _expand_targets(targets: Iterable[SyncTarget], dirpath: str, exclude: Iterable[str]) -> Dict[str, List[str]]:
+    excluded = {os.path.realpath(path) for path in exclude}
+    templates: Dict[str, List[str]] = {}
+    for target in targets:
+        pattern = target.path if os.path.isabs(target.path) else os.path.join(dirpath, target.path)
+        paths = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        if not paths:
+            raise ValueError(f'no files match the sync target {target.path}')
+        for path in paths:
+            if os.path.realpath(path) in excluded:
+                LOGGER.debug(f'skipping sync target path={path}, which is bumped anyway')
+                continue
+            search = templates.setdefault(os.path.normpath(path), [])
+            if target.search not in search:
+                search.append(target.search)
+    return templates
+
+
+# a version at either end of a template must not be part of a longer version (e.g. 1.2.3 in 11.2.3, 0.1.2.3, or
+# 1.2.30), but may follow a prefix such as the v of v1.2.3, pkg- or release.
+_BEFORE_VERSION = rb'(?<!\d)(?<!\d[.+])'
+_AFTER_VERSION = rb'(?![\w+-]|\.\w)'
+
+
+@functools.lru_cache(maxsize=None)
+def _combined_pattern(searches: Tuple[Tuple[bytes, bool, bool], ...]):
+    # one alternation of every literal, longest first so that a template that extends another one wins
+    alternatives = []
+    for search, starts_with_version, ends_with_version in sorted(searches, key=lambda s: len(s[0]), reverse=True):
+        alternatives.append((_BEFORE_VERSION if starts_with_version else b'') + re.escape(search)
+                            + (_AFTER_VERSION if ends_with_version else b''))
+    return re.compile(b'|'.join(alternatives))
+
+
+def _version_offsets(template: str, old: str) -> Tuple[bytes, List[int]]:
+    parts = [part.encode() for part in template.split(VERSION_FIELD)]
+    old_bytes = old.encode()
+    offsets = []
+    position = 0
+    for part in parts[:-1]:
+        position += len(part)
+        offsets.append(position)
+        position += len(old_bytes)
+    return old_bytes.join(parts), offsets
+
+
+def _scan(path: str, templates: List[str], old: str, new: bytes) -> SyncEdit:
+    searches = {}
+    bounds = []
+    for template in templates:
+        search, offsets = _version_offsets(template, old)
+        searches[search] = offsets
+        bounds.append((search, template.startswith(VERSION_FIELD), template.endswith(VERSION_FIELD)))
+    old_length = len(old.encode())
+    found = set()
+    spans = set()
+
+    with open(path, 'rb') as fo:
+        size = os.fstat(fo.fileno()).st_size
+        profiling.count(profiling.BYTES_READ, size)
+        if size:
+            with mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for match in _combined_pattern(tuple(bounds)).finditer(buffer):
+                    found.add(match.group(0))
+                    for offset in searches[match.group(0)]:
+                        start = match.start() + offset
+                        spans.add((start, start + old_length, new))
+
+    # a template that a longer one extends is found inside of the longer one's match, which won the alternation
+    missing = [template for template, search in zip(templates, searches)
+               if not any(search in match for match in found)]
+    if missing:
+        raise RuntimeWarning(f'version {old} not found in {path} by: ' + ', '.join(f'"{m}"' for m in missing))
+    return SyncEdit(path, sorted(spans))
+
+
+@profiled('sync: scan')
+def plan_sync(targets: Iterable[SyncTarget], old_version: Version, new_version: Version, dirpath: str,
+              exclude: Iterable[str] = (), workers: int = None) -> List[SyncEdit]:
+    """
+    Find every copy of the old version in the sync targets, scanning each file once, without changing anything.
+
+    :param targets:
+        the sync targets, with paths relative to the given directory
+    :param Version old_version:
+        the version that the targets hold now
+    :param Version new_version:
+        the version to put in their place
+    :param str dirpath:
+        the directory being bumped
+    :param exclude:
+        [Opt] files not to sync, e.g. the config file itself
+    :param int workers:
+        [Opt] the most threads to use, or nothing to let the thread pool decide
+    :return:
+        the edit to make to each file
+    """
+    templates = _expand_targets(targets, dirpath, exclude)
+    if not templates:
+        return []
+    old = str(old_version)
+    new = str(new_version).encode()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        edits = list(executor.map(lambda path: _scan(path, templates[path], old, new), templates))
+    LOGGER.debug(f'found {sum(len(edit.spans) for edit in edits)} copies of {old} in {len(edits)} files')
+    return edits
+
+
+@profiled('sync: write')
+def apply_sync(edits: List[SyncEdit], workers: int = None, transaction: EditTransaction = None) -> List[str]:
+    """
+    Make the edits found by :py:func:`plan_sync`, reading the files in parallel.
+
+    :param edits:
+        the edit to make to each file
+    :param int workers:
+        [Opt] the most threads to use, or nothing to let the thread pool decide
+    :param EditTransaction transaction:
+        [Opt] the transaction to stage the edits in, or nothing to write them (all together) right away
+    :return:
+        the paths of the files that were patched
+    """
+    if edits:
+        staged = transaction or EditTransaction()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda edit: staged.patch(edit.path, edit.spans), edits))
+        if transaction is None:
+            staged.apply()
+            staged.finish()
+    return [edit.path for edit in edits]
@@ -0,0 +1,390 @@
+"""
+An index of a repository's version tags (e.g. `v1.2.3`), for computing the next version from the highest release
+tag rather than from the config file, and for finding the next version that is not tagged yet.
+
+Tags are read straight from `packed-refs` and the loose refs under `refs/tags`, never through GitPython, and kept
+sorted by version precedence under packed integer keys (see :py:mod:`version_increment.tools.bulk`), so that queries
+are binary searches. The index is persisted in `.git/git-ver/tags.json` and updated incrementally: `packed-refs` is
+only re-read when its stat data changes, the loose refs are only re-listed when one of their directories changes, and
+only the names of new tags are parsed.
+"""
+
+import bisect
+import json
+import logging
+import os
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from tools import plumbing, profiling
+from tools.profiling import profiled
+from version_increment.tools.bulk import pack
+from version_increment.tools.cache import CACHE_DIRNAME, find_git_dir
+from version_increment.tools.types_ import Version
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'tags.json'
+INDEX_FORMAT = 1
+DEFAULT_PREFIX = 'v'
+TAGS_DIR = os.path.join('refs', 'tags')
+
+_PACKED_TAG = re.compile(rb'^[0-9a-f]{40,64} refs/tags/(.+)$', re.MULTILINE)
+# stricter than a config file's version: a tag's name is exactly its prefix and the version
+_TAG_VERSION = re.compile(r'(\d+)\.(\d+)\.(\d+)(?:-([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?(?:\+[0-9A-Za-z-.]+)?')
+
+
+def common_dir(git_dir: str) -> str:
+    """
+    Find the directory holding a repository's shared refs, which a linked worktree's git directory points to.
+
+    :param str git_dir:
+        the git directory
+    :return:
+        the common git directory
+    """
+    commondir_path = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir_path):
+        with open(commondir_path, 'r') as fo:
+            return os.path.normpath(os.path.join(git_dir, fo.read().strip()))
+    return git_dir
+
+
+def _stat_key(path: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+class TagIndex:
+    """
+    The version tags of a repository, sorted by version precedence.
+
+    Open one with :py:meth:`for_dir`.
+    """
+
+    def __init__(self, git_dir: str, prefix: str = DEFAULT_PREFIX):
+        self.git_dir = common_dir(git_dir)
+        self.prefix = prefix
+        self.index_path = os.path.join(git_dir, CACHE_DIRNAME, INDEX_FILENAME)
+        self._keys: List[int] = []
+        self._names: List[str] = []
+        self._packed: Dict[str, int] = {}
+        self._loose: Dict[str, int] = {}
+        self._packed_stat: Optional[List[int]] = None
+        self._loose_dirs: Dict[str, int] = {}
+        self._dirty = False
+
+    @classmethod
+    def for_dir(cls, dirpath: str, prefix: str = DEFAULT_PREFIX) -> 'TagIndex':
+        """
+        Open the tag index of the repository that the given directory is in, bringing it (and its copy on disk) up to
+        date.
+
+        :param str dirpath:
+            a directory inside of the repository
+        :param str prefix:
+            [Opt] the prefix of version tags, `"v"` by default
+        :return:
+            the up-to-date index
+        """
+        git_dir = find_git_dir(dirpath)
+        if git_dir is None:
+            raise ValueError(f'{dirpath} is not inside of a git repository')
+        index = cls(git_dir, prefix)
+        index._load()
+        index.refresh()
+        index.save()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __contains__(self, version: Union[Version, str]) -> bool:
+        return self.tag_name(version) in self._packed or self.tag_name(version) in self._loose
+
+    def tag_name(self, version: Union[Version, str]) -> str:
+        """
+        Name the tag of a version, e.g. `v1.2.3`.
+
+        :param version:
+            the version
+        :return:
+            the tag's name
+        """
+        return f'{self.prefix}{version}'
+
+    def _parse(self, name: str) -> Optional[int]:
+        if not name.startswith(self.prefix):
+            return None
+        match = _TAG_VERSION.fullmatch(name, len(self.prefix))
+        if match is None:
+            return None
+        major_, minor_, patch_, prerelease = match.groups()
+        return pack(int(major_), int(minor_), int(patch_), prerelease is None)
+
+    def _version(self, position: int) -> Version:
+        return Version.from_str(self._names[position][len(self.prefix):])
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, 'r') as fo:
+                raw = json.load(fo)
+        except (OSError, ValueError):
+            return
+        if raw.get('format') != INDEX_FORMAT or raw.get('prefix') != self.prefix:
+            return
+        self._packed_stat = raw.get('packed_stat')
+        self._loose_dirs = raw.get('loose_dirs', {})
+        self._packed = {name: key for key, name in raw.get('packed', [])}
+        self._loose = {name: key for key, name in raw.get('loose', [])}
+        self._rebuild()
+
+    def save(self) -> None:
+        """
+        Write the index back to disk, if it changed.
+        """
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as fo:
+            json.dump({
+                'format': INDEX_FORMAT, 'prefix': self.prefix,
+                'packed_stat': self._packed_stat, 'loose_dirs': self._loose_dirs,
+                'packed': [[key, name] for name, key in self._packed.items()],
+                'loose': [[key, name] for name, key in self._loose.items()],
+            }, fo)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+    def _rebuild(self) -> None:
+        rows = dict(self._packed)
+        rows.update(self._loose)
+        # pre-releases tie on their packed keys, so those are ordered by their full precedence
+        ordered = sorted(rows.items(), key=lambda row: (row[1], 0) if row[1] & 1 else
+                         (row[1], Version.from_str(row[0][len(self.prefix):]).precedence()))
+        self._names = [name for name, _ in ordered]
+        self._keys = [key for _, key in ordered]
+
+    @profiled('tags: refresh')
+    def refresh(self) -> None:
+        """
+        Bring the index up to date with the repository's tags, re-reading only what changed.
+        """
+        changed = False
+        packed_path = os.path.join(self.git_dir, 'packed-refs')
+        packed_stat = _stat_key(packed_path)
+        if packed_stat != self._packed_stat:
+            self._packed = self._read_packed(packed_path) if packed_stat is not None else {}
+            self._packed_stat = packed_stat
+            changed = True
+
+        # adding or removing a loose tag changes the mtime of its directory (and making a directory, its parent's)
+        if not self._loose_dirs or any(self._mtime(dirname) != mtime for dirname, mtime in self._loose_dirs.items()):
+            loose = self._read_loose()
+            if loose != self._loose:
+                self._loose = loose
+                changed = True
+            self._dirty = True
+
+        if changed:
+            self._dirty = True
+            self._rebuild()
+            LOGGER.debug(f'indexed {len(self._names)} version tags')
+
+    def _mtime(self, dirname: str) -> Optional[int]:
+        stat = _stat_key(os.path.join(self.git_dir, dirname))
+        return None if stat is None else stat[0]
+
+    def _read_packed(self, path: str) -> Dict[str, int]:
+        with open(path, 'rb') as fo:
+            data = fo.read()
+        profiling.count(profiling.BYTES_READ, len(data))
+        known = self._packed
+        packed = {}
+        for match in _PACKED_TAG.finditer(data):
+            name = match.group(1).decode()
+            key = known.get(name)
+            if key is None:
+                key = self._parse(name)
+            if key is not None:
+                packed[name] = key
+        return packed
+
+    def _read_loose(self) -> Dict[str, int]:
+        tags_dir = os.path.join(self.git_dir, TAGS_DIR)
+        known = self._loose
+        loose = {}
+        self._loose_dirs = {}
+        for dirpath, _, filenames in os.walk(tags_dir):
+            self._loose_dirs[os.path.relpath(dirpath, self.git_dir)] = os.stat(dirpath).st_mtime_ns
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), tags_dir).replace(os.sep, '/')
+                key = known.get(name)
+                if key is None:
+                    key = self._parse(name)
+                if key is not None:
+                    loose[name] = key
+        profiling.count(profiling.FILES_VISITED, len(loose))
+        return loose
+
+    def add(self, version: Version) -> str:
+        """
+        Record a tag that was just created for the given version, without re-reading the repository's refs.
+
+        :param Version version:
+            the version that was tagged
+        :return:
+            the tag's name
+        """
+        name = self.tag_name(version)
+        key = self._parse(name)
+        if key is None:
+            raise ValueError(f'cannot index the tag {name}')
+        self._loose[name] = key
+        position = self._upper(version)
+        self._names.insert(position, name)
+        self._keys.insert(position, key)
+        # the recorded mtimes are left alone, so the next run re-lists (but does not re-parse) the loose tags, in case
+        # another one was made at the same time
+        self._dirty = True
+        return name
+
+    def _lower(self, version: Version) -> int:
+        """The position of the first tag whose version is not lower than the given one."""
+        key = pack(*version.core, version.prerelease is None)
+        position = bisect.bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key \
+                and self._version(position).precedence() < version.precedence():
+            position += 1
+        return position
+
+    def _upper(self, version: Version) -> int:
+        """The position just past the last tag whose version is not higher than the given one."""
+        key = pack(*version.core, version.prerelease is None)
+        position = bisect.bisect_right(self._keys, key)
+        while position > 0 and self._keys[position - 1] == key \
+                and self._version(position - 1).precedence() > version.precedence():
+            position -= 1
+        return position
+
+    def latest(self, line: Tuple[int, ...] = (), include_prerelease: bool = False) -> Optional[Version]:
+        """
+        Find the highest tagged version, optionally within a release line.
+
+        :param line:
+            [Opt] the major (e.g. `(2,)` for 2.x) or major and minor (e.g. `(2, 3)` for 2.3.x) of the line
+        :param bool include_prerelease:
+            [Opt] whether a pre-release may be the highest version
+        :return:
+            the highest version, or `None` if there is none
+        """
+        if line:
+            bound = Version(*(line[:-1] + (line[-1] + 1,) + (0, 0, 0)[len(line):]), '0')
+            position = self._lower(bound)
+        else:
+            position = len(self._keys)
+        while position > 0:
+            position -= 1
+            key = self._keys[position]
+            if not include_prerelease and not key & 1:
+                continue
+            version = self._version(position)
+            if version.core[:len(line)] != tuple(line):
+                return None
+            return version
+        return None
+
+    def next_free(self, version: Version, version_func: Callable[[Version], Version]) -> Version:
+        """
+        Bump a version until it reaches one that is not tagged yet.
+
+        :param Version version:
+            the version to bump, e.g. the highest tagged version
+        :param version_func:
+            which part of the version to bump, e.g. :py:meth:`~version_increment.tools.types_.Version.patch`
+        :return:
+            the first bumped version without a tag
+        """
+        bumped = version_func(version)
+        while bumped in self:
+            bumped = version_func(bumped)
+        return bumped
+
+
+def parse_line(line: str) -> Tuple[int, ...]:
+    """
+    Parse a release line, e.g. `2` or `2.3`.
+
+    :param str line:
+        the release line
+    :return:
+        its major, or major and minor
+    """
+    parts = line.lstrip('v').split('.')
+    if not 1 <= len(parts) <= 2 or not all(part.isdigit() for part in parts):
+        raise ValueError(f'not a release line (e.g. "2" or "2.3"): "{line}"')
+    return tuple(int(part) for part in parts)
+
+
+def tag_version_func(index: TagIndex, version_func: Callable[[Version], Version], from_tag: bool = False,
+                     line: Tuple[int, ...] = ()) -> Callable[[Version], Version]:
+    """
+    Wrap a bump so that it checks (and, optionally, starts from) the repository's version tags.
+
+    :param TagIndex index:
+        the repository's tags
+    :param version_func:
+        which part of the version to bump, e.g. :py:meth:`~version_increment.tools.types_.Version.patch`
+    :param bool from_tag:
+        [Opt] whether to bump the highest tagged release (of the given line) to the next version that is not tagged,
+        instead of bumping the version in the config file
+    :param line:
+        [Opt] the release line to take the highest tag from, e.g. `(2,)`
+    :return:
+        the wrapped bump, which raises a `ValueError` rather than return a version that is already tagged
+    """
+    def bump(current: Version) -> Version:
+        if from_tag:
+            latest = index.latest(line)
+            if latest is None:
+                LOGGER.warning(f'no release tags{" in line " + ".".join(map(str, line)) if line else ""}; '
+                               f'bumping {current} from the config file instead')
+                latest = current
+            else:
+                LOGGER.debug(f'highest release tag is {index.tag_name(latest)}')
+            return index.next_free(latest, version_func)
+        bumped = version_func(current)
+        if bumped in index:
+            raise ValueError(f'{index.tag_name(bumped)} is already tagged')
+        return bumped
+
+    return bump
+
+
+def create_tag(dirpath: str, index: TagIndex, version: Version, commit: str) -> str:
+    """
+    Make a lightweight tag of a version, failing if the tag already exists, and record it in the index.
+
+    :param str dirpath:
+        the directory of the repository
+    :param TagIndex index:
+        the repository's tags
+    :param Version version:
+        the version to tag
+    :param str commit:
+        the id of the commit to tag
+    :return:
+        the tag's name
+    """
+    name = index.tag_name(version)
+    plumbing.update_ref(dirpath, f'refs/tags/{name}', commit, None, f'git-ver: tag {version}')
+    index.add(version)
+    index.save()
+    return name
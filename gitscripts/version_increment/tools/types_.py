@@ -1,144 +1,212 @@
 """Types used to accomplish the functionality of the version-increment scripts."""
 
 import logging
-from dataclasses import dataclass
-
-from tools.str_utils import safe_strip
+import re
+from typing import Optional, Tuple, Union
 
 LOGGER = logging.getLogger(__name__)
-VERSION_PATTERN = 'x.y.za'
-
 
-@dataclass
-class Alpha:
-    """
-    A dataclass wrapping the data and functionality of the "alpha" portion of a version number (e.g. "-alpha1").
+# a semantic version (https://semver.org), optionally quoted and/or prefixed with "v", with its pre-release and build
+# metadata captured whole; leading zeroes are tolerated so that existing configs can still be bumped
+VERSION_REGEX = re.compile(
+    r'\s*["\']?v?(\d+)\.(\d+)\.(\d+)'
+    r'(?:-([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?'
+    r'(?:\+([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?'
+    r'["\']?\s*'
+)
+ALPHA_PREFIX = 'alpha'
+# the parts of a version that can be bumped, each the name of the method of `Version` (and function) that bumps it
+LEVELS = ('major', 'minor', 'patch', 'subpatch', 'alpha', 'unalpha')
 
-    It consists of a version number and a switch representing if it exists or not.
-    """
+_TRAILING_NUMBER = re.compile(r'(\d+)$')
 
-    exists: bool = True
-    version: int = -1
 
-    def __str__(self):
-        """
-        Format the alpha version (if it exists) as `-alpha{version}`
-
-        :return:
-            the formatted string
-        """
-        return f'-alpha{self.version}' if self.exists else ''
-
-    def incr(self):
-        """
-        Increments the version of this "alpha" if it currently exists.
-        """
-        self.version += int(self.exists)
+def prerelease_key(prerelease: Optional[str]) -> Tuple:
+    """
+    Build a key that orders pre-release strings by semantic-versioning precedence: dot-separated identifiers are
+    compared one by one, numerically if they are numeric (which sort before alphanumeric ones) and lexically
+    otherwise, and a version without a pre-release follows every version with one.
 
-    def remv(self):
-        """
-        "Zeroes-out" this alpha object if it already exists
-        :return:
-        """
-        if self.exists:
-            self.exists = False
-            self.version = -1
+    :param str prerelease:
+        the pre-release portion of a version (e.g. `"alpha1"` or `"rc.2"`), or `None` for a release
+    :return:
+        the sort key
+    """
+    if not prerelease:
+        return 1,
+    return 0, tuple((0, int(ident), '') if ident.isdigit() else (1, 0, ident) for ident in prerelease.split('.'))
 
 
-@dataclass
 class Version:
     """
-    Represents a project's semantic-versioning version number (e.g. X.X.X-alphaX)
+    Represents a project's semantic-versioning version number (e.g. X.X.X-alphaX), which cannot be changed once
+    created: bumping a version returns a new one.
     """
 
-    _major: int
-    _minor: int
-    _patch: int
-    _alpha: Alpha
+    __slots__ = ('_major', '_minor', '_patch', '_prerelease', '_build')
+
+    def __init__(self, major: int, minor: int, patch: int, prerelease: str = None, build: str = None):
+        set_ = object.__setattr__
+        set_(self, '_major', major)
+        set_(self, '_minor', minor)
+        set_(self, '_patch', patch)
+        set_(self, '_prerelease', prerelease or None)
+        set_(self, '_build', build or None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    __delattr__ = __setattr__
 
     def __str__(self):
         """
-        Format the Version using the semantic versioning pattern: `{major}.{minor}.{patch}(-alpha{subpatch})?`
+        Format the Version using the semantic versioning pattern: `{major}.{minor}.{patch}(-{prerelease})?(+{build})?`
 
         :return:
             the formatted Version number
         """
-        return VERSION_PATTERN.replace('x', str(self._major))\
-            .replace('y', str(self._minor))\
-            .replace('z', str(self._patch))\
-            .replace('a', str(self._alpha))
+        formatted = f'{self._major}.{self._minor}.{self._patch}'
+        if self._prerelease is not None:
+            formatted += f'-{self._prerelease}'
+        if self._build is not None:
+            formatted += f'+{self._build}'
+        return formatted
+
+    def __repr__(self):
+        return f'{type(self).__name__}({str(self)!r})'
+
+    def __reduce__(self):
+        return type(self), (self._major, self._minor, self._patch, self._prerelease, self._build)
+
+    def __eq__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def __lt__(self, other: 'Version') -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.precedence() < other.precedence()
+
+    def __le__(self, other: 'Version') -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.precedence() <= other.precedence()
+
+    def __gt__(self, other: 'Version') -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.precedence() > other.precedence()
+
+    def __ge__(self, other: 'Version') -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.precedence() >= other.precedence()
+
+    def _fields(self) -> tuple:
+        return self._major, self._minor, self._patch, self._prerelease, self._build
+
+    @property
+    def core(self) -> Tuple[int, int, int]:
+        """The major, minor, and patch portions of this version."""
+        return self._major, self._minor, self._patch
+
+    @property
+    def prerelease(self) -> Optional[str]:
+        """The pre-release portion of this version (e.g. `"alpha1"`), if any."""
+        return self._prerelease
+
+    @property
+    def build(self) -> Optional[str]:
+        """The build metadata of this version, if any."""
+        return self._build
+
+    def precedence(self) -> tuple:
+        """
+        Build a key that orders versions by semantic-versioning precedence (which ignores build metadata).
+
+        :return:
+            the sort key
+        """
+        return self._major, self._minor, self._patch, prerelease_key(self._prerelease)
 
     def major(self) -> 'Version':
         """
         Increments this version's major portion and zeroes out lower portions.
 
         :return:
-            this version object
+            the bumped version
         """
-        self._major += 1
-        self._minor = 0
-        self._patch = 0
-        self._alpha.remv()
-        return self
+        return Version(self._major + 1, 0, 0)
 
     def minor(self) -> 'Version':
         """
         Increments this version's minor portion and zeroes out lower portions.
 
         :return:
-            this version object
+            the bumped version
         """
-        self._minor += 1
-        self._patch = 0
-        self._alpha.remv()
-        return self
+        return Version(self._major, self._minor + 1, 0)
 
     def patch(self) -> 'Version':
         """
         Increments this version's patch portion and zeroes out lower portions.
 
         :return:
-            this version object
+            the bumped version
         """
-        self._patch += 1
-        self._alpha.remv()
-        return self
+        return Version(self._major, self._minor, self._patch + 1)
 
     def subpatch(self) -> 'Version':
         """
-        Increments this version's subpatch portion and zeroes out lower portions.
+        Increments this version's pre-release: a release gets a first alpha (`-alpha0`), a pre-release ending in a
+        number has that number incremented (`-alpha1` to `-alpha2`, `-rc.1` to `-rc.2`), and any other
+        pre-release has `.1` appended.
 
         :return:
-            this version object
+            the bumped version
         """
-        self._alpha.incr()
-        return self
+        if self._prerelease is None:
+            prerelease = f'{ALPHA_PREFIX}0'
+        else:
+            match = _TRAILING_NUMBER.search(self._prerelease)
+            if match is None:
+                prerelease = f'{self._prerelease}.1'
+            else:
+                prerelease = f'{self._prerelease[:match.start()]}{int(match.group(1)) + 1}'
+        return Version(self._major, self._minor, self._patch, prerelease)
 
     alpha = subpatch
 
     def unalpha(self) -> 'Version':
         """
-        Removes the alpha from this version
+        Removes the pre-release (and any build metadata) from this version
 
         :return:
-            this version object
+            the released version
         """
-        self._alpha.remv()
-        return self
+        return Version(self._major, self._minor, self._patch)
 
     @classmethod
-    def from_str(cls, version: str) -> 'Version':
-        prepped_major, prepped_minor, patch_raw = version.replace('"', '').split('.')
-        alpha_raw = None
-        patch_split = patch_raw.split('-')
-        if len(patch_split) == 2 and 'alpha' in patch_raw:
-            prepped_patch, alpha_raw = patch_split
-            prepped_alpha = alpha_raw.replace('alpha', '')
-        else:
-            prepped_patch = patch_raw
-            prepped_alpha = alpha_raw
-        return Version.instance(safe_strip(prepped_major), safe_strip(prepped_minor),
-                                safe_strip(prepped_patch), safe_strip(prepped_alpha))
+    def from_str(cls, version: Union[str, bytes]) -> 'Version':
+        """
+        Parse a semantic version, such as `1.2.3`, `"1.2.3-alpha1"`, or `v1.2.3-rc.1+build.5`.
+
+        :param version:
+            the version string (or bytes), optionally quoted and surrounded by whitespace
+        :return:
+            the parsed version
+        """
+        if isinstance(version, bytes):
+            version = version.decode()
+        match = VERSION_REGEX.fullmatch(version)
+        if match is None:
+            raise ValueError(f'not a semantic version: {version!r}')
+        major_, minor_, patch_, prerelease, build = match.groups()
+        return cls(int(major_), int(minor_), int(patch_), prerelease, build)
 
     @classmethod
     def instance(cls, major: str = None, minor: str = None, patch: str = None, alpha: str = None):
@@ -152,14 +220,8 @@ class Version:
         :return:
             a new Version object
         """
-        s_major = int(major) or 0
-        s_minor = int(minor) or 0
-        s_patch = int(patch) or 0
-        if alpha is None:
-            s_subpatch = Alpha()
-        else:
-            s_subpatch = alpha
-        return Version(s_major, s_minor, s_patch, s_subpatch)
+        prerelease = None if alpha is None else f'{ALPHA_PREFIX}{alpha}'
+        return Version(int(major or 0), int(minor or 0), int(patch or 0), prerelease)
 
 
 ####
@@ -181,36 +243,36 @@ def major(version: Version) -> Version:
 
 def minor(version: Version) -> Version:
     """
-    Increases the major portion of this version number.
+    Increases the minor portion of this version number.
 
     :param Version version:
-        the version whose major portion should be bumped
+        the version whose minor portion should be bumped
     :return:
-        the version after bumping its major portion
+        the version after bumping its minor portion
     """
     return version.minor()
 
 
 def patch(version: Version) -> Version:
     """
-    Increases the major portion of this version number.
+    Increases the patch portion of this version number.
 
     :param Version version:
-        the version whose major portion should be bumped
+        the version whose patch portion should be bumped
     :return:
-        the version after bumping its major portion
+        the version after bumping its patch portion
     """
     return version.patch()
 
 
 def subpatch(version: Version) -> Version:
     """
-    Increases the major portion of this version number.
+    Increases the subpatch (pre-release) portion of this version number.
 
     :param Version version:
-        the version whose major portion should be bumped
+        the version whose subpatch portion should be bumped
     :return:
-        the version after bumping its major portion
+        the version after bumping its subpatch portion
     """
     return version.subpatch()
 
@@ -220,11 +282,11 @@ alpha = subpatch
 
 def unalpha(version: Version) -> Version:
     """
-    Increases the major portion of this version number.
+    Removes the alpha (pre-release) portion of this version number.
 
     :param Version version:
-        the version whose major portion should be bumped
+        the version whose alpha portion should be removed
     :return:
-        the version after bumping its major portion
+        the version without its alpha portion
     """
     return version.unalpha()
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# the scripts import their modules relative to the directory that they are in
+for dirname in ('gitscripts', 'benchmarks'):
+    path = os.path.normpath(os.path.join(ROOT, dirname))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def git(cwd: str, *args: str) -> str:
+    return subprocess.run(['git'] + list(args), cwd=cwd, check=True, stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout
+
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    """An empty repository with an author, unaffected by the user's own git config."""
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('GIT_CONFIG_NOSYSTEM', '1')
+    for name in ('GIT_DIR', 'GIT_INDEX_FILE', 'GIT_WORK_TREE', 'GIT_VER_SKIP_HOOK'):
+        monkeypatch.delenv(name, raising=False)
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    git(str(repo), 'init', '-q', '-b', 'dev')
+    git(str(repo), 'config', 'user.name', 'Test')
+    git(str(repo), 'config', 'user.email', 'test@example.com')
+    return repo
@@ -0,0 +1,31 @@
+import pytest
+
+from version_increment.tools.batch import BatchEntry, do_batch_bump, load_manifest
+
+
+def test_load_manifest(tmp_path):
+    manifest = tmp_path / 'projects.txt'
+    manifest.write_text('# every crate\ncrates/a\ncrates/b node\n\ntools python minor  # the CLI\nweb node auto\n')
+    assert load_manifest(str(manifest), 'rust', 'patch') == [
+        BatchEntry(str(tmp_path / 'crates' / 'a'), 'rust', 'patch'),
+        BatchEntry(str(tmp_path / 'crates' / 'b'), 'node', 'patch'),
+        BatchEntry(str(tmp_path / 'tools'), 'python', 'minor'),
+        BatchEntry(str(tmp_path / 'web'), 'node', 'auto'),
+    ]
+
+
+@pytest.mark.parametrize('line, message', [
+    ('crates/a rust pacth', 'projects.txt:2: not a version part to bump'),
+    ('crates/a', 'projects.txt:2: no project type'),
+])
+def test_load_manifest_errors(tmp_path, line, message):
+    manifest = tmp_path / 'projects.txt'
+    manifest.write_text(f'crates/b rust patch\n{line}\n')
+    with pytest.raises(ValueError, match=message):
+        load_manifest(str(manifest))
+
+
+def test_do_batch_bump_rejects_a_bad_level(tmp_path):
+    (tmp_path / 'Cargo.toml').write_text('[package]\nname = "a"\nversion = "1.2.3"\n')
+    with pytest.raises(ValueError, match='not a version part to bump'):
+        do_batch_bump([BatchEntry(str(tmp_path), 'rust', 'auto')], str(tmp_path), use_cache=False)
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from version_increment.tools import bulk
+from version_increment.tools.bulk import pack, parse_many
+from version_increment.tools.types_ import Version
+
+PRERELEASES = [None, None, None, 'alpha', 'alpha0', 'alpha1', 'alpha10', 'alpha.1', 'beta', 'rc.1', 'rc.2', 'rc.10']
+
+
+def random_versions(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    strings = []
+    for _ in range(count):
+        string = f'{rng.randrange(3)}.{rng.randrange(3)}.{rng.randrange(3)}'
+        prerelease = rng.choice(PRERELEASES)
+        if prerelease is not None:
+            string += f'-{prerelease}'
+        if rng.random() < 0.1:
+            string += '+build.1'
+        strings.append(string)
+    return strings
+
+
+def precedences(strings):
+    return [Version.from_str(string).precedence() for string in strings]
+
+
+def test_pack_orders_like_version():
+    cores = [(0, 0, 0), (0, 0, 1), (0, 1, 0), (1, 0, 0), (1, 0, 1), ((1 << bulk.MAJOR_BITS) - 1, 0, 0),
+             (0, (1 << bulk.MINOR_BITS) - 1, 0), (0, 0, (1 << bulk.PATCH_BITS) - 1)]
+    versions = [Version(*core, prerelease) for core in cores for prerelease in (None, 'alpha0')]
+    by_key = sorted(versions, key=lambda version: pack(*version.core, version.prerelease is None))
+    assert [version.precedence() for version in by_key] == sorted(version.precedence() for version in versions)
+    assert max(pack(*version.core, True) for version in versions) < 1 << 63
+
+
+def test_pack_overflow():
+    assert pack(1 << bulk.MAJOR_BITS, 0, 0, True) is None
+    assert pack(0, 1 << bulk.MINOR_BITS, 0, True) is None
+    assert pack(0, 0, 1 << bulk.PATCH_BITS, False) is None
+
+
+@pytest.mark.parametrize('numpy_threshold', [bulk.NUMPY_THRESHOLD, 0])
+def test_sorted_matches_version_order(monkeypatch, numpy_threshold):
+    monkeypatch.setattr(bulk, 'NUMPY_THRESHOLD', numpy_threshold)
+    strings = random_versions(500)
+    table = parse_many(strings)
+    assert len(table) == len(strings)
+    assert precedences(table.sorted()) == sorted(precedences(strings))
+    assert precedences(table.sorted(reverse=True)) == sorted(precedences(strings), reverse=True)
+    assert Version.from_str(table.max()).precedence() == max(precedences(strings))
+
+
+@pytest.mark.parametrize('numpy_threshold', [bulk.NUMPY_THRESHOLD, 0])
+@pytest.mark.parametrize('lower, upper', [
+    (None, None), ('1.0.0', None), (None, '1.0.0'), ('0.1.0-alpha1', '1.1.0-rc.2'), ('1.1.1', '1.1.1-rc.1'),
+    ('1.1.1-alpha', '1.1.1'),
+])
+def test_between_matches_version_order(monkeypatch, numpy_threshold, lower, upper):
+    monkeypatch.setattr(bulk, 'NUMPY_THRESHOLD', numpy_threshold)
+    strings = random_versions(500, seed=1)
+    lower_key = Version.from_str(lower).precedence() if lower else None
+    upper_key = Version.from_str(upper).precedence() if upper else None
+    expected = [string for string, key in zip(strings, precedences(strings))
+                if (lower_key is None or key >= lower_key) and (upper_key is None or key < upper_key)]
+    assert list(parse_many(strings).between(lower, upper)) == expected
+
+
+def test_parse_many_prefix_and_strict():
+    table = parse_many(['v1.0.0', 'v1.0.0-rc.1', 'release', '1.2.0', 'v2.0.0'], prefix='v')
+    assert list(table) == ['v1.0.0', 'v1.0.0-rc.1', 'v2.0.0']
+    assert list(table.sorted()) == ['v1.0.0-rc.1', 'v1.0.0', 'v2.0.0']
+    assert table.version(1) == Version(1, 0, 0, 'rc.1')
+    with pytest.raises(ValueError):
+        parse_many(['1.0.0', 'nope'], strict=True)
+
+
+def test_parse_many_skips_unpackable():
+    table = parse_many([f'{1 << bulk.MAJOR_BITS}.0.0', '1.0.0'])
+    assert list(table) == ['1.0.0']
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from version_increment.tools import cache as cache_module
+from version_increment.tools.cache import ConfigCache
+from version_increment.tools.parsing import ConfigLocation
+from version_increment.tools.types_ import Version
+
+CARGO_TOML = b'[package]\nname = "a"\nversion = "1.2.3"\n'
+LOCATION = ConfigLocation(2, 20, 31, 36, Version(1, 2, 3))
+
+
+@pytest.fixture
+def project(tmp_path):
+    config_path = tmp_path / 'crates' / 'a' / 'Cargo.toml'
+    config_path.parent.mkdir(parents=True)
+    config_path.write_bytes(CARGO_TOML)
+    return tmp_path
+
+
+def stored(project) -> ConfigCache:
+    cache = ConfigCache(str(project / 'cache' / 'configs.json'))
+    cache.store(str(project), 'Cargo.toml', str(project / 'crates' / 'a' / 'Cargo.toml'), LOCATION)
+    cache.save()
+    return ConfigCache(cache.cache_path)
+
+
+def test_hit(project):
+    cache = stored(project)
+    assert cache.lookup(str(project), 'Cargo.toml') == (str(project / 'crates' / 'a' / 'Cargo.toml'), LOCATION)
+    assert cache.lookup(str(project / 'crates'), 'Cargo.toml') is None
+
+
+def test_hit_does_not_rewrite(project):
+    cache = stored(project)
+    stat = os.stat(cache.cache_path)
+    os.utime(cache.cache_path, ns=(0, 0))
+    assert cache.lookup(str(project), 'Cargo.toml') is not None
+    cache.save()
+    assert os.stat(cache.cache_path).st_mtime_ns == 0
+    assert os.stat(cache.cache_path).st_ino == stat.st_ino
+
+
+def test_old_hit_is_rewritten(project, monkeypatch):
+    cache = stored(project)
+    now = cache_module.time.time()
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now + cache_module.LAST_USED_RESOLUTION + 1)
+    os.utime(cache.cache_path, ns=(0, 0))
+    assert cache.lookup(str(project), 'Cargo.toml') is not None
+    cache.save()
+    assert os.stat(cache.cache_path).st_mtime_ns != 0
+
+
+def test_changed_config_is_stale(project):
+    cache = stored(project)
+    (project / 'crates' / 'a' / 'Cargo.toml').write_bytes(CARGO_TOML.replace(b'1.2.3', b'1.2.30'))
+    assert cache.lookup(str(project), 'Cargo.toml') is None
+
+
+@pytest.mark.parametrize('shallower', ['Cargo.toml', os.path.join('crates', 'Cargo.toml')])
+def test_shallower_config_is_stale(project, shallower):
+    cache = stored(project)
+    (project / shallower).write_bytes(CARGO_TOML)
+    assert cache.lookup(str(project), 'Cargo.toml') is None
+
+
+def test_bounded(project):
+    cache = ConfigCache(str(project / 'cache' / 'configs.json'), max_entries=2)
+    for name in ('a', 'b', 'c'):
+        cache.store(str(project / name), 'Cargo.toml', str(project / 'crates' / 'a' / 'Cargo.toml'), LOCATION)
+    cache.save()
+    cache = ConfigCache(cache.cache_path)
+    assert cache.lookup(str(project / 'a'), 'Cargo.toml') is None
+    assert cache.lookup(str(project / 'c'), 'Cargo.toml') is not None
+
+
+def test_threads(project):
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = stored(project)
+    config_path = str(project / 'crates' / 'a' / 'Cargo.toml')
+
+    def work(index: int) -> None:
+        cache.store(str(project / str(index)), 'Cargo.toml', config_path, LOCATION)
+        assert cache.lookup(str(project / str(index)), 'Cargo.toml') is not None
+        if index % 10 == 0:
+            cache.save()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(work, range(100)))
+    cache.save()
+    assert len(ConfigCache(cache.cache_path)._entries) == 101
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from tests.conftest import git
+from tools.filesystem import DiscoveryOptions, seek_file
+
+
+@pytest.fixture
+def tree(git_repo):
+    (git_repo / '.gitignore').write_text('gen/\n')
+    for path in ('node_modules/x/y', 'a/b/gen'):
+        (git_repo / path).mkdir(parents=True)
+    # deeper than the levels that auto discovery scans itself, so it is found by git
+    (git_repo / 'a' / 'b' / 'gen' / 'Cargo.toml').write_text('')
+    (git_repo / 'node_modules' / 'x' / 'y' / 'Cargo.toml').write_text('')
+    git(str(git_repo), 'add', '.gitignore')
+    git(str(git_repo), 'commit', '-q', '-m', 'initial')
+    return git_repo
+
+
+@pytest.mark.parametrize('strategy', ['auto', 'scandir', 'git'])
+@pytest.mark.parametrize('follow_gitignore', [False, True])
+def test_strategies_agree(tree, strategy, follow_gitignore):
+    found = seek_file('Cargo.toml', str(tree), options=DiscoveryOptions(strategy=strategy,
+                                                                        follow_gitignore=follow_gitignore))
+    assert found == (None if follow_gitignore else os.path.join(str(tree), 'a', 'b', 'gen', 'Cargo.toml'))
+
+
+def test_shallowest_wins(tree):
+    (tree / 'a' / 'c').mkdir()
+    (tree / 'a' / 'c' / 'Cargo.toml').write_text('')
+    assert seek_file('Cargo.toml', str(tree)) == os.path.join(str(tree), 'a', 'c', 'Cargo.toml')
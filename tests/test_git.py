@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from tests.conftest import git
+from tools.git import do_git_commit
+from tools.plumbing import HookRejectedError
+
+
+@pytest.fixture
+def repo(git_repo):
+    (git_repo / 'a.txt').write_text('a\n')
+    git(str(git_repo), 'add', '-A')
+    git(str(git_repo), 'commit', '-q', '-m', 'initial')
+    (git_repo / 'a.txt').write_text('b\n')
+    return git_repo
+
+
+def install(repo, name: str, script: str) -> None:
+    hooks_dir = repo / '.git' / 'hooks'
+    hooks_dir.mkdir(exist_ok=True)
+    path = hooks_dir / name
+    path.write_text('#!/bin/sh\n' + script)
+    os.chmod(str(path), 0o755)
+
+
+def commits(repo) -> int:
+    return int(git(str(repo), 'rev-list', '--count', 'HEAD'))
+
+
+@pytest.mark.parametrize('backend', ['plumbing', 'gitpython'])
+def test_hooks_run(repo, backend):
+    install(repo, 'pre-commit', 'echo "pre-commit $GIT_VER_SKIP_HOOK" >> "$(git rev-parse --git-dir)/ran"\n')
+    install(repo, 'commit-msg', 'echo "Signed-off-by: Test" >> "$1"\n')
+    install(repo, 'post-commit', 'echo post-commit >> "$(git rev-parse --git-dir)/ran"\n')
+    do_git_commit('Bump\n', str(repo), backend)
+
+    assert commits(repo) == 2
+    assert git(str(repo), 'log', '-1', '--format=%B').strip() == 'Bump\nSigned-off-by: Test'
+    assert (repo / '.git' / 'ran').read_text() == 'pre-commit 1\npost-commit\n'
+    assert not (repo / '.git' / 'COMMIT_EDITMSG').exists() or backend == 'gitpython'
+
+
+@pytest.mark.parametrize('backend', ['plumbing', 'gitpython'])
+@pytest.mark.parametrize('name', ['pre-commit', 'commit-msg'])
+def test_hook_rejects_commit(repo, backend, name):
+    install(repo, name, 'echo "not today"\nexit 1\n')
+    (repo / 'a.txt').write_text('staged\n')
+    git(str(repo), 'add', 'a.txt')
+    (repo / 'a.txt').write_text('b\n')
+    with pytest.raises(HookRejectedError, match='not today'):
+        do_git_commit('Bump', str(repo), backend)
+    assert commits(repo) == 1
+    # the index is left as it was found
+    assert git(str(repo), 'show', ':a.txt') == 'staged\n'
+
+
+def test_failing_post_commit_hook(repo):
+    install(repo, 'post-commit', 'exit 1\n')
+    do_git_commit('Bump', str(repo))
+    assert commits(repo) == 2
+
+
+def test_hooks_path(repo, tmp_path):
+    hooks_dir = tmp_path / 'hooks'
+    hooks_dir.mkdir()
+    (hooks_dir / 'pre-commit').write_text('#!/bin/sh\nexit 1\n')
+    os.chmod(str(hooks_dir / 'pre-commit'), 0o755)
+    git(str(repo), 'config', 'core.hooksPath', str(hooks_dir))
+    with pytest.raises(HookRejectedError):
+        do_git_commit('Bump', str(repo))
+    assert commits(repo) == 1
+
+
+def test_hooks_without_git_hook_run(repo, monkeypatch):
+    from tools import plumbing
+
+    # git before 2.36 has no `git hook run`, so the hook is run directly
+    monkeypatch.setattr(plumbing, 'git_version', lambda: (2, 35))
+    install(repo, 'commit-msg', 'echo "Signed-off-by: Test" >> "$1"\n')
+    install(repo, 'pre-commit', 'echo "not today"\nexit 1\n')
+    with pytest.raises(HookRejectedError, match='not today'):
+        do_git_commit('Bump\n', str(repo))
+    os.remove(str(repo / '.git' / 'hooks' / 'pre-commit'))
+    do_git_commit('Bump\n', str(repo))
+    assert git(str(repo), 'log', '-1', '--format=%B').strip() == 'Bump\nSigned-off-by: Test'
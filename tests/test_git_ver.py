@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.conftest import ROOT, git
+
+GIT_VER = os.path.join(ROOT, 'gitscripts', 'git_ver.py')
+CARGO_TOML = '[package]\nname = "a"\nversion = "1.2.3"\n'
+
+
+@pytest.fixture
+def crate(git_repo):
+    (git_repo / 'Cargo.toml').write_text(CARGO_TOML)
+    git(str(git_repo), 'add', '-A')
+    git(str(git_repo), 'commit', '-q', '-m', 'initial')
+    return git_repo
+
+
+def git_ver(cwd, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, GIT_VER] + list(args), cwd=str(cwd), stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+def test_bump(crate):
+    result = git_ver(crate, 'rust', 'patch', '--tag')
+    assert result.returncode == 0, result.stdout
+    assert 'version = "1.2.4"' in (crate / 'Cargo.toml').read_text()
+    assert git(str(crate), 'tag', '-l') == 'v1.2.4\n'
+
+
+@pytest.mark.parametrize('args, error', [
+    (['rust', 'patch', '--tag'], 'v1.2.4 is already tagged'),
+    (['node', 'patch'], 'Could not find a file named "package.json"'),
+    (['rust', 'patch', '--sync', 'README.md'], 'README.md'),
+])
+def test_failed_bump(crate, args, error):
+    git(str(crate), 'tag', 'v1.2.4')
+    result = git_ver(crate, *args)
+    assert result.returncode == 1
+    assert result.stdout.endswith('Quitting...\n')
+    assert error in result.stdout
+    assert (crate / 'Cargo.toml').read_text() == CARGO_TOML
+    assert git(str(crate), 'status', '--porcelain') == ''
+    assert git(str(crate), 'rev-list', '--count', 'HEAD') == '1\n'
+
+
+def test_rejected_by_a_hook(crate):
+    hook_path = crate / '.git' / 'hooks' / 'pre-commit'
+    hook_path.parent.mkdir(exist_ok=True)
+    hook_path.write_text('#!/bin/sh\necho "no bumps on Fridays"\nexit 1\n')
+    os.chmod(str(hook_path), 0o755)
+    result = git_ver(crate, 'rust', 'patch')
+    assert result.returncode == 1
+    assert 'no bumps on Fridays' in result.stdout
+    assert (crate / 'Cargo.toml').read_text() == CARGO_TOML
+    assert git(str(crate), 'status', '--porcelain') == ''
+
+
+def test_bare_bump(crate, tmp_path):
+    bare = tmp_path / 'bare.git'
+    git(str(tmp_path), 'clone', '-q', '--bare', str(crate), str(bare))
+    git(str(bare), 'config', 'user.name', 'Test')
+    git(str(bare), 'config', 'user.email', 'test@example.com')
+    result = git_ver(bare, 'rust', 'patch', '--bare')
+    assert result.returncode == 0, result.stdout
+    assert 'version = "1.2.4"' in git(str(bare), 'show', 'HEAD:Cargo.toml')
+
+
+def test_bare_bump_without_an_author(crate, tmp_path):
+    bare = tmp_path / 'bare.git'
+    git(str(tmp_path), 'clone', '-q', '--bare', str(crate), str(bare))
+    objects = git(str(bare), 'count-objects', '-v')
+    result = git_ver(bare, 'rust', 'patch', '--bare')
+    assert result.returncode == 1
+    assert result.stdout.endswith('Quitting...\n')
+    assert git(str(bare), 'count-objects', '-v') == objects
+
+
+def test_fleet(crate, tmp_path):
+    empty = tmp_path / 'empty'
+    empty.mkdir()
+    git(str(empty), 'init', '-q')
+    manifest = tmp_path / 'fleet.txt'
+    manifest.write_text(f'{crate} rust\n{empty} node\n')
+    result = git_ver(tmp_path, 'rust', 'patch', '--fleet', str(manifest))
+    assert result.returncode == 1
+    assert '"status": "ok"' in result.stdout
+    # a repository without a config file fails its bump, which the fleet must not take for a bump
+    assert '"status": "failed"' in result.stdout
+    assert 'version = "1.2.4"' in (crate / 'Cargo.toml').read_text()
+
+
+def test_fleet_bad_manifest(tmp_path):
+    manifest = tmp_path / 'fleet.txt'
+    manifest.write_text('repo rust pacth\n')
+    result = git_ver(tmp_path, 'rust', 'patch', '--fleet', str(manifest))
+    assert result.returncode == 1
+    assert result.stdout == f'{manifest}:1: not a version part to bump (major, minor, patch, subpatch, alpha, ' \
+                            f'unalpha, or auto): "pacth"\nQuitting...\n'
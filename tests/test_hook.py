@@ -0,0 +1,225 @@
+import os
+
+import pytest
+
+import git_ver_hook
+from tests.conftest import git
+from tools.plumbing import SKIP_HOOK_ENV
+from version_increment.tools import hook
+from version_increment.tools.types_ import Version
+
+CARGO_TOML = '[package]\nname = "a"\nversion = "1.2.3"\n'
+
+
+@pytest.fixture
+def crate(git_repo):
+    (git_repo / 'Cargo.toml').write_text(CARGO_TOML)
+    (git_repo / 'lib.rs').write_text('fn main() {}\n')
+    git(str(git_repo), 'add', '-A')
+    git(str(git_repo), 'commit', '-q', '-m', 'initial')
+    return git_repo
+
+
+def staged(repo) -> list:
+    return git(str(repo), 'diff', '--cached', '--name-only').split()
+
+
+def pending_message(repo):
+    path = repo / '.git' / hook.PENDING_FILENAME
+    return path.read_text() if path.exists() else None
+
+
+def pre_commit(repo, level: str = 'patch'):
+    return hook.pre_commit('rust', level, str(repo), use_cache=False)
+
+
+def test_pre_commit_bumps_and_stages_only_the_config(crate):
+    (crate / 'lib.rs').write_text('fn main() { loop {} }\n')
+    (crate / 'notes.txt').write_text('not staged\n')
+    git(str(crate), 'add', 'lib.rs')
+
+    assert pre_commit(crate) == Version(1, 2, 4)
+    assert 'version = "1.2.4"' in (crate / 'Cargo.toml').read_text()
+    assert staged(crate) == ['Cargo.toml', 'lib.rs']
+    assert git(str(crate), 'status', '--porcelain', '--', 'Cargo.toml') == 'M  Cargo.toml\n'
+    assert pending_message(crate) == 'Version incremented to 1.2.4'
+
+
+def test_pre_commit_skips_an_empty_index(crate):
+    (crate / 'lib.rs').write_text('fn main() { loop {} }\n')
+    assert pre_commit(crate) is None
+    assert (crate / 'Cargo.toml').read_text() == CARGO_TOML
+    assert pending_message(crate) is None
+
+
+def test_pre_commit_keeps_a_bump_already_in_the_index(crate):
+    (crate / 'lib.rs').write_text('fn main() { loop {} }\n')
+    git(str(crate), 'add', 'lib.rs')
+    assert pre_commit(crate) == Version(1, 2, 4)
+    os.remove(str(crate / '.git' / hook.PENDING_FILENAME))
+
+    # e.g. the commit failed after the hook ran, and is being retried
+    assert pre_commit(crate) is None
+    assert 'version = "1.2.4"' in (crate / 'Cargo.toml').read_text()
+    assert pending_message(crate) == 'Version incremented to 1.2.4'
+
+
+def test_pre_commit_keeps_a_bump_staged_by_hand(crate):
+    (crate / 'Cargo.toml').write_text(CARGO_TOML.replace('1.2.3', '2.0.0'))
+    git(str(crate), 'add', 'Cargo.toml')
+    assert pre_commit(crate) is None
+    assert pending_message(crate) == 'Version incremented to 2.0.0'
+
+
+def test_pre_commit_bumps_a_config_staged_with_other_changes(crate):
+    (crate / 'Cargo.toml').write_text(CARGO_TOML + '\n[dependencies]\n')
+    git(str(crate), 'add', 'Cargo.toml')
+    assert pre_commit(crate, 'minor') == Version(1, 3, 0)
+    assert git(str(crate), 'status', '--porcelain', '--', 'Cargo.toml') == 'M  Cargo.toml\n'
+
+
+def test_pre_commit_refuses_unstaged_config_changes(crate):
+    (crate / 'lib.rs').write_text('fn main() { loop {} }\n')
+    git(str(crate), 'add', 'lib.rs')
+    (crate / 'Cargo.toml').write_text(CARGO_TOML + '\n[dependencies]\n')
+    with pytest.raises(ValueError, match='unstaged changes'):
+        pre_commit(crate)
+    assert staged(crate) == ['lib.rs']
+
+
+def test_pre_commit_skips_a_new_config(git_repo):
+    (git_repo / 'README').write_text('readme\n')
+    git(str(git_repo), 'add', 'README')
+    git(str(git_repo), 'commit', '-q', '-m', 'initial')
+    (git_repo / 'Cargo.toml').write_text(CARGO_TOML)
+    git(str(git_repo), 'add', 'Cargo.toml')
+    assert pre_commit(git_repo) is None
+    assert (git_repo / 'Cargo.toml').read_text() == CARGO_TOML
+
+
+def test_pre_commit_skipped_by_env(crate, monkeypatch):
+    (crate / 'lib.rs').write_text('fn main() { loop {} }\n')
+    git(str(crate), 'add', 'lib.rs')
+    monkeypatch.setenv(SKIP_HOOK_ENV, '1')
+    assert pre_commit(crate) is None
+    assert staged(crate) == ['lib.rs']
+
+
+def test_pre_commit_rejects_a_bad_level(crate):
+    with pytest.raises(ValueError):
+        pre_commit(crate, 'auto')
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('Fix the thing\n\n# Please enter the commit message\n# Lines starting with # are ignored\n',
+     'Fix the thing\n\nVersion incremented to 1.2.4\n\n# Please enter the commit message\n'
+     '# Lines starting with # are ignored\n'),
+    ('Fix the thing\n\nMore about it.\n', 'Fix the thing\n\nMore about it.\n\nVersion incremented to 1.2.4\n'),
+    # no message yet: the first line is left for the subject
+    ('\n# Please enter the commit message\n',
+     '\n\nVersion incremented to 1.2.4\n\n# Please enter the commit message\n'),
+    ('', '\n\nVersion incremented to 1.2.4\n'),
+])
+def test_prepare_commit_msg(crate, tmp_path, message, expected):
+    (crate / '.git' / hook.PENDING_FILENAME).write_text('Version incremented to 1.2.4')
+    message_path = tmp_path / 'COMMIT_EDITMSG'
+    message_path.write_text(message)
+
+    assert hook.prepare_commit_msg(str(message_path), str(crate))
+    assert message_path.read_text() == expected
+    assert pending_message(crate) is None
+
+
+def test_prepare_commit_msg_without_a_bump(crate, tmp_path):
+    message_path = tmp_path / 'COMMIT_EDITMSG'
+    message_path.write_text('Fix the thing\n')
+    assert not hook.prepare_commit_msg(str(message_path), str(crate))
+    assert message_path.read_text() == 'Fix the thing\n'
+
+
+def test_prepare_commit_msg_keeps_an_existing_line(crate, tmp_path):
+    (crate / '.git' / hook.PENDING_FILENAME).write_text('Version incremented to 1.2.4')
+    message_path = tmp_path / 'COMMIT_EDITMSG'
+    message_path.write_text('Fix the thing\n\nVersion incremented to 1.2.4\n')
+    assert not hook.prepare_commit_msg(str(message_path), str(crate))
+    assert message_path.read_text() == 'Fix the thing\n\nVersion incremented to 1.2.4\n'
+
+
+def test_install_hooks(crate):
+    paths = hook.install_hooks('rust', 'patch', str(crate), '/path/to/git_ver_hook.py')
+    assert paths == [str(crate / '.git' / 'hooks' / name) for name in hook.HOOKS]
+    for path in paths:
+        assert os.access(path, os.X_OK)
+        with open(path, 'r') as fo:
+            assert hook.HOOK_MARKER in fo.read()
+    with open(paths[0], 'r') as fo:
+        assert fo.read().endswith(' pre-commit rust patch -d .\n')
+    # its own hooks are replaced without --force
+    assert hook.install_hooks('rust', 'minor', str(crate), '/path/to/git_ver_hook.py') == paths
+
+
+def test_install_hooks_keeps_other_hooks(crate):
+    hooks_dir = crate / '.git' / 'hooks'
+    hooks_dir.mkdir(exist_ok=True)
+    (hooks_dir / 'pre-commit').write_text('#!/bin/sh\nmake lint\n')
+    with pytest.raises(ValueError, match='--force'):
+        hook.install_hooks('rust', 'patch', str(crate), '/path/to/git_ver_hook.py')
+    assert (hooks_dir / 'pre-commit').read_text() == '#!/bin/sh\nmake lint\n'
+    assert not (hooks_dir / 'prepare-commit-msg').exists()
+
+    hook.install_hooks('rust', 'patch', str(crate), '/path/to/git_ver_hook.py', force=True)
+    assert hook.HOOK_MARKER in (hooks_dir / 'pre-commit').read_text()
+
+
+def test_install_hooks_in_a_subdirectory(crate):
+    (crate / 'crates' / 'core').mkdir(parents=True)
+    paths = hook.install_hooks('rust', 'patch', str(crate / 'crates' / 'core'), '/path/to/git_ver_hook.py')
+    with open(paths[0], 'r') as fo:
+        assert fo.read().endswith(f' -d {os.path.join("crates", "core")}\n')
+
+
+def test_commit_through_the_hooks(crate):
+    assert git_ver_hook.main(['--install-hook', 'rust', 'patch', '-d', str(crate)]) == 0
+    (crate / 'lib.rs').write_text('fn main() { loop {} }\n')
+    git(str(crate), 'add', 'lib.rs')
+    git(str(crate), 'commit', '-q', '-m', 'Loop forever')
+
+    assert git(str(crate), 'log', '-1', '--format=%B').strip() == 'Loop forever\n\nVersion incremented to 1.2.4'
+    assert git(str(crate), 'show', '--name-only', '--format=', 'HEAD').split() == ['Cargo.toml', 'lib.rs']
+    assert git(str(crate), 'status', '--porcelain') == ''
+    assert pending_message(crate) is None
+
+
+def test_amend_through_the_hooks_when_skipped(crate, monkeypatch):
+    assert git_ver_hook.main(['--install-hook', 'rust', 'patch', '-d', str(crate)]) == 0
+    (crate / 'lib.rs').write_text('fn main() { loop {} }\n')
+    git(str(crate), 'commit', '-q', '-am', 'Loop forever')
+
+    monkeypatch.setenv(SKIP_HOOK_ENV, '1')
+    (crate / 'lib.rs').write_text('fn main() { loop { break } }\n')
+    git(str(crate), 'commit', '-q', '-a', '--amend', '--no-edit')
+    assert 'version = "1.2.4"' in (crate / 'Cargo.toml').read_text()
+    assert git(str(crate), 'log', '-1', '--format=%B').strip() == 'Loop forever\n\nVersion incremented to 1.2.4'
+    assert git(str(crate), 'status', '--porcelain') == ''
+
+
+@pytest.mark.parametrize('args, positionals, options', [
+    (['pre-commit', 'rust', 'patch'], ['pre-commit', 'rust', 'patch'],
+     {'dirpath': None, 'force': False, 'use_cache': True}),
+    (['pre-commit', 'rust', 'patch', '-d', 'a b', '--no-cache'], ['pre-commit', 'rust', 'patch'],
+     {'dirpath': 'a b', 'force': False, 'use_cache': False}),
+    (['--install-hook', '--dir=sub', 'node', 'minor', '--force'], ['--install-hook', 'node', 'minor'],
+     {'dirpath': 'sub', 'force': True, 'use_cache': True}),
+    (['prepare-commit-msg', '.git/COMMIT_EDITMSG', 'message'], ['prepare-commit-msg', '.git/COMMIT_EDITMSG', 'message'],
+     {'dirpath': None, 'force': False, 'use_cache': True}),
+])
+def test_split_args(args, positionals, options):
+    assert git_ver_hook.split_args(args) == (positionals, options)
+
+
+@pytest.mark.parametrize('args', [
+    [], ['pre-commit', 'rust'], ['commit-msg', 'x'], ['pre-commit', 'rust', 'patch', '-x'],
+])
+def test_usage_errors(args, capsys):
+    assert git_ver_hook.main(args) == 2
+    assert 'usage:' in capsys.readouterr().err
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import startup_budget
+from tests.conftest import ROOT
+
+# what importing each entry point must not pull in; the heavy modules are imported by the phases that need them
+LAZY = {
+    'git_ver': ('git', 'numpy', 'asyncio', 'concurrent.futures', 'subprocess', 'dataclasses', 'tools.git',
+                'tools.pool', 'version_increment.tools.types_'),
+    'git_ver_hook': ('git', 'numpy', 'asyncio', 'logging', 'argparse', 'subprocess', 'version_increment.tools.cache'),
+}
+
+
+@pytest.mark.parametrize('module', sorted(LAZY))
+def test_import_is_lazy(module):
+    # in a fresh interpreter, since the tests themselves import most of these
+    script = (f'import sys; sys.path.insert(0, {os.path.join(ROOT, "gitscripts")!r}); import {module}; '
+              f'print(" ".join(name for name in {LAZY[module]!r} if name in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', script], check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    assert output.split() == []
+
+
+@pytest.mark.parametrize('scenario', startup_budget.SCENARIOS, ids=lambda scenario: scenario.name)
+def test_startup_imports(scenario):
+    _, _, leaked = startup_budget.check(scenario, runs=1)
+    assert not leaked, f'imported {", ".join(leaked)}'
+
+
+@pytest.mark.skipif(startup_budget.SCALE_ENV not in os.environ,
+                    reason=f'timing budgets are only held when {startup_budget.SCALE_ENV} is set')
+@pytest.mark.parametrize('scenario', startup_budget.SCENARIOS, ids=lambda scenario: scenario.name)
+def test_startup_budget(scenario):
+    best, budget, _ = startup_budget.check(scenario, scale=startup_budget.default_scale())
+    assert best <= budget, f'{best:.1f} ms over the budget of {budget:.1f} ms'
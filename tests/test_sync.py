@@ -0,0 +1,63 @@
+import pytest
+
+from version_increment.tools.sync import SyncTarget, apply_sync, parse_sync_arg, plan_sync
+from version_increment.tools.types_ import Version
+
+OLD = Version(1, 2, 3)
+NEW = Version(1, 2, 4)
+
+
+def sync(tmp_path, text: str, *searches: str) -> str:
+    (tmp_path / 'file.txt').write_text(text)
+    targets = [SyncTarget('file.txt', search) for search in searches] or [SyncTarget('file.txt')]
+    apply_sync(plan_sync(targets, OLD, NEW, str(tmp_path)))
+    return (tmp_path / 'file.txt').read_text()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1.2.3\n', '1.2.4\n'),
+    ('v1.2.3\n', 'v1.2.4\n'),
+    ('pkg-1.2.3\n', 'pkg-1.2.4\n'),
+    ('release.1.2.3\n', 'release.1.2.4\n'),
+    ('Version 1.2.3.\n', 'Version 1.2.4.\n'),
+    ('1.2.3 and 11.2.3, 0.1.2.3, 1.2.30, 1.0.0+1.2.3, 1.2.3-rc.1\n',
+     '1.2.4 and 11.2.3, 0.1.2.3, 1.2.30, 1.0.0+1.2.3, 1.2.3-rc.1\n'),
+])
+def test_bare_version(tmp_path, text, expected):
+    assert sync(tmp_path, text) == expected
+
+
+def test_bare_version_not_found(tmp_path):
+    with pytest.raises(RuntimeWarning, match='not found'):
+        sync(tmp_path, '11.2.3 1.2.30\n')
+
+
+def test_templates(tmp_path):
+    text = "__version__ = '1.2.3'\nrequires = ['dep==1.2.3']\n"
+    assert sync(tmp_path, text, "__version__ = '{version}'") == \
+        "__version__ = '1.2.4'\nrequires = ['dep==1.2.3']\n"
+
+
+@pytest.mark.parametrize('searches', [
+    ('version = "{version}"', '"{version}"'),
+    ('{version}', 'version = "{version}"'),
+    ('name = "a"\nversion = "{version}"', 'version = "{version}"'),
+])
+def test_overlapping_templates(tmp_path, searches):
+    # the longest template wins every match, but the shorter ones are still found inside of it
+    text = 'name = "a"\nversion = "1.2.3"\n'
+    assert sync(tmp_path, text, *searches) == 'name = "a"\nversion = "1.2.4"\n'
+
+
+def test_template_not_found(tmp_path):
+    with pytest.raises(RuntimeWarning, match='"release = {version}"'):
+        sync(tmp_path, 'version = "1.2.3"\n', 'version = "{version}"', 'release = {version}')
+
+
+@pytest.mark.parametrize('arg, target', [
+    ('README.md', SyncTarget('README.md')),
+    ("src/a/__init__.py:__version__ = '{version}'", SyncTarget('src/a/__init__.py', "__version__ = '{version}'")),
+    ('C:\\a\\README.md', SyncTarget('C:\\a\\README.md')),
+])
+def test_parse_sync_arg(arg, target):
+    assert parse_sync_arg(arg) == target
@@ -0,0 +1,189 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from tests.conftest import ROOT, git
+from tools import transaction
+from tools.transaction import EditTransaction, recover
+
+FILES = {
+    'Cargo.toml': b'[package]\r\nname = "a"\r\nversion = "1.2.3"\r\n',
+    'docs/conf.py': b"release = '1.2.3'\n",
+    'empty.txt': b'',
+}
+
+
+@pytest.fixture
+def work_tree(git_repo):
+    for name, data in FILES.items():
+        path = git_repo / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(data)
+    os.chmod(str(git_repo / 'docs' / 'conf.py'), 0o755)
+    git(str(git_repo), 'add', '-A')
+    git(str(git_repo), 'commit', '-q', '-m', 'initial')
+    return git_repo
+
+
+def journal_dir(repo) -> str:
+    return str(repo / '.git' / 'git-ver')
+
+
+def contents(repo) -> dict:
+    return {name: (repo / name).read_bytes() for name in FILES}
+
+
+def leftovers(repo) -> list:
+    return sorted(name for _, _, names in os.walk(str(repo)) for name in names if 'git-ver-backup' in name
+                  or name.startswith(transaction.JOURNAL_PREFIX))
+
+
+def stage_bump(edits: EditTransaction, repo) -> None:
+    edits.patch(str(repo / 'Cargo.toml'), [(34, 39, b'1.3.0-alpha0')])
+    edits.patch(str(repo / 'docs' / 'conf.py'), [(11, 16, b'1.3.0-alpha0')])
+    edits.write(str(repo / 'empty.txt'), b'1.3.0-alpha0\n')
+
+
+def test_apply_and_finish(work_tree):
+    with EditTransaction(journal_dir(work_tree), str(work_tree)) as edits:
+        stage_bump(edits, work_tree)
+    assert contents(work_tree) == {
+        'Cargo.toml': b'[package]\r\nname = "a"\r\nversion = "1.3.0-alpha0"\r\n',
+        'docs/conf.py': b"release = '1.3.0-alpha0'\n",
+        'empty.txt': b'1.3.0-alpha0\n',
+    }
+    assert os.stat(str(work_tree / 'docs' / 'conf.py')).st_mode & 0o777 == 0o755
+    assert leftovers(work_tree) == []
+
+
+def test_apply_in_edit_order(work_tree, monkeypatch):
+    replaced = []
+    replace = os.replace
+
+    def record(src, dst):
+        replaced.append(os.path.relpath(dst, str(work_tree)))
+        replace(src, dst)
+
+    edits = EditTransaction()
+    edits.write(str(work_tree / 'empty.txt'), b'1.3.0\n')
+    stage_bump(edits, work_tree)
+    edits.patch(str(work_tree / 'empty.txt'), [(0, 5, b'1.3.1')])
+    monkeypatch.setattr(os, 'replace', record)
+    edits.apply()
+    assert replaced == ['empty.txt', 'Cargo.toml', os.path.join('docs', 'conf.py')]
+    assert (work_tree / 'empty.txt').read_bytes() == b'1.3.1-alpha0\n'
+
+
+def test_read_sees_staged_edits(work_tree):
+    edits = EditTransaction()
+    edits.patch(str(work_tree / 'docs' / 'conf.py'), [(11, 16, b'1.2.4')])
+    edits.patch(str(work_tree / 'docs' / 'conf.py'), [(0, 7, b'version')])
+    assert edits.read(str(work_tree / 'docs' / 'conf.py')) == b"version = '1.2.4'\n"
+    assert contents(work_tree) == FILES
+
+
+def test_overlapping_spans(work_tree):
+    with pytest.raises(ValueError):
+        EditTransaction().patch(str(work_tree / 'Cargo.toml'), [(0, 5, b'x'), (4, 6, b'y')])
+
+
+@pytest.mark.parametrize('journaled', [True, False])
+def test_rollback_after_failed_commit(work_tree, journaled):
+    # the commit fails after the edits are applied, e.g. for lack of an author
+    with pytest.raises(RuntimeError):
+        with EditTransaction(journal_dir(work_tree) if journaled else None, str(work_tree)) as edits:
+            stage_bump(edits, work_tree)
+            edits.apply()
+            assert contents(work_tree) != FILES
+            raise RuntimeError('commit failed')
+    if journaled:
+        assert contents(work_tree) == FILES
+        assert os.stat(str(work_tree / 'docs' / 'conf.py')).st_mode & 0o777 == 0o755
+    else:
+        # without a journal, the old contents were not kept
+        assert contents(work_tree) != FILES
+    assert leftovers(work_tree) == []
+
+
+@pytest.mark.parametrize('journaled', [True, False])
+def test_rollback_in_place(work_tree, journaled):
+    path = work_tree / 'Cargo.toml'
+    inode = os.stat(str(path)).st_ino
+    with pytest.raises(RuntimeError):
+        with EditTransaction(journal_dir(work_tree) if journaled else None, str(work_tree)) as edits:
+            edits.patch(str(path), [(34, 39, b'1.2.4')])
+            edits.apply()
+            assert path.read_bytes() == b'[package]\r\nname = "a"\r\nversion = "1.2.4"\r\n'
+            raise RuntimeError('commit failed')
+    # patched in place, so the old bytes are kept in memory even without a journal
+    assert contents(work_tree) == FILES
+    assert os.stat(str(path)).st_ino == inode
+    assert leftovers(work_tree) == []
+
+
+def test_rollback_keeps_committed_edits(work_tree):
+    with pytest.raises(RuntimeError):
+        with EditTransaction(journal_dir(work_tree), str(work_tree)) as edits:
+            stage_bump(edits, work_tree)
+            edits.apply()
+            git(str(work_tree), 'commit', '-q', '-am', 'bump')
+            raise RuntimeError('tagging failed')
+    assert git(str(work_tree), 'status', '--porcelain') == ''
+    assert leftovers(work_tree) == []
+
+
+def die_after_apply(repo, commit: bool = False) -> None:
+    """Apply a bump in another process, which dies before finishing (or rolling back) its transaction."""
+    script = textwrap.dedent(f'''
+        import os, subprocess, sys
+        sys.path.insert(0, {os.path.join(ROOT, 'gitscripts')!r})
+        from tests.test_transaction import stage_bump
+        from tools.transaction import EditTransaction
+        from pathlib import Path
+        repo = Path({str(repo)!r})
+        edits = EditTransaction({journal_dir(repo)!r}, str(repo))
+        stage_bump(edits, repo)
+        edits.apply()
+        if {commit!r}:
+            subprocess.run(['git', 'commit', '-q', '-am', 'bump'], cwd=str(repo), check=True)
+        os._exit(0)
+    ''')
+    subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True)
+
+
+def test_recover_dead_process(work_tree):
+    die_after_apply(work_tree)
+    assert contents(work_tree) != FILES
+    assert any(name.startswith(transaction.JOURNAL_PREFIX) for name in os.listdir(journal_dir(work_tree)))
+
+    assert recover(journal_dir(work_tree)) == 1
+    assert contents(work_tree) == FILES
+    assert os.stat(str(work_tree / 'docs' / 'conf.py')).st_mode & 0o777 == 0o755
+    assert leftovers(work_tree) == []
+    assert recover(journal_dir(work_tree)) == 0
+
+
+def test_recover_leaves_committed_edits(work_tree):
+    die_after_apply(work_tree, commit=True)
+    head = git(str(work_tree), 'rev-parse', 'HEAD')
+    bumped = contents(work_tree)
+
+    assert recover(journal_dir(work_tree)) == 1
+    assert contents(work_tree) == bumped != FILES
+    assert git(str(work_tree), 'rev-parse', 'HEAD') == head
+    assert git(str(work_tree), 'status', '--porcelain') == ''
+    assert leftovers(work_tree) == []
+
+
+def test_recover_skips_live_process(work_tree, monkeypatch):
+    die_after_apply(work_tree)
+    monkeypatch.setattr(transaction, '_pid_alive', lambda pid: True)
+    assert recover(journal_dir(work_tree)) == 0
+    assert contents(work_tree) != FILES
+
+
+def test_recover_without_journals(tmp_path):
+    assert recover(str(tmp_path / 'missing')) == 0
@@ -0,0 +1,85 @@
+import pytest
+
+from version_increment.tools import types_
+from version_increment.tools.types_ import Version
+
+
+@pytest.mark.parametrize('level, old, new', [
+    ('major', '1.2.3', '2.0.0'),
+    ('major', '1.2.3-alpha1+build.5', '2.0.0'),
+    ('minor', '1.2.3', '1.3.0'),
+    ('minor', '1.2.3-rc.1', '1.3.0'),
+    ('patch', '1.2.3', '1.2.4'),
+    ('patch', '0.0.9+build', '0.0.10'),
+    ('subpatch', '1.2.3', '1.2.3-alpha0'),
+    ('subpatch', '1.2.3-alpha1', '1.2.3-alpha2'),
+    ('subpatch', '1.2.3-alpha9', '1.2.3-alpha10'),
+    ('subpatch', '1.2.3-rc.1', '1.2.3-rc.2'),
+    ('subpatch', '1.2.3-beta', '1.2.3-beta.1'),
+    ('subpatch', '1.2.3-alpha1+build.5', '1.2.3-alpha2'),
+    ('alpha', '1.2.3', '1.2.3-alpha0'),
+    ('unalpha', '1.2.3-alpha4', '1.2.3'),
+    ('unalpha', '1.2.3-rc.1+build.5', '1.2.3'),
+    ('unalpha', '1.2.3', '1.2.3'),
+])
+def test_bump(level, old, new):
+    version = Version.from_str(old)
+    assert str(getattr(Version, level)(version)) == new
+    assert str(getattr(types_, level)(version)) == new
+    # bumping never changes the version bumped
+    assert str(version) == old
+
+
+@pytest.mark.parametrize('string, fields', [
+    ('1.2.3', (1, 2, 3, None, None)),
+    ('v1.2.3', (1, 2, 3, None, None)),
+    ('"1.2.3"', (1, 2, 3, None, None)),
+    ("  '1.2.3'\n", (1, 2, 3, None, None)),
+    (b'1.2.3', (1, 2, 3, None, None)),
+    ('1.2.3-alpha0', (1, 2, 3, 'alpha0', None)),
+    ('1.2.3-rc.1.x-y', (1, 2, 3, 'rc.1.x-y', None)),
+    ('1.2.3+build.5', (1, 2, 3, None, 'build.5')),
+    ('v1.2.3-rc.1+build.5', (1, 2, 3, 'rc.1', 'build.5')),
+    ('01.002.3', (1, 2, 3, None, None)),
+])
+def test_from_str(string, fields):
+    version = Version.from_str(string)
+    assert (*version.core, version.prerelease, version.build) == fields
+
+
+@pytest.mark.parametrize('string', ['', '1.2', '1.2.3.4', 'x1.2.3', '1.2.3-', '1.2.3+', '1.2.3-a..b', 'vv1.2.3'])
+def test_from_str_rejects(string):
+    with pytest.raises(ValueError):
+        Version.from_str(string)
+
+
+@pytest.mark.parametrize('string', ['1.2.3', '1.2.3-alpha0', '1.2.3-rc.1+build.5', '0.0.0+x'])
+def test_str_round_trip(string):
+    assert str(Version.from_str(string)) == string
+
+
+def test_precedence():
+    # in increasing order, as listed by https://semver.org/#spec-item-11
+    ordered = ['1.0.0-alpha', '1.0.0-alpha.1', '1.0.0-alpha.beta', '1.0.0-beta', '1.0.0-beta.2', '1.0.0-beta.11',
+               '1.0.0-rc.1', '1.0.0', '1.0.1', '1.1.0', '2.0.0']
+    versions = [Version.from_str(string) for string in ordered]
+    assert sorted(reversed(versions)) == versions
+    assert all(older < newer and newer > older for older, newer in zip(versions, versions[1:]))
+    # build metadata is ignored by precedence, but not by equality
+    assert Version.from_str('1.0.0+a') <= Version.from_str('1.0.0+b') <= Version.from_str('1.0.0+a')
+    assert Version.from_str('1.0.0+a') != Version.from_str('1.0.0+b')
+
+
+def test_immutable():
+    version = Version(1, 2, 3)
+    with pytest.raises(AttributeError):
+        version.major_ = 2
+    assert len({Version(1, 2, 3), Version.from_str('1.2.3')}) == 1
+
+
+def test_compare_with_other_types():
+    with pytest.raises(TypeError):
+        Version(1, 2, 3) < '1.2.4'
+    with pytest.raises(TypeError):
+        Version(1, 2, 3) >= 1
+    assert Version(1, 2, 3) != '1.2.3'
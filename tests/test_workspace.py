@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from version_increment.rust.workspace import do_workspace_bump, read_workspace
+from version_increment.tools.types_ import Version
+
+MANIFESTS = {
+    'Cargo.toml': '[workspace]\nmembers = ["crates/*"]\n',
+    'crates/a/Cargo.toml': '[package]\nname = "a"\nversion = "0.2.0"\n\n'
+                           '[dev-dependencies]\nc = { path = "../c", version = "0.2.0" }\n',
+    'crates/b/Cargo.toml': '[package]\nname = "b"\nversion = "0.2.0"\n\n'
+                           '[dependencies]\na = { path = "../a", version = "0.2.0" }\n',
+    'crates/c/Cargo.toml': '[package]\nname = "c"\nversion = "0.2.0"\n\n'
+                           '[build-dependencies]\nb = { path = "../b", version = "=0.2.0" }\n',
+}
+CARGO_LOCK = '''[[package]]
+name = "a"
+version = "0.2.0"
+
+[[package]]
+name = "b"
+version = "0.2.0"
+dependencies = [
+ "a",
+]
+
+[[package]]
+name = "c"
+version = "0.2.0"
+dependencies = [
+ "b",
+]
+'''
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    for name, text in MANIFESTS.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    (tmp_path / 'Cargo.lock').write_text(CARGO_LOCK)
+    return tmp_path
+
+
+def test_levels(workspace):
+    # a's dev-dependency on c does not count, or the crates would form a cycle
+    assert read_workspace(str(workspace)).levels() == [['a'], ['b'], ['c']]
+
+
+def test_levels_cycle(workspace):
+    manifest = workspace / 'crates' / 'a' / 'Cargo.toml'
+    manifest.write_text(manifest.read_text().replace('dev-dependencies', 'dependencies'))
+    with pytest.raises(ValueError, match='a, b, c'):
+        read_workspace(str(workspace)).levels()
+
+
+def test_bump_in_dependency_order(workspace, monkeypatch):
+    replaced = []
+    replace = os.replace
+
+    def record(src, dst):
+        replaced.append(os.path.relpath(dst, str(workspace)))
+        replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', record)
+    bumps, _ = do_workspace_bump(str(workspace), Version.minor)
+    assert sorted((bump.name, str(bump.new_version)) for bump in bumps) == [('a', '0.3.0'), ('b', '0.3.0'),
+                                                                            ('c', '0.3.0')]
+    assert replaced == [os.path.join('crates', name, 'Cargo.toml') for name in 'abc'] + ['Cargo.lock']
+    assert (workspace / 'crates' / 'c' / 'Cargo.toml').read_text() == \
+        MANIFESTS['crates/c/Cargo.toml'].replace('0.2.0', '0.3.0')
+    assert (workspace / 'Cargo.lock').read_text() == CARGO_LOCK.replace('0.2.0', '0.3.0')
+
+
+def test_lockfile_leaves_registry_crates_alone(workspace):
+    registry = 'registry+https://github.com/rust-lang/crates.io-index'
+    # the old lockfile format, which names every reference's version (and source, if it has one)
+    lock = (f'[[package]]\nname = "a"\nversion = "0.2.0"\n\n'
+            f'[[package]]\nname = "a"\nversion = "0.2.0"\nsource = "{registry}"\n\n'
+            f'[[package]]\nname = "b"\nversion = "0.2.0"\n'
+            f'dependencies = [\n "a 0.2.0",\n "a 0.2.0 ({registry})",\n]\n\n'
+            f'[metadata]\n"checksum a 0.2.0 ({registry})" = "0123"\n')
+    (workspace / 'Cargo.lock').write_text(lock)
+    do_workspace_bump(str(workspace), Version.minor, ['a'])
+    assert (workspace / 'Cargo.lock').read_text() == (
+        f'[[package]]\nname = "a"\nversion = "0.3.0"\n\n'
+        f'[[package]]\nname = "a"\nversion = "0.2.0"\nsource = "{registry}"\n\n'
+        f'[[package]]\nname = "b"\nversion = "0.2.0"\ndependencies = [\n "a 0.3.0",\n "a 0.2.0 ({registry})",\n]\n\n'
+        f'[metadata]\n"checksum a 0.2.0 ({registry})" = "0123"\n')